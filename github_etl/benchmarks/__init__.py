@@ -0,0 +1 @@
+# Benchmarks for the GitHub ETL pipeline
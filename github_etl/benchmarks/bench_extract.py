@@ -0,0 +1,239 @@
+"""
+Benchmark suite: every extract_* function (and optionally load_raw_to_postgres)
+against the local stand-in GitHub REST API.
+
+For each case reports pages/sec, rows/sec, bytes received and peak RSS. With
+--etags every listing is fetched a second time through the conditional-request
+cache (all 304s). If POSTGRES_URL is set, streamed events are also loaded into a
+scratch raw table. Results are saved as JSON under --results-dir; --compare
+checks them against an earlier run and exits non-zero on a regression.
+
+Usage: python -m github_etl.benchmarks.bench_extract --pages 20 --latency 0.02 --concurrency 4
+       python -m github_etl.benchmarks.bench_extract --compare latest
+"""
+
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from github_etl import extract
+from github_etl.benchmarks.fake_github import FakeGitHubServer
+from github_etl.cache import HttpCache
+from github_etl.scheduler import TokenPool
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.bench_results')
+
+OWNER, REPO = 'bench-org', 'bench-repo'
+
+CASES: Dict[str, Callable[[], Any]] = {
+    'extract_repos': lambda: extract.extract_repos(OWNER),
+    'extract_commits': lambda: extract.extract_commits(OWNER, REPO),
+    'extract_issues': lambda: extract.extract_issues(OWNER, REPO),
+    'extract_pull_requests': lambda: extract.extract_pull_requests(OWNER, REPO),
+    'extract_events': lambda: extract.extract_events(OWNER, REPO),
+    'extract_stargazers': lambda: extract.extract_stargazers(OWNER, REPO),
+    'extract_contributors': lambda: extract.extract_contributors(OWNER, REPO),
+}
+
+# Higher is better for these metrics; a drop beyond the threshold is a regression
+THROUGHPUT_METRICS = ('pages_per_sec', 'rows_per_sec')
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+class PeakRSS:
+    """Sample RSS in a background thread while the block runs; .peak is the highest value seen."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def measure(server: FakeGitHubServer, fn: Callable[[], Any]) -> Dict[str, float]:
+    """Run one case and collect its throughput, transfer and memory figures."""
+    server.reset_stats()
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        result = fn()
+        rows = result if isinstance(result, int) else len(result)
+        elapsed = time.perf_counter() - start
+    stats = server.stats
+    return {
+        'seconds': elapsed,
+        'requests': stats['requests'],
+        'pages': stats['pages'],
+        'not_modified': stats['not_modified'],
+        'rows': rows,
+        'bytes': stats['bytes'],
+        'pages_per_sec': (stats['pages'] + stats['not_modified']) / elapsed,
+        'rows_per_sec': rows / elapsed,
+        'mb_per_sec': stats['bytes'] / elapsed / 1e6,
+        'peak_rss_mb': rss.peak / 1e6,
+    }
+
+
+def print_case(name: str, r: Dict[str, float]):
+    print(f"{name:<32} {r['pages']:>5} pages {r['rows']:>8} rows {r['bytes'] / 1e6:>8.1f} MB "
+          f"{r['seconds']:>7.2f}s {r['pages_per_sec']:>8.1f} pages/s {r['rows_per_sec']:>10,.0f} rows/s "
+          f"peak RSS {r['peak_rss_mb']:.0f} MB")
+
+
+def load_case() -> Optional[Callable[[], int]]:
+    """Streamed events into a scratch raw table, when a database is configured."""
+    if not os.getenv('POSTGRES_URL'):
+        return None
+    from github_etl.load import load_raw_to_postgres, pooled_conn
+
+    def run():
+        with pooled_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute('DROP TABLE IF EXISTS bench_raw_events')
+            conn.commit()
+        rows = load_raw_to_postgres('bench_raw_events', extract.extract_events(OWNER, REPO, stream=True))
+        with pooled_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute('DROP TABLE bench_raw_events')
+            conn.commit()
+        return rows
+    return run
+
+
+def run(pages: int, per_page: int, payload_bytes: int, latency: float, concurrency: int,
+        tokens: int, quota: Optional[int], etags: bool) -> Dict[str, Any]:
+    config = dict(pages=pages, per_page=per_page, payload_bytes=payload_bytes, latency=latency,
+                  concurrency=concurrency, tokens=tokens, quota=quota, etags=etags)
+    cases = {}
+    with FakeGitHubServer(pages, per_page, payload_bytes, latency, etags=etags, quota=quota) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        extract.GITHUB_API_BASE = server.url
+        extract.DEFAULT_CONCURRENCY = concurrency
+        extract._TOKEN_POOL = TokenPool([f'bench-token-{i}' for i in range(tokens)])
+        extract._CACHE = HttpCache(os.path.join(tmp, 'cache.sqlite')) if etags else None
+        try:
+            for name, fn in CASES.items():
+                cases[name] = measure(server, fn)
+                print_case(name, cases[name])
+                if etags:
+                    cases[f'{name} (304)'] = measure(server, fn)
+                    print_case(f'{name} (304)', cases[f'{name} (304)'])
+            loader = load_case()
+            if loader:
+                extract._CACHE = None
+                cases['load_raw_to_postgres (events)'] = measure(server, loader)
+                print_case('load_raw_to_postgres (events)', cases['load_raw_to_postgres (events)'])
+            else:
+                print("POSTGRES_URL not set; skipping load_raw_to_postgres.")
+        finally:
+            if extract._CACHE:
+                extract._CACHE.close()
+            extract._CACHE = None
+            extract._TOKEN_POOL = None
+    return {'run_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(), 'config': config, 'cases': cases}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(__file__)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results: Dict[str, Any], results_dir: str = RESULTS_DIR) -> str:
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"bench_extract-{results['run_at'].replace(':', '')}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def previous_results(results_dir: str = RESULTS_DIR) -> List[str]:
+    return sorted(glob.glob(os.path.join(results_dir, 'bench_extract-*.json')))
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Print per-case throughput changes; return the cases that regressed by more than `threshold`."""
+    if baseline['config'] != current['config']:
+        print(f"Warning: configs differ: {baseline['config']} vs {current['config']}")
+    regressions = []
+    for name, case in current['cases'].items():
+        base = baseline['cases'].get(name)
+        if not base:
+            continue
+        changes = []
+        for metric in THROUGHPUT_METRICS:
+            if base[metric]:
+                change = case[metric] / base[metric] - 1
+                changes.append(f"{metric} {change:+.0%}")
+                if change < -threshold:
+                    regressions.append(f"{name}: {metric} {change:+.0%}")
+        rss = case['peak_rss_mb'] - base['peak_rss_mb']
+        print(f"{name:<32} {'  '.join(changes)}  peak RSS {rss:+.0f} MB")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--per-page', type=int, default=100)
+    parser.add_argument('--payload-bytes', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds per simulated round trip')
+    parser.add_argument('--concurrency', type=int, default=4, help='pages fetched in parallel per listing')
+    parser.add_argument('--tokens', type=int, default=1)
+    parser.add_argument('--quota', type=int, default=None, help='requests per token per 1s window')
+    parser.add_argument('--no-etags', action='store_true', help='disable ETags and the cached second pass')
+    parser.add_argument('--results-dir', default=RESULTS_DIR)
+    parser.add_argument('--compare', help="baseline results file, or 'latest' for the previous run")
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed throughput drop before failing')
+    args = parser.parse_args()
+
+    baseline_path = args.compare
+    if baseline_path == 'latest':
+        earlier = previous_results(args.results_dir)
+        baseline_path = earlier[-1] if earlier else None
+        if not baseline_path:
+            print("No earlier results to compare with.")
+    results = run(args.pages, args.per_page, args.payload_bytes, args.latency, args.concurrency,
+                  args.tokens, args.quota, not args.no_etags)
+    print(f"Saved {save_results(results, args.results_dir)}")
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline_path} (commit {baseline.get('commit')}):")
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
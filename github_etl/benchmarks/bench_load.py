@@ -0,0 +1,61 @@
+"""
+Benchmark: raw JSONB load throughput, COPY vs execute_batch INSERT.
+
+Loads the same synthetic GitHub event payloads into scratch tables with each
+method and reports rows/sec. Requires POSTGRES_URL; scratch tables are dropped.
+
+Usage: python -m github_etl.benchmarks.bench_load --rows 100000 --batch-size 5000
+"""
+
+import argparse
+import time
+from typing import Any, Dict, List
+
+from github_etl.load import load_raw_to_postgres, pooled_conn, close_pg_pool
+
+
+def synthetic_events(n: int) -> List[Dict[str, Any]]:
+    """Event-shaped payloads roughly the size of real /events records."""
+    return [{
+        'id': str(30000000000 + i),
+        'type': 'PushEvent',
+        'actor': {'id': i % 5000, 'login': f'user{i % 5000}', 'url': f'https://api.github.com/users/user{i % 5000}'},
+        'repo': {'id': i % 300, 'name': f'org/repo{i % 300}', 'url': f'https://api.github.com/repos/org/repo{i % 300}'},
+        'payload': {'push_id': i, 'size': 1, 'ref': 'refs/heads/main',
+                    'commits': [{'sha': f'{i:040x}', 'message': 'Fix "quoted"\ttab\nnewline \\ backslash'}]},
+        'public': True,
+        'created_at': '2024-01-01T00:00:00Z',
+    } for i in range(n)]
+
+
+def run(rows: int, batch_size: int) -> Dict[str, float]:
+    data = synthetic_events(rows)
+    results = {}
+    for method in ('insert', 'copy'):
+        table = f'bench_raw_load_{method}'
+        with pooled_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP TABLE IF EXISTS {table}')
+            conn.commit()
+        start = time.perf_counter()
+        load_raw_to_postgres(table, data, batch_size=batch_size, method=method)
+        elapsed = time.perf_counter() - start
+        results[method] = rows / elapsed
+        print(f"{method:>6}: {rows} rows in {elapsed:.2f}s ({results[method]:,.0f} rows/sec)")
+        with pooled_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP TABLE IF EXISTS {table}')
+            conn.commit()
+    print(f"COPY speedup: {results['copy'] / results['insert']:.1f}x")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+    try:
+        run(args.rows, args.batch_size)
+    finally:
+        close_pg_pool()
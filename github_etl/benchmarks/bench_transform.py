@@ -0,0 +1,45 @@
+"""
+Benchmark: transform throughput for the columnar flattening engine.
+
+Transforms synthetic GitHub event payloads into fact_repo_events rows from Python
+dicts (transform_stream, as fed by a streaming extract) and from newline-delimited
+JSON bytes (transform_ndjson), and reports rows/sec. Needs no network or database.
+
+Usage: python -m github_etl.benchmarks.bench_transform --rows 1000000
+"""
+
+import argparse
+import json
+import time
+from typing import Dict
+
+from github_etl.benchmarks.bench_load import synthetic_events
+from github_etl.transform import transform_stream, transform_ndjson
+
+
+def run(rows: int, batch_size: int) -> Dict[str, float]:
+    data = synthetic_events(rows)
+    ndjson = '\n'.join(json.dumps(row) for row in data).encode('utf-8')
+    results = {}
+
+    start = time.perf_counter()
+    out_rows = sum(t.num_rows for t in transform_stream('events', data, batch_size=batch_size))
+    elapsed = time.perf_counter() - start
+    results['records'] = out_rows / elapsed
+    print(f"records: {out_rows} rows in {elapsed:.2f}s ({results['records']:,.0f} rows/sec)")
+
+    start = time.perf_counter()
+    out_rows = transform_ndjson('events', ndjson).num_rows
+    elapsed = time.perf_counter() - start
+    results['ndjson'] = out_rows / elapsed
+    print(f" ndjson: {out_rows} rows in {elapsed:.2f}s ({results['ndjson']:,.0f} rows/sec, "
+          f"{len(ndjson) / elapsed / 1e6:,.0f} MB/sec)")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--batch-size', type=int, default=50000)
+    args = parser.parse_args()
+    run(args.rows, args.batch_size)
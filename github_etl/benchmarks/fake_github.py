@@ -0,0 +1,261 @@
+"""
+Local stand-in for the GitHub REST API, for tests and benchmarks.
+
+Serves the listings extract.py reads (org/user repos, and per-repo commits,
+issues, pulls, events, stargazers, contributors), plus single-repo metadata
+(/repos/{owner}/{repo}), with deterministic records in
+GitHub's layout, Link-header pagination, and optionally:
+- latency: seconds added to every response
+- payload_bytes: length of each record's free-text field (body, message, bio, ...)
+- etags: ETag headers, and 304 Not Modified for a matching If-None-Match
+- quota: per-token primary rate limit with X-RateLimit-* headers, replenished
+  every reset_seconds; an exhausted token gets 403 until then
+- secondary_every: every Nth request is a secondary-limit 403 with Retry-After
+
+Usage: python -m github_etl.benchmarks.fake_github --pages 10 --port 8766
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+_ROUTES = [
+    (re.compile(r'^/(orgs|users)/([^/]+)/repos$'), 'repos'),
+    (re.compile(r'^/repos/([^/]+)/([^/]+)/(commits|issues|pulls|events|stargazers|contributors)$'), None),
+    (re.compile(r'^/repos/([^/]+)/([^/]+)$'), 'repo'),
+]
+
+
+def _id(*parts) -> int:
+    """Stable positive id for a record."""
+    return int(hashlib.sha1('/'.join(map(str, parts)).encode('utf-8')).hexdigest()[:12], 16) % 10**10
+
+
+def _ts(minutes: int) -> str:
+    return (_EPOCH + timedelta(minutes=minutes)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _user(i: int, base: str) -> Dict[str, Any]:
+    login = f'user{i % 5000}'
+    return {'login': login, 'id': 1000 + i % 5000, 'type': 'User', 'url': f'{base}users/{login}'}
+
+
+def make_record(kind: str, owner: str, repo: str, i: int, base: str, text: str) -> Dict[str, Any]:
+    """Record number `i` (0 = newest) of one listing, shaped like GitHub's response."""
+    full_name = f'{owner}/{repo}'
+    if kind in ('repos', 'repo'):
+        # An org listing names its repos repo0, repo1, ...; a single repo keeps its own name
+        name = repo if kind == 'repo' else f'repo{i}'
+        return {'id': _id(owner, name), 'name': name, 'full_name': f'{owner}/{name}',
+                'owner': {'login': owner, 'id': _id(owner), 'type': 'Organization'},
+                'description': text, 'language': 'Python', 'private': False, 'fork': False, 'archived': False,
+                'default_branch': 'main', 'stargazers_count': i % 100, 'forks_count': i % 10,
+                'open_issues_count': i % 20, 'created_at': _ts(-i), 'updated_at': _ts(-i), 'pushed_at': _ts(-i),
+                'url': f'{base}repos/{owner}/{name}'}
+    if kind == 'commits':
+        sha = hashlib.sha1(f'{full_name}/{i}'.encode('utf-8')).hexdigest()
+        user = _user(i, base)
+        signature = {'name': user['login'], 'email': f"{user['login']}@example.com", 'date': _ts(-i)}
+        return {'sha': sha, 'url': f'{base}repos/{full_name}/commits/{sha}', 'author': user, 'committer': user,
+                'commit': {'author': signature, 'committer': signature, 'message': text, 'comment_count': 0}}
+    if kind == 'issues':
+        record = {'id': _id(full_name, 'issue', i), 'number': i + 1, 'title': f'Issue {i}',
+                  'state': 'open' if i % 2 else 'closed', 'user': _user(i, base), 'comments': i % 7, 'body': text,
+                  'repository_url': f'{base}repos/{full_name}', 'created_at': _ts(-i - 60),
+                  'updated_at': _ts(-i), 'closed_at': None if i % 2 else _ts(-i)}
+        if i % 3 == 0:
+            record['pull_request'] = {'url': f'{base}repos/{full_name}/pulls/{i + 1}'}
+        return record
+    if kind == 'pulls':
+        return {'id': _id(full_name, 'pull', i), 'number': i + 1, 'title': f'PR {i}',
+                'state': 'open' if i % 2 else 'closed', 'draft': False, 'user': _user(i, base), 'body': text,
+                'head': {'sha': hashlib.sha1(f'{full_name}/head/{i}'.encode('utf-8')).hexdigest(),
+                         'ref': f'feature-{i}'},
+                'base': {'ref': 'main', 'repo': {'id': _id(full_name), 'full_name': full_name}},
+                'merge_commit_sha': None, 'created_at': _ts(-i - 60), 'updated_at': _ts(-i),
+                'closed_at': None, 'merged_at': None}
+    if kind == 'events':
+        return {'id': str(_id(full_name, 'event', i)), 'type': 'IssuesEvent', 'actor': _user(i, base),
+                'repo': {'id': _id(full_name), 'name': full_name, 'url': f'{base}repos/{full_name}'},
+                'payload': {'action': 'opened', 'issue': {'number': i + 1, 'body': text}},
+                'public': True, 'created_at': _ts(-i)}
+    if kind == 'stargazers':
+        # Oldest first, like GitHub
+        return {'starred_at': _ts(i), 'user': dict(_user(i, base), bio=text)}
+    if kind == 'contributors':
+        return dict(_user(i, base), contributions=10000 - i, bio=text)
+    raise ValueError(f"Unknown listing {kind}")
+
+
+class FakeGitHubServer:
+    """Threaded HTTP server answering GitHub REST listing requests from generated data."""
+
+    def __init__(self, pages: int = 5, per_page: int = 100, payload_bytes: int = 200, latency: float = 0.0,
+                 etags: bool = True, quota: Optional[int] = None, reset_seconds: float = 1.0,
+                 secondary_every: int = 0, port: int = 0):
+        self.pages = pages
+        self.per_page = per_page
+        self.payload_bytes = payload_bytes
+        self.latency = latency
+        self.etags = etags
+        self.quota = quota
+        self.reset_seconds = reset_seconds
+        self.secondary_every = secondary_every
+        self._quotas: Dict[str, List[float]] = {}  # token -> [remaining, reset_at]
+        self._pages: Dict[Tuple[str, int, int], Tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like api.github.com
+
+            def do_GET(self):
+                status, headers, body = server.handle(self.path, self.headers)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/'
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def reset_stats(self):
+        self.stats = {'requests': 0, 'pages': 0, 'bytes': 0, 'not_modified': 0, 'rate_limited': 0,
+                      'secondary_limited': 0, 'tokens': set()}
+
+    def _page(self, path: str, page: int, per_page: int) -> Tuple[bytes, str]:
+        """Encoded page body and its ETag, generated once per (path, page, per_page)."""
+        key = (path, page, per_page)
+        cached = self._pages.get(key)
+        if cached is None:
+            kind, owner, repo = self._route(path)
+            text = ('lorem ipsum ' * (self.payload_bytes // 12 + 1))[:self.payload_bytes]
+            start = (page - 1) * per_page
+            if kind == 'repo':
+                body = json.dumps(make_record(kind, owner, repo, 0, self.url, text)).encode('utf-8')
+            else:
+                rows = [make_record(kind, owner, repo, i, self.url, text) for i in range(start, start + per_page)]
+                body = json.dumps(rows).encode('utf-8')
+            cached = (body, f'W/"{hashlib.sha1(body).hexdigest()}"')
+            self._pages[key] = cached
+        return cached
+
+    @staticmethod
+    def _route(path: str) -> Tuple[str, str, str]:
+        for pattern, kind in _ROUTES:
+            match = pattern.match(path)
+            if match:
+                if kind == 'repos':
+                    return 'repos', match.group(2), ''
+                if kind == 'repo':
+                    return 'repo', match.group(1), match.group(2)
+                return match.group(3), match.group(1), match.group(2)
+        raise KeyError(path)
+
+    def _rate_headers(self, token: str, now: float) -> Tuple[Dict[str, str], bool]:
+        """Rate-limit headers for this token, and whether the request is over quota."""
+        if self.quota is None:
+            return {}, False
+        state = self._quotas.setdefault(token, [self.quota, now + self.reset_seconds])
+        if now >= state[1]:
+            state[0], state[1] = self.quota, now + self.reset_seconds
+        limited = state[0] <= 0
+        headers = {'X-RateLimit-Limit': str(self.quota), 'X-RateLimit-Remaining': str(max(int(state[0]) - 1, 0)),
+                   'X-RateLimit-Reset': str(int(state[1]) + 1)}
+        if limited:
+            headers['X-RateLimit-Remaining'] = '0'
+        return headers, limited
+
+    def handle(self, raw_path: str, request_headers) -> Tuple[int, Dict[str, str], bytes]:
+        """Answer one GET: (status, headers, body)."""
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlsplit(raw_path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        page = int(query.get('page', 1))
+        per_page = min(int(query.get('per_page', self.per_page)), 100)
+        token = (request_headers.get('Authorization') or '').replace('token ', '')
+        json_headers = {'Content-Type': 'application/json; charset=utf-8'}
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['tokens'].add(token)
+            if self.secondary_every and self.stats['requests'] % self.secondary_every == 0:
+                self.stats['secondary_limited'] += 1
+                body = b'{"message": "You have exceeded a secondary rate limit."}'
+                return 403, dict(json_headers, **{'Retry-After': '1'}), body
+            rate_headers, limited = self._rate_headers(token, time.time())
+            if limited:
+                self.stats['rate_limited'] += 1
+                return 403, dict(json_headers, **rate_headers), b'{"message": "API rate limit exceeded."}'
+        try:
+            body, etag = self._page(parts.path, page, per_page)
+        except KeyError:
+            return 404, json_headers, b'{"message": "Not Found"}'
+        headers = dict(json_headers, **rate_headers)
+        if self.etags:
+            headers['ETag'] = etag
+            if request_headers.get('If-None-Match') == etag:
+                with self._lock:
+                    self.stats['not_modified'] += 1
+                    # 304s are free on GitHub; give the request back
+                    if self.quota is not None:
+                        headers['X-RateLimit-Remaining'] = str(int(self._quotas[token][0]))
+                return 304, headers, b''
+        with self._lock:
+            if self.quota is not None:
+                self._quotas[token][0] -= 1
+            self.stats['pages'] += 1
+            self.stats['bytes'] += len(body)
+        links = []
+        base = f'{self.url.rstrip("/")}{parts.path}'
+        if page < self.pages and self._route(parts.path)[0] != 'repo':
+            links.append(f'<{base}?{urlencode(dict(query, page=page + 1))}>; rel="next"')
+            links.append(f'<{base}?{urlencode(dict(query, page=self.pages))}>; rel="last"')
+        if page > 1:
+            links.append(f'<{base}?{urlencode(dict(query, page=1))}>; rel="first"')
+        if links:
+            headers['Link'] = ', '.join(links)
+        return 200, headers, body
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--per-page', type=int, default=100)
+    parser.add_argument('--payload-bytes', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--quota', type=int, default=None, help='requests per token per reset window')
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+    with FakeGitHubServer(args.pages, args.per_page, args.payload_bytes, args.latency,
+                          quota=args.quota, port=args.port) as fake:
+        print(f"Fake GitHub REST API on {fake.url} (Ctrl-C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,277 @@
+"""
+Local stand-in for the GitHub GraphQL API, for tests and benchmarks.
+
+Implements the query subset extract_graphql generates: aliases, literal
+arguments (strings, ints, enums, lists, objects), inline fragments, and
+connections with first/after cursors, `states` and `filterBy.since` filters.
+Point cost is approximated like GitHub's: one request per connection resolved,
+divided by 100, minimum 1.
+
+Usage: python -m github_etl.benchmarks.fake_graphql --repos 100 --port 8765
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+_TOKEN = re.compile(r'\s+|,|#[^\n]*|(\.\.\.|[{}():\[\]])|("(?:[^"\\]|\\.)*")|(-?\d+)|([_A-Za-z][_0-9A-Za-z]*)')
+
+
+def tokenize(query: str) -> List[str]:
+    tokens, pos = [], 0
+    while pos < len(query):
+        match = _TOKEN.match(query, pos)
+        if not match:
+            raise ValueError(f"Unexpected character at {pos}: {query[pos:pos + 20]!r}")
+        token = next((g for g in match.groups() if g is not None), None)
+        if token is not None:
+            tokens.append(token)
+        pos = match.end()
+    return tokens
+
+
+class Parser:
+    """Recursive-descent parser producing selections as dicts."""
+
+    def __init__(self, query: str):
+        self.tokens = tokenize(query)
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self, expected: Optional[str] = None) -> str:
+        token = self.peek()
+        if expected is not None and token != expected:
+            raise ValueError(f"Expected {expected!r}, got {token!r}")
+        self.pos += 1
+        return token
+
+    def document(self) -> List[Dict[str, Any]]:
+        if self.peek() == 'query':
+            self.take()
+        return self.selection_set()
+
+    def selection_set(self) -> List[Dict[str, Any]]:
+        self.take('{')
+        selections = []
+        while self.peek() != '}':
+            if self.peek() == '...':
+                self.take()
+                self.take('on')
+                selections.append({'on': self.take(), 'selections': self.selection_set()})
+                continue
+            name = self.take()
+            alias = name
+            if self.peek() == ':':
+                self.take()
+                name = self.take()
+            args = self.arguments() if self.peek() == '(' else {}
+            subselections = self.selection_set() if self.peek() == '{' else None
+            selections.append({'alias': alias, 'name': name, 'args': args, 'selections': subselections})
+        self.take('}')
+        return selections
+
+    def arguments(self) -> Dict[str, Any]:
+        self.take('(')
+        args = {}
+        while self.peek() != ')':
+            name = self.take()
+            self.take(':')
+            args[name] = self.value()
+        self.take(')')
+        return args
+
+    def value(self) -> Any:
+        token = self.take()
+        if token.startswith('"'):
+            return json.loads(token)
+        if token == '[':
+            items = []
+            while self.peek() != ']':
+                items.append(self.value())
+            self.take(']')
+            return items
+        if token == '{':
+            obj = {}
+            while self.peek() != '}':
+                key = self.take()
+                self.take(':')
+                obj[key] = self.value()
+            self.take('}')
+            return obj
+        if re.fullmatch(r'-?\d+', token):
+            return int(token)
+        return {'true': True, 'false': False, 'null': None}.get(token, token)
+
+
+class Executor:
+    """Resolve a parsed query against fixture data shaped like GitHub's GraphQL objects."""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self.connections = 0
+        self.errors = []
+
+    def execute(self, query: str, remaining: int) -> Dict[str, Any]:
+        result = {}
+        rate_fields = []
+        for sel in Parser(query).document():
+            if sel['name'] == 'rateLimit':
+                rate_fields.append(sel)
+                continue
+            root = self.root_field(sel['name'], sel['args'])
+            if root is None:
+                # GitHub answers a missing repo/owner with a null field plus a NOT_FOUND error
+                self.errors.append({'type': 'NOT_FOUND', 'path': [sel['alias']],
+                                    'message': f"Could not resolve to a {sel['name']}."})
+            result[sel['alias']] = self.shape(root, sel['selections'])
+        cost = self.cost()
+        for sel in rate_fields:
+            rate = {'cost': cost, 'remaining': remaining - cost, 'resetAt': '2099-01-01T00:00:00Z', 'limit': 5000}
+            result[sel['alias']] = self.shape(rate, sel['selections'])
+        return result
+
+    def cost(self) -> int:
+        return max(1, round(self.connections / 100))
+
+    def root_field(self, name: str, args: Dict[str, Any]) -> Any:
+        repos = self.data['repos']
+        if name == 'repository':
+            return repos.get(f"{args['owner']}/{args['name']}")
+        if name in ('organization', 'user'):
+            owned = [r for r in repos.values() if r['owner']['login'] == args['login']]
+            return {'login': args['login'], 'repositories': owned} if owned else None
+        raise ValueError(f"Unsupported root field {name}")
+
+    def connection(self, items: List[Dict[str, Any]], args: Dict[str, Any]) -> Dict[str, Any]:
+        self.connections += 1
+        if 'states' in args:
+            items = [i for i in items if i.get('state') in args['states']]
+        since = (args.get('filterBy') or {}).get('since')
+        if since:
+            items = [i for i in items if i.get('updatedAt', '') >= since]
+        start = int(args['after']) if args.get('after') else 0
+        page = items[start:start + args.get('first', len(items))]
+        end = start + len(page)
+        return {'totalCount': len(items), 'pageInfo': {'hasNextPage': end < len(items), 'endCursor': str(end)},
+                'nodes': page, 'edges': page}
+
+    def shape(self, value: Any, selections: Optional[List[Dict[str, Any]]]) -> Any:
+        if value is None or selections is None:
+            return value
+        if isinstance(value, list):
+            return [self.shape(v, selections) for v in value]
+        result = {}
+        for sel in selections:
+            if 'on' in sel:
+                if value.get('__typename', sel['on']) == sel['on']:
+                    result.update(self.shape(value, sel['selections']))
+                continue
+            field = value.get(sel['name'])
+            if isinstance(field, list) and sel['name'] not in ('nodes', 'edges'):
+                field = self.connection(field, sel['args'])
+            result[sel['alias']] = self.shape(field, sel['selections'])
+        return result
+
+
+def make_fake_data(repos: int = 10, issues: int = 5, pull_requests: int = 5, stargazers: int = 5,
+                   owner: str = 'fake-org') -> Dict[str, Any]:
+    """Fixture org with `repos` repositories, each holding the given number of child records."""
+    data = {}
+    for r in range(repos):
+        name = f'repo{r}'
+        user = lambda i: {'__typename': 'User', 'login': f'user{i}', 'databaseId': 1000 + i}
+        data[f'{owner}/{name}'] = {
+            'databaseId': r + 1, 'name': name, 'nameWithOwner': f'{owner}/{name}',
+            'owner': {'__typename': 'Organization', 'login': owner, 'databaseId': 1},
+            'description': f'Repository {r}', 'primaryLanguage': {'name': 'Python'},
+            'isPrivate': False, 'isFork': False, 'isArchived': False, 'defaultBranchRef': {'name': 'main'},
+            'stargazerCount': stargazers, 'forkCount': 0,
+            'createdAt': '2023-01-01T00:00:00Z', 'updatedAt': '2024-01-01T00:00:00Z', 'pushedAt': '2024-01-01T00:00:00Z',
+            'issues': [{'databaseId': r * 100000 + i, 'number': i + 1, 'title': f'Issue {i}',
+                        'state': 'OPEN' if i % 2 else 'CLOSED', 'author': user(i), 'comments': {'totalCount': i},
+                        'createdAt': '2024-01-01T00:00:00Z', 'updatedAt': f'2024-01-{i % 28 + 1:02d}T00:00:00Z',
+                        'closedAt': None} for i in range(issues)],
+            'pullRequests': [{'databaseId': r * 100000 + 50000 + i, 'number': issues + i + 1, 'title': f'PR {i}',
+                              'state': ('OPEN', 'CLOSED', 'MERGED')[i % 3], 'isDraft': False, 'author': user(i),
+                              'headRefOid': f'{i:040x}', 'headRefName': f'feature-{i}', 'baseRefName': 'main',
+                              'mergeCommit': None, 'createdAt': '2024-01-01T00:00:00Z',
+                              'updatedAt': '2024-01-02T00:00:00Z', 'closedAt': None, 'mergedAt': None}
+                             for i in range(pull_requests)],
+            'stargazers': [{'starredAt': f'2024-02-{i % 28 + 1:02d}T00:00:00Z', 'node': user(i)}
+                           for i in range(stargazers)],
+        }
+    return {'repos': data}
+
+
+class FakeGraphQLServer:
+    """Threaded HTTP server answering POST /graphql from fixture data, with optional latency."""
+
+    def __init__(self, data: Dict[str, Any], port: int = 0, latency: float = 0.0, quota: int = 5000):
+        self.data = data
+        self.latency = latency
+        self.remaining = quota
+        self.requests = 0
+        self.points = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if server.latency:
+                    time.sleep(server.latency)
+                executor = Executor(server.data)
+                try:
+                    payload = {'data': executor.execute(body['query'], server.remaining)}
+                    if executor.errors:
+                        payload['errors'] = executor.errors
+                except (ValueError, KeyError) as exc:
+                    payload = {'errors': [{'message': str(exc)}]}
+                with server._lock:
+                    server.requests += 1
+                    server.points += executor.cost()
+                    server.remaining -= executor.cost()
+                    remaining = server.remaining
+                encoded = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(encoded)))
+                self.send_header('X-RateLimit-Remaining', str(remaining))
+                self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3600))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/graphql'
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repos', type=int, default=100)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    args = parser.parse_args()
+    with FakeGraphQLServer(make_fake_data(args.repos), port=args.port, latency=args.latency) as fake:
+        print(f"Fake GitHub GraphQL API on {fake.url} (Ctrl-C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,154 @@
+"""
+Module: cache.py
+Persistent conditional-request (ETag / Last-Modified) cache for GitHub API responses.
+
+Entries are stored in a small SQLite file keyed by URL, params and Accept header.
+Requests for cached URLs are sent with If-None-Match / If-Modified-Since; a 304
+is answered from the stored body and does not count against the rate limit.
+
+The file runs in WAL mode with synchronous=NORMAL, so hits never wait on an
+fsync, and last-access times for LRU eviction are buffered in memory and
+written in batches (before every eviction and on close).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Buffered last-access updates written per batch
+TOUCH_FLUSH_SIZE = 256
+
+
+class HttpCache:
+    """SQLite-backed ETag cache with a total size cap and LRU eviction."""
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}  # key -> last access not yet written
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS http_cache (
+            key TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            headers TEXT NOT NULL,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        )''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS http_cache_last_access ON http_cache (last_access)')
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url: str, params: Optional[dict] = None, accept: str = '') -> str:
+        """Stable cache key for a request."""
+        raw = json.dumps([url, sorted((params or {}).items()), accept], default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def conditional_headers(self, key: str) -> Dict[str, str]:
+        """Return the validator headers to send for a cached key (empty if not cached)."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT etag, last_modified FROM http_cache WHERE key = ?', (key,)).fetchone()
+        if not row:
+            return {}
+        headers = {}
+        if row[0]:
+            headers['If-None-Match'] = row[0]
+        if row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def get(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        """Return (headers, body) for a cached key and mark it recently used; counts a hit."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT headers, body FROM http_cache WHERE key = ?', (key,)).fetchone()
+            if not row:
+                self.stats['misses'] += 1
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touched()
+                self._conn.commit()
+            self.stats['hits'] += 1
+        return json.loads(row[0]), bytes(row[1])
+
+    def put(self, key: str, url: str, headers: dict, body: bytes):
+        """Store a 200 response if it carries a validator, then evict down to the size cap."""
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._touched.pop(key, None)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO http_cache '
+                '(key, url, etag, last_modified, headers, body, size, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, url, etag, last_modified, json.dumps(dict(headers)), sqlite3.Binary(body), size, time.time()))
+            self.stats['stores'] += 1
+            self._evict()
+            self._conn.commit()
+
+    def record_miss(self):
+        with self._lock:
+            self.stats['misses'] += 1
+
+    def _flush_touched(self):
+        """Write buffered last-access times (caller holds the lock and commits)."""
+        if self._touched:
+            self._conn.executemany('UPDATE http_cache SET last_access = ? WHERE key = ?',
+                                   [(at, key) for key, at in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self):
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM http_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        self._flush_touched()
+        for key, size in self._conn.execute(
+                'SELECT key, size FROM http_cache ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM http_cache WHERE key = ?', (key,))
+            total -= size
+            self.stats['evictions'] += 1
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM http_cache').fetchone()[0]
+
+    def hit_ratio(self) -> float:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def report(self):
+        """Print hit/miss statistics for the current process."""
+        print(f"HTTP cache: {self.stats['hits']} hits, {self.stats['misses']} misses "
+              f"({self.hit_ratio():.0%} hit ratio), {self.stats['evictions']} evictions, "
+              f"{self.size_bytes()} bytes on disk.")
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
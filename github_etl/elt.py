@@ -0,0 +1,211 @@
+"""
+Module: elt.py
+In-database transform: upsert typed tables straight from the raw_* JSONB tables.
+
+The SELECT for each entity is generated from the same declarative mappings as
+transform.py, so both paths produce identical tables. Only raw rows whose
+loaded_at is newer than the entity's watermark (kept in elt_watermarks) are read,
+so a refresh costs O(delta) instead of O(table). loaded_at is the start time of
+the loading transaction, not its commit time, so the watermark never passes the
+start of a transaction still open when the refresh ran: rows it commits later
+are picked up by the next refresh. Supporting structures on the raw
+tables (a loaded_at index and expression indexes on the JSONB join keys) are
+created by ensure_raw_indexes.
+
+Usage: python -m github_etl.elt [ENTITY ...] [--dry-run] [--full]
+"""
+
+import argparse
+import time
+from typing import Dict, List, Optional, Union
+
+from github_etl import metrics
+from github_etl.load import pooled_conn, close_pg_pool, typed_table_ddl
+from github_etl.transform import ENTITIES, field_paths, output_schema
+
+WATERMARK_DDL = '''
+CREATE TABLE IF NOT EXISTS elt_watermarks (
+    target_table TEXT PRIMARY KEY,
+    last_loaded_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)'''
+
+# JSONB paths the typed tables are joined/looked up on, indexed on the raw tables
+RAW_JOIN_PATHS = {
+    'repos': ['id', 'full_name'],
+    'commits': ['sha'],
+    'issues': ['id'],
+    'pull_requests': ['id'],
+    'events': ['id', 'repo.id', 'actor.id'],
+}
+
+
+def raw_table(entity: str) -> str:
+    return f"raw_{entity}"
+
+
+def _path_literal(path: str) -> str:
+    return "'{" + ','.join(path.split('.')) + "}'"
+
+
+def _read_sql(op: str, path: Union[str, List[str]]) -> str:
+    """raw <op> path, COALESCEd over a fallback list of paths."""
+    reads = [f"raw {op} {_path_literal(source)}" for source in field_paths(path)]
+    return reads[0] if len(reads) == 1 else f"COALESCE({', '.join(reads)})"
+
+
+def field_sql(path: Union[str, List[str]], kind: str) -> str:
+    """SQL expression reading one mapped field from the raw JSONB column."""
+    text = f"({_read_sql('#>>', path)})"
+    if kind in ('int', 'int_str'):
+        return f"{text}::bigint"
+    if kind == 'bool':
+        return f"{text}::boolean"
+    if kind == 'ts':
+        return f"{text}::timestamptz"
+    if kind == 'present':
+        return f"COALESCE(jsonb_typeof({_read_sql('#>', path)}) NOT IN ('null'), false)"
+    if kind == 'repo_from_url':
+        return f"substring({text} from '/repos/([^/]+/[^/]+)')"
+    return text
+
+
+def supported(entity: str) -> bool:
+    """Entities that need outside context (stargazers, contributors) can't be derived from raw rows alone."""
+    return not ENTITIES[entity].get('context')
+
+
+def merge_sql(entity: str) -> str:
+    """
+    Incremental upsert of one entity: reads raw rows with loaded_at > %(watermark)s,
+    keeps the newest raw version per key and upserts it, skipping unchanged rows.
+    Returns one row: (rows written, next watermark). The next watermark is the newest
+    loaded_at seen, held back to just before the oldest transaction still open in
+    the database (pg_stat_activity), whose rows may commit after this refresh with
+    an earlier loaded_at; NULL when there was no delta.
+    """
+    spec = ENTITIES[entity]
+    table = spec['table']
+    columns = [f.name for f in output_schema(entity)]
+    key_sql = ', '.join(f'"{k}"' for k in spec['key'])
+    select_sql = ',\n            '.join(f'{field_sql(path, kind)} AS "{col}"' for col, path, kind in spec['fields'])
+    col_sql = ', '.join(f'"{c}"' for c in columns)
+    non_key = [c for c in columns if c not in spec['key']]
+    updates = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in non_key)
+    changed = ' OR '.join(f'{table}."{c}" IS DISTINCT FROM EXCLUDED."{c}"' for c in non_key)
+    return f'''
+    WITH delta AS (
+        SELECT raw, loaded_at FROM {raw_table(entity)}
+        WHERE loaded_at > %(watermark)s
+    ),
+    shaped AS (
+        SELECT DISTINCT ON ({key_sql}) *
+        FROM (
+            SELECT
+            {select_sql},
+            loaded_at
+            FROM delta
+        ) s
+        ORDER BY {key_sql}, loaded_at DESC
+    ),
+    upserted AS (
+        INSERT INTO {table} ({col_sql})
+        SELECT {col_sql} FROM shaped
+        ON CONFLICT ({key_sql}) DO UPDATE SET {updates}
+        WHERE {changed}
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM upserted),
+           CASE WHEN EXISTS (SELECT 1 FROM delta) THEN LEAST(
+               (SELECT max(loaded_at) FROM delta),
+               (SELECT min(xact_start)::timestamp - interval '1 microsecond' FROM pg_stat_activity
+                WHERE datname = current_database() AND pid <> pg_backend_pid() AND xact_start IS NOT NULL)
+           ) END'''
+
+
+def raw_index_sql(entity: str) -> List[str]:
+    """Index DDL for an entity's raw table: loaded_at for the delta scan, plus JSONB join keys."""
+    table = raw_table(entity)
+    statements = [f"CREATE INDEX IF NOT EXISTS {table}_loaded_at_idx ON {table} (loaded_at)"]
+    for path in RAW_JOIN_PATHS.get(entity, []):
+        name = f"{table}_{path.replace('.', '_')}_idx"
+        statements.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ((raw #>> {_path_literal(path)}))")
+    return statements
+
+
+def ensure_raw_indexes(cur, entity: str):
+    for statement in raw_index_sql(entity):
+        cur.execute(statement)
+
+
+def get_watermark(cur, table: str) -> str:
+    cur.execute("SELECT last_loaded_at FROM elt_watermarks WHERE target_table = %s", (table,))
+    row = cur.fetchone()
+    return row[0] if row else '-infinity'
+
+
+def refresh_entity(entity: str, full: bool = False) -> int:
+    """
+    Bring one typed table up to date from its raw table in a single transaction.
+    full=True ignores the watermark and reprocesses every raw row.
+    Returns the number of typed rows inserted or updated.
+    """
+    table = ENTITIES[entity]['table']
+    with metrics.span('elt_refresh', table=table, full=full) as span, pooled_conn() as conn:
+        tx_start = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s)", (raw_table(entity),))
+            if cur.fetchone()[0] is None:
+                print(f"No raw table for {entity}; skipping.")
+                return 0
+            cur.execute(WATERMARK_DDL)
+            cur.execute(typed_table_ddl(entity))
+            ensure_raw_indexes(cur, entity)
+            watermark = '-infinity' if full else get_watermark(cur, table)
+            cur.execute(merge_sql(entity), {'watermark': watermark})
+            written, newest = cur.fetchone()
+            if newest is not None:
+                cur.execute('''
+                INSERT INTO elt_watermarks (target_table, last_loaded_at) VALUES (%s, %s)
+                ON CONFLICT (target_table) DO UPDATE
+                    SET last_loaded_at = EXCLUDED.last_loaded_at, updated_at = CURRENT_TIMESTAMP''',
+                            (table, newest))
+        conn.commit()
+        metrics.observe('pg_transaction_seconds', time.perf_counter() - tx_start, table=table)
+        span.set(rows=written)
+    metrics.inc('rows_loaded_total', written, table=table)
+    print(f"Refreshed {table} from {raw_table(entity)}: {written} rows written.")
+    return written
+
+
+def refresh_all(entities: Optional[List[str]] = None, full: bool = False) -> Dict[str, int]:
+    results = {}
+    for entity in entities or [e for e in ENTITIES if supported(e)]:
+        if not supported(entity):
+            print(f"{entity} needs repo context not stored in {raw_table(entity)}; use the Python transform.")
+            continue
+        results[entity] = refresh_entity(entity, full=full)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refresh typed tables from raw_* JSONB tables inside Postgres.')
+    parser.add_argument('entities', nargs='*', help=f"entities to refresh (default: {', '.join(e for e in ENTITIES if supported(e))})")
+    parser.add_argument('--full', action='store_true', help='ignore watermarks and reprocess every raw row')
+    parser.add_argument('--dry-run', action='store_true', help='print the generated SQL instead of running it')
+    args = parser.parse_args()
+    unknown = [e for e in args.entities if e not in ENTITIES]
+    if unknown:
+        parser.error(f"unknown entities: {', '.join(unknown)}")
+    if args.dry_run:
+        for entity in args.entities or [e for e in ENTITIES if supported(e)]:
+            print(f"-- {entity}")
+            print(';\n'.join(raw_index_sql(entity)) + ';')
+            print(merge_sql(entity) + ';\n')
+    else:
+        metrics.start_run('elt')
+        try:
+            refresh_all(args.entities, full=args.full)
+        finally:
+            close_pg_pool()
+            metrics.finish_run()
@@ -1,14 +1,502 @@
 """
-Entrypoint to run the full ETL pipeline.
+Module: etl_runner.py
+Entrypoint to run the full ETL pipeline for every repo and endpoint in config.yaml.
+
+Each (repo, endpoint) pair is a job that flows through three stages, each with its
+own worker pool:
+- extract: streams pages from GitHub and cuts them into chunks of `chunk_rows`
+- transform: flattens each chunk into a typed Arrow table (transform.py) and, with
+  project_raw, trims the raw records to their declared fields (projection.py)
+- load: writes the chunk to raw_<endpoint> and upserts the typed table (load.py)
+
+With passthrough, endpoints whose typed table can be derived from the raw table
+alone (elt.supported) skip decoding entirely: pages travel as response bytes
+(passthrough.py), are COPYed into raw_<endpoint>, and the typed tables are
+refreshed in SQL by elt.py once the run's loads are done.
+
+With backend: graphql, issues, pull requests and stargazers are fetched over
+GitHub GraphQL (extract_graphql.RepoBatches), one query per batch of repos that
+the jobs of those repos share; the other endpoints, and incremental ones, stay on REST.
+
+Stages are connected by bounded queues, so a slow stage blocks the ones before it
+instead of piling chunks up in memory, and while one repo is loading the next is
+already being fetched: wall time approaches the slowest stage, not the sum. A
+failure only fails its own job; the rest of the run carries on and the failures
+are reported at the end.
+
+Usage:
+    python -m github_etl.etl_runner [--config PATH] [--repos owner/name ...]
+                                    [--endpoints commits issues ...] [--incremental] [--passthrough]
+                                    [--backend rest|graphql] [--dry-run]
 """
 
-from extract import extract_repos
-from transform import transform_repos
-from load import load_repos_to_postgres
+import argparse
+import heapq
+import itertools
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Union
+from urllib.parse import quote
+
+import yaml
+
+from github_etl import elt, extract, extract_graphql, load, metrics, projection
+from github_etl.passthrough import iter_page_batches
+from github_etl.state import WatermarkStore
+from github_etl.transform import transform_records
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.yaml')
+
+# Per-repo endpoints the runner knows how to extract, transform and load
+# ('repos' is the repo's own metadata: raw_repos and dim_repos)
+ENDPOINTS = ['repos', 'commits', 'issues', 'pull_requests', 'events', 'stargazers', 'contributors']
+
+RUNNER_DEFAULTS = {
+    'extract_workers': 4,
+    'transform_workers': 2,
+    'load_workers': 2,
+    # Chunks buffered between two stages
+    'queue_size': 8,
+    'chunk_rows': load.DEFAULT_BATCH_SIZE,
+    'load_raw': True,
+    # Project raw records before storing them: false, true, or 'measure' (report bytes, store as is)
+    'project_raw': False,
+    'incremental': False,
+    # Load raw tables straight from response bytes, then refresh typed tables in SQL (elt.py)
+    'passthrough': False,
+    # API for issues, pull_requests and stargazers: rest or graphql (batched across repos)
+    'backend': 'rest',
+    # Extract order per endpoint, lowest first (unlisted endpoints are 0); ties keep repo-major order
+    'priorities': None,
+}
+
+_DONE = object()
+_VAR_REF = re.compile(r'\$\{(\w+)\}')
+
+
+def _expand(value: Any) -> Any:
+    """
+    Expand environment variables in config strings. A value that is a single ${VAR}
+    reference becomes None when VAR is unset; any other '$' is left as written.
+    """
+    if isinstance(value, dict):
+        return {k: _expand(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_expand(v) for v in value]
+    if isinstance(value, str):
+        ref = _VAR_REF.fullmatch(value)
+        return os.environ.get(ref.group(1)) if ref else os.path.expandvars(value)
+    return value
+
+
+def load_config(path: str = DEFAULT_CONFIG_PATH) -> Dict[str, Any]:
+    """Read config.yaml, expanding environment variables and filling runner defaults."""
+    with open(path) as f:
+        config = _expand(yaml.safe_load(f) or {})
+    config['repos'] = config.get('repos') or []
+    config['endpoints'] = config.get('endpoints') or list(ENDPOINTS)
+    unknown = [e for e in config['endpoints'] if e not in ENDPOINTS]
+    if unknown:
+        raise ValueError(f"Unknown endpoints in {path}: {', '.join(unknown)}")
+    config['runner'] = dict(RUNNER_DEFAULTS, **(config.get('runner') or {}))
+    unknown = [e for e in (config['runner']['priorities'] or {}) if e not in ENDPOINTS]
+    if unknown:
+        raise ValueError(f"Unknown endpoints in {path} runner.priorities: {', '.join(unknown)}")
+    return config
+
+
+def apply_config(config: Dict[str, Any]):
+    """Use the config's token and database settings where the environment sets none."""
+    if config.get('github_token') and not (os.getenv('GITHUB_PATS') or os.getenv('GITHUB_PAT')):
+        os.environ['GITHUB_PAT'] = config['github_token']
+    db = config.get('db') or {}
+    if not load.POSTGRES_URL and all(db.get(k) for k in ('host', 'user', 'database')):
+        password = f":{quote(str(db['password']), safe='')}" if db.get('password') else ''
+        load.POSTGRES_URL = (f"postgresql://{quote(str(db['user']), safe='')}{password}"
+                             f"@{db['host']}:{db.get('port', 5432)}/{db['database']}")
+
+
+class Job:
+    """One (repo, endpoint) extraction moving through the pipeline."""
+
+    def __init__(self, owner: str, repo: str, endpoint: str, repo_span: metrics.Span, priority: int = 0):
+        self.owner = owner
+        self.repo = repo
+        self.endpoint = endpoint
+        self.priority = priority
+        self.full_name = f"{owner}/{repo}"
+        self.span = metrics.start_span('endpoint', parent=repo_span, endpoint=endpoint)
+        self.extracted = 0
+        self.loaded = 0
+        self.chunks = 0
+        self.pending = 0  # chunks extracted but not yet loaded or dropped
+        self.extract_done = False
+        self.error: Optional[str] = None
+
+    def result(self) -> Dict[str, Any]:
+        return {'extracted': self.extracted, 'loaded': self.loaded, 'error': self.error}
+
+
+class Chunk:
+    """
+    A batch of raw records of one job (or, with `raw`, of undecoded RawPages);
+    `future` resolves once it is loaded (or dropped).
+    """
+
+    def __init__(self, job: Job, index: int, rows: List[Any], raw: bool = False):
+        self.job = job
+        self.index = index
+        self.rows = rows
+        self.raw = raw
+        self.records = sum(len(page) for page in rows) if raw else len(rows)
+        self.table = None
+        self.future = Future()
+
+
+class JobQueue(queue.Queue):
+    """
+    Extract queue handing out jobs lowest priority first, in submission order within
+    a priority. _DONE sorts after every job, so closing the stage still drains it.
+    """
+
+    def _init(self, maxsize: int):
+        self.queue = []
+        self._seq = itertools.count()
+
+    def _qsize(self) -> int:
+        return len(self.queue)
+
+    def _put(self, item: Any):
+        priority = float('inf') if item is _DONE else item.priority
+        heapq.heappush(self.queue, (priority, next(self._seq), item))
+
+    def _get(self) -> Any:
+        return heapq.heappop(self.queue)[-1]
+
+
+class Stage:
+    """A pool of worker threads applying `fn` to each item of `inbox`."""
+
+    def __init__(self, name: str, fn: Callable, workers: int, inbox: queue.Queue):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.span = metrics.start_span('stage', stage=name, workers=workers)
+        self.busy = 0.0
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, name=f"etl-{name}-{i}", daemon=True)
+                         for i in range(max(workers, 1))]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                return
+            start = time.perf_counter()
+            self.fn(item)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.busy += elapsed
+            metrics.inc('runner_stage_busy_seconds_total', elapsed, stage=self.name)
+
+    def close(self):
+        """Wait for every queued item to be processed, then stop the workers."""
+        for _ in self._threads:
+            self.inbox.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+        self.span.set(busy_seconds=self.busy)
+        self.span.finish()
+
+
+class Pipeline:
+    """Extract -> transform -> load job graph over many repos and endpoints."""
+
+    def __init__(self, repos: List[Dict[str, str]], endpoints: List[str] = ENDPOINTS,
+                 extract_workers: int = 4, transform_workers: int = 2, load_workers: int = 2,
+                 queue_size: int = 8, chunk_rows: int = load.DEFAULT_BATCH_SIZE,
+                 load_raw: bool = True, project_raw: Union[bool, str] = False, incremental: bool = False,
+                 store: Optional[WatermarkStore] = None, projections: Optional[Dict[str, Any]] = None,
+                 passthrough: bool = False, backend: str = 'rest', priorities: Optional[Dict[str, int]] = None):
+        if passthrough and project_raw:
+            raise ValueError("project_raw needs decoded records; it can't be combined with passthrough")
+        if backend not in ('rest', 'graphql'):
+            raise ValueError(f"Unknown backend {backend!r}; expected 'rest' or 'graphql'")
+        self.repos = repos
+        self.endpoints = endpoints
+        self.workers = {'extract': extract_workers, 'transform': transform_workers, 'load': load_workers}
+        self.queue_size = queue_size
+        self.chunk_rows = chunk_rows
+        self.load_raw = load_raw
+        self.project_raw = project_raw
+        self.projections = projections or {}
+        self.incremental = incremental
+        self.passthrough = passthrough
+        self.backend = backend
+        self.priorities = priorities or {}
+        self.store = store
+        self._graphql: Optional[extract_graphql.RepoBatches] = None
+        self._lock = threading.Lock()
+        self._repo_pending: Dict[str, int] = {}
+        self._repo_spans: Dict[str, metrics.Span] = {}
+        self._payload_bytes: Dict[str, List[int]] = {}  # endpoint -> [records, before, after]
+
+    def run(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Run every job; returns {repo: {endpoint: {'extracted', 'loaded', 'error'}}}."""
+        if self.incremental and self.store is None:
+            self.store = WatermarkStore()
+        if self.backend == 'graphql':
+            self._graphql = extract_graphql.RepoBatches([(r['owner'], r['name']) for r in self.repos])
+        job_queue = JobQueue()
+        self._transform_queue = queue.Queue(maxsize=self.queue_size)
+        self._load_queue = queue.Queue(maxsize=self.queue_size)
+        jobs = []
+        start = time.perf_counter()
+        with metrics.span('pipeline', **self.workers) as span:
+            # Repo-major order within a priority, so one repo's load overlaps the next repo's extract
+            for entry in self.repos:
+                owner, repo = entry['owner'], entry['name']
+                full_name = f"{owner}/{repo}"
+                self._repo_spans[full_name] = metrics.start_span('repo', repo=full_name)
+                self._repo_pending[full_name] = len(self.endpoints)
+                for endpoint in self.endpoints:
+                    jobs.append(Job(owner, repo, endpoint, self._repo_spans[full_name],
+                                    priority=self.priorities.get(endpoint, 0)))
+                    job_queue.put(jobs[-1])
+            stages = [Stage('load', self._load, self.workers['load'], self._load_queue),
+                      Stage('transform', self._transform, self.workers['transform'], self._transform_queue),
+                      Stage('extract', self._extract, self.workers['extract'], job_queue)]
+            # Close front to back: each close drains a stage before the next one is told to stop
+            for stage in reversed(stages):
+                stage.close()
+            failed = [job for job in jobs if job.error]
+            span.set(jobs=len(jobs), failed=len(failed))
+            refreshed = self._refresh_typed(jobs)
+        wall = time.perf_counter() - start
+
+        results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for job in jobs:
+            results.setdefault(job.full_name, {})[job.endpoint] = job.result()
+        print(f"ETL finished in {wall:.1f}s: {len(jobs) - len(failed)}/{len(jobs)} jobs succeeded, "
+              f"{sum(j.loaded for j in jobs)} rows loaded. Stage busy time: "
+              + ', '.join(f"{stage.name} {stage.busy:.1f}s" for stage in reversed(stages)))
+        for job in failed:
+            print(f"  FAILED {job.full_name} {job.endpoint}: {job.error}")
+        if refreshed:
+            print("Typed tables refreshed from raw (passthrough): "
+                  + ', '.join(f"{entity} {rows}" for entity, rows in sorted(refreshed.items())))
+        if self._payload_bytes:
+            print("Raw payload bytes before/after projection"
+                  + (" (measure only, stored unprojected):" if self.project_raw == 'measure' else ":"))
+            projection.print_report([
+                {'endpoint': e, 'records': n, 'bytes_before': b, 'bytes_after': a,
+                 'saved_pct': round(100.0 * (b - a) / b, 1) if b else 0.0}
+                for e, (n, b, a) in sorted(self._payload_bytes.items())])
+        return results
+
+    def _is_incremental(self, endpoint: str) -> bool:
+        return self.incremental and endpoint in extract.INCREMENTAL_ENDPOINTS
+
+    def _uses_graphql(self, endpoint: str) -> bool:
+        return (self.backend == 'graphql' and endpoint in extract_graphql.CONNECTIONS
+                and not self._is_incremental(endpoint))
+
+    def _is_passthrough(self, endpoint: str) -> bool:
+        # GraphQL records are reshaped into the REST layout, so there are no response bytes to pass through
+        return self.passthrough and self.load_raw and elt.supported(endpoint) and not self._uses_graphql(endpoint)
+
+    def _refresh_typed(self, jobs: List[Job]) -> Dict[str, int]:
+        """Build typed tables from the raw rows passthrough jobs loaded (in SQL, via elt.py)."""
+        entities = sorted({job.endpoint for job in jobs
+                           if self._is_passthrough(job.endpoint) and job.loaded and not job.error})
+        if not entities:
+            return {}
+        with metrics.span('elt', entities=','.join(entities)):
+            return elt.refresh_all(entities)
+
+    def _put(self, target: queue.Queue, chunk: Chunk, stage: str):
+        """Hand a chunk to the next stage, blocking while it is full (backpressure)."""
+        start = time.perf_counter()
+        target.put(chunk)
+        waited = time.perf_counter() - start
+        if waited > 0.001:
+            metrics.inc('runner_backpressure_seconds_total', waited, stage=stage)
+
+    def _extract(self, job: Job):
+        with metrics.span('extract', parent=job.span) as span:
+            try:
+                raw = self._is_passthrough(job.endpoint)
+                if self._is_incremental(job.endpoint):
+                    # The cursor is checkpointed after on_page returns, so wait for the load
+                    extract.extract_incremental(
+                        job.owner, job.repo, job.endpoint, store=self.store, raw=raw,
+                        on_page=lambda page: self._submit(job, [page] if raw else page, raw).future.result())
+                else:
+                    if self._uses_graphql(job.endpoint):
+                        pages = self._graphql.records(job.owner, job.repo, job.endpoint)
+                    else:
+                        fetch = extract.extract_repo if job.endpoint == 'repos' else getattr(extract, f"extract_{job.endpoint}")
+                        pages = fetch(job.owner, job.repo, stream=True, raw=raw)
+                    batches = iter_page_batches(pages, self.chunk_rows) if raw else load.iter_batches(pages, self.chunk_rows)
+                    for rows in batches:
+                        self._submit(job, rows, raw)
+                        if job.error:
+                            break
+            except Exception as exc:
+                self._fail(job, 'extract', exc)
+            span.set(rows=job.extracted, chunks=job.chunks)
+        with self._lock:
+            job.extract_done = True
+        self._maybe_finish(job)
+
+    def _submit(self, job: Job, rows: List[Any], raw: bool = False) -> Chunk:
+        chunk = Chunk(job, job.chunks, rows, raw)
+        with self._lock:
+            job.chunks += 1
+            job.pending += 1
+            job.extracted += chunk.records
+        self._put(self._transform_queue, chunk, 'extract')
+        return chunk
+
+    def _transform(self, chunk: Chunk):
+        job = chunk.job
+        if job.error:
+            return self._drop(chunk)
+        if chunk.raw:
+            # Typed tables are derived in SQL after the run; nothing to decode here
+            return self._put(self._load_queue, chunk, 'transform')
+        try:
+            with metrics.span('transform', parent=job.span, chunk=chunk.index, rows=len(chunk.rows)):
+                chunk.table = transform_records(job.endpoint, chunk.rows, {'repo_full_name': job.full_name})
+                if self.project_raw and self.load_raw:
+                    self._project(chunk)
+        except Exception as exc:
+            self._fail(job, 'transform', exc)
+            return self._drop(chunk)
+        self._put(self._load_queue, chunk, 'transform')
+
+    def _project(self, chunk: Chunk):
+        job = chunk.job
+        projected = projection.project_records(job.endpoint, chunk.rows, self.projections.get(job.endpoint))
+        before, after = projection.payload_bytes(chunk.rows), projection.payload_bytes(projected)
+        metrics.inc('raw_payload_bytes_total', before, endpoint=job.endpoint, phase='before')
+        metrics.inc('raw_payload_bytes_total', after, endpoint=job.endpoint, phase='after')
+        with self._lock:
+            totals = self._payload_bytes.setdefault(job.endpoint, [0, 0, 0])
+            totals[0] += len(chunk.rows)
+            totals[1] += before
+            totals[2] += after
+        if self.project_raw != 'measure':
+            chunk.rows = projected
+
+    def _load(self, chunk: Chunk):
+        job = chunk.job
+        if job.error:
+            return self._drop(chunk)
+        try:
+            with metrics.span('load', parent=job.span, chunk=chunk.index):
+                if chunk.raw:
+                    loaded = load.load_raw_passthrough(elt.raw_table(job.endpoint), chunk.rows,
+                                                       repo_full_name=job.full_name)
+                else:
+                    if self.load_raw:
+                        load.load_raw_to_postgres(elt.raw_table(job.endpoint), chunk.rows,
+                                                  repo_full_name=job.full_name)
+                    loaded = load.load_typed_to_postgres(job.endpoint, chunk.table)
+        except Exception as exc:
+            self._fail(job, 'load', exc)
+            return self._drop(chunk)
+        with self._lock:
+            job.loaded += loaded
+            job.pending -= 1
+        chunk.future.set_result(loaded)
+        self._maybe_finish(job)
+
+    def _fail(self, job: Job, stage: str, exc: Exception):
+        with self._lock:
+            if job.error is None:
+                job.error = f"{stage}: {type(exc).__name__}: {exc}"
+        metrics.inc('runner_jobs_failed_total', stage=stage)
+
+    def _drop(self, chunk: Chunk):
+        """Discard a chunk of a failed job."""
+        with self._lock:
+            chunk.job.pending -= 1
+        chunk.future.set_exception(RuntimeError(chunk.job.error))
+        self._maybe_finish(chunk.job)
+
+    def _maybe_finish(self, job: Job):
+        """Close the job's span once it is fully extracted and every chunk is settled."""
+        with self._lock:
+            if not job.extract_done or job.pending or job.span.duration is not None:
+                return
+            job.span.set(rows=job.extracted, loaded=job.loaded)
+            job.span.error = job.error
+            job.span.finish()
+            self._repo_pending[job.full_name] -= 1
+            repo_done = not self._repo_pending[job.full_name]
+        status = f"FAILED ({job.error})" if job.error else f"{job.extracted} extracted, {job.loaded} loaded"
+        print(f"{job.full_name} {job.endpoint}: {status}")
+        if repo_done:
+            self._repo_spans[job.full_name].finish()
+
+
+def run_from_config(config: Dict[str, Any]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    apply_config(config)
+    return Pipeline(config['repos'], config['endpoints'], projections=config.get('projection'),
+                    **config['runner']).run()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Run extract, transform and load for the repos in config.yaml.')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH, help='path to config.yaml')
+    parser.add_argument('--repos', nargs='*', help='only these owner/name repos (default: all configured)')
+    parser.add_argument('--endpoints', nargs='*', choices=ENDPOINTS, help='only these endpoints')
+    parser.add_argument('--incremental', action='store_true', help='extract only records newer than the stored watermarks')
+    parser.add_argument('--passthrough', action='store_true',
+                        help='load raw tables from response bytes and build typed tables in SQL')
+    parser.add_argument('--backend', choices=['rest', 'graphql'],
+                        help='API for issues, pull_requests and stargazers (default: config runner.backend)')
+    parser.add_argument('--dry-run', action='store_true', help='print the job plan and exit')
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    if args.repos:
+        configured = {f"{r['owner']}/{r['name']}" for r in config['repos']}
+        config['repos'] = [{'owner': name.split('/')[0], 'name': name.split('/')[1]} for name in args.repos]
+        extra = set(args.repos) - configured
+        if extra:
+            print(f"Note: {', '.join(sorted(extra))} not in {args.config}")
+    if args.endpoints:
+        config['endpoints'] = args.endpoints
+    if args.incremental:
+        config['runner']['incremental'] = True
+    if args.passthrough:
+        config['runner']['passthrough'] = True
+    if args.backend:
+        config['runner']['backend'] = args.backend
+    if args.dry_run:
+        print(f"{len(config['repos'])} repos x {len(config['endpoints'])} endpoints; runner: {config['runner']}")
+        for r in config['repos']:
+            print(f"  {r['owner']}/{r['name']}: {', '.join(config['endpoints'])}")
+        return 0
+
+    metrics.start_run('etl_runner')
+    try:
+        results = run_from_config(config)
+    finally:
+        load.close_pg_pool()
+        extract.close_http_cache()
+        metrics.finish_run()
+    return 1 if any(r['error'] for endpoints in results.values() for r in endpoints.values()) else 0
+
 
 if __name__ == "__main__":
-    # Example usage: extract, transform, load for repos
-    raw_repos = extract_repos("example_org")
-    transformed = transform_repos(raw_repos)
-    load_repos_to_postgres(transformed)
-    print("ETL pipeline completed.")
+    sys.exit(main())
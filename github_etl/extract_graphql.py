@@ -0,0 +1,362 @@
+"""
+Module: extract_graphql.py
+Optional GraphQL backend for GitHub extraction, with the same extract_* signatures as extract.py.
+
+Several repos and their nested connections (issues, pull requests, stargazers)
+are fetched in one query using aliases; connections that have more pages are
+then paged together, one batched query per round of cursors. RepoBatches lets
+the runner share those batched queries between its per-repo jobs. Single-repo
+extract_* calls page their one connection, a page of records at a time when
+streaming. Nodes are reshaped into the REST record layout, so raw loads and
+transforms work unchanged. The GraphQL point cost reported by `rateLimit` is
+tracked in STATS. Repos that are missing or inaccessible (null aliases) are
+skipped with a note.
+
+Differences from REST: issues exclude pull requests; commits, events and
+contributors have no GraphQL equivalent and are delegated to the REST backend.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from github_etl import extract, metrics
+from github_etl.scheduler import TokenPool, load_github_tokens
+
+GITHUB_GRAPHQL_URL = os.getenv('GITHUB_GRAPHQL_URL', 'https://api.github.com/graphql')
+
+# Repos (or pending cursors) combined into one GraphQL query
+GRAPHQL_BATCH_SIZE = int(os.getenv('GITHUB_GRAPHQL_BATCH_SIZE', '10'))
+PAGE_SIZE = 100
+
+STATS = {'requests': 0, 'points': 0, 'remaining': None}
+
+_TOKEN_POOL = None
+_LOCK = threading.Lock()
+
+# Delegated to REST: no GraphQL equivalent
+extract_commits = extract.extract_commits
+extract_events = extract.extract_events
+extract_contributors = extract.extract_contributors
+
+_AUTHOR = 'author { login ... on User { databaseId } }'
+REPO_FIELDS = ('databaseId name nameWithOwner owner { login ... on User { databaseId } ... on Organization { databaseId } } '
+               'description primaryLanguage { name } isPrivate isFork isArchived defaultBranchRef { name } '
+               'stargazerCount forkCount openIssues: issues(states: [OPEN]) { totalCount } createdAt updatedAt pushedAt')
+CONNECTIONS = {
+    'issues': {
+        'field': 'issues',
+        'select': f'nodes {{ databaseId number title state {_AUTHOR} comments {{ totalCount }} createdAt updatedAt closedAt }}',
+    },
+    'pull_requests': {
+        'field': 'pullRequests',
+        'select': (f'nodes {{ databaseId number title state isDraft {_AUTHOR} headRefOid headRefName baseRefName '
+                   'mergeCommit { oid } createdAt updatedAt closedAt mergedAt }'),
+    },
+    'stargazers': {
+        'field': 'stargazers',
+        'select': 'edges { starredAt node { login databaseId } }',
+    },
+}
+
+
+def get_graphql_token_pool() -> TokenPool:
+    """GraphQL has its own quota per token, so it gets its own pool."""
+    global _TOKEN_POOL
+    with _LOCK:
+        if _TOKEN_POOL is None:
+            _TOKEN_POOL = TokenPool(load_github_tokens())
+        return _TOKEN_POOL
+
+
+def graphql_request(query: str) -> Dict[str, Any]:
+    """POST one GraphQL query through the shared session and token pool; returns `data`."""
+    session = extract.get_github_session()
+    pool = get_graphql_token_pool()
+    while True:
+        token = pool.acquire()
+        start = time.perf_counter()
+        resp = session.post(GITHUB_GRAPHQL_URL, json={'query': query}, headers={
+            'Authorization': f'bearer {token.token}',
+            'User-Agent': 'ai-warehouse-etl',
+        })
+        metrics.observe('github_graphql_request_seconds', time.perf_counter() - start, status=resp.status_code)
+        if resp.status_code == 401:
+            raise RuntimeError("GitHub authentication failed. Check your GITHUB_PAT.")
+        secondary = resp.status_code == 403 and 'secondary rate limit' in resp.text.lower()
+        if pool.update(token, resp.status_code, resp.headers, secondary=secondary):
+            continue
+        resp.raise_for_status()
+        body = resp.json()
+        errors = body.get('errors') or []
+        # A missing repo comes back as a null alias plus a NOT_FOUND error; callers skip those
+        if errors and (body.get('data') is None or any(e.get('type') != 'NOT_FOUND' for e in errors)):
+            raise RuntimeError(f"GraphQL errors: {errors}")
+        data = body['data']
+        rate = data.pop('rateLimit', None) or {}
+        with _LOCK:
+            STATS['requests'] += 1
+            STATS['points'] += rate.get('cost', 0)
+            STATS['remaining'] = rate.get('remaining', STATS['remaining'])
+        metrics.inc('github_graphql_points_total', rate.get('cost', 0))
+        metrics.inc('github_bytes_total', len(resp.content))
+        return data
+
+
+def _lit(value: Any) -> str:
+    """GraphQL literal for a string/int argument."""
+    return json.dumps(value)
+
+
+def _connection_args(name: str, options: Dict[str, Any], after: Optional[str]) -> str:
+    args = [f'first: {PAGE_SIZE}']
+    if after:
+        args.append(f'after: {_lit(after)}')
+    if name == 'issues':
+        states = {'open': '[OPEN]', 'closed': '[CLOSED]'}.get(options.get('state', 'all'), '[OPEN, CLOSED]')
+        args.append(f'states: {states}')
+        args.append('orderBy: {field: UPDATED_AT, direction: ASC}')
+        if options.get('since'):
+            args.append(f"filterBy: {{since: {_lit(options['since'])}}}")
+    elif name == 'pull_requests':
+        states = {'open': '[OPEN]', 'closed': '[CLOSED, MERGED]'}.get(options.get('state', 'all'), '[OPEN, CLOSED, MERGED]')
+        args.append(f'states: {states}')
+        args.append('orderBy: {field: UPDATED_AT, direction: ASC}')
+    return ', '.join(args)
+
+
+def _connection_query(name: str, options: Dict[str, Any], after: Optional[str] = None) -> str:
+    spec = CONNECTIONS[name]
+    return (f"{name}: {spec['field']}({_connection_args(name, options, after)}) "
+            f"{{ totalCount pageInfo {{ hasNextPage endCursor }} {spec['select']} }}")
+
+
+def _repo_alias(owner: str, repo: str, body: str, alias: str) -> str:
+    return f'{alias}: repository(owner: {_lit(owner)}, name: {_lit(repo)}) {{ {body} }}'
+
+
+def _query(parts: List[str]) -> str:
+    return '{ ' + ' '.join(parts) + ' rateLimit { cost remaining resetAt } }'
+
+
+def _user(node: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not node:
+        return None
+    return {'login': node.get('login'), 'id': node.get('databaseId')}
+
+
+def repo_to_rest(node: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': node.get('databaseId'),
+        'name': node.get('name'),
+        'full_name': node.get('nameWithOwner'),
+        'owner': _user(node.get('owner')),
+        'description': node.get('description'),
+        'language': (node.get('primaryLanguage') or {}).get('name'),
+        'private': node.get('isPrivate'),
+        'fork': node.get('isFork'),
+        'archived': node.get('isArchived'),
+        'default_branch': (node.get('defaultBranchRef') or {}).get('name'),
+        'stargazers_count': node.get('stargazerCount'),
+        'forks_count': node.get('forkCount'),
+        'open_issues_count': (node.get('openIssues') or {}).get('totalCount'),
+        'created_at': node.get('createdAt'),
+        'updated_at': node.get('updatedAt'),
+        'pushed_at': node.get('pushedAt'),
+    }
+
+
+def issue_to_rest(node: Dict[str, Any], full_name: str) -> Dict[str, Any]:
+    return {
+        'id': node.get('databaseId'),
+        'repository_url': f"{extract.GITHUB_API_BASE}repos/{full_name}",
+        'number': node.get('number'),
+        'title': node.get('title'),
+        'state': (node.get('state') or '').lower(),
+        'user': _user(node.get('author')),
+        'comments': (node.get('comments') or {}).get('totalCount'),
+        'created_at': node.get('createdAt'),
+        'updated_at': node.get('updatedAt'),
+        'closed_at': node.get('closedAt'),
+    }
+
+
+def pull_request_to_rest(node: Dict[str, Any], full_name: str) -> Dict[str, Any]:
+    state = (node.get('state') or '').lower()
+    return {
+        'id': node.get('databaseId'),
+        'number': node.get('number'),
+        'title': node.get('title'),
+        'state': 'closed' if state == 'merged' else state,
+        'draft': node.get('isDraft'),
+        'user': _user(node.get('author')),
+        'head': {'sha': node.get('headRefOid'), 'ref': node.get('headRefName')},
+        'base': {'ref': node.get('baseRefName'), 'repo': {'full_name': full_name}},
+        'merge_commit_sha': (node.get('mergeCommit') or {}).get('oid'),
+        'created_at': node.get('createdAt'),
+        'updated_at': node.get('updatedAt'),
+        'closed_at': node.get('closedAt'),
+        'merged_at': node.get('mergedAt'),
+    }
+
+
+def stargazer_to_rest(edge: Dict[str, Any], full_name: str) -> Dict[str, Any]:
+    return {'starred_at': edge.get('starredAt'), 'user': _user(edge.get('node'))}
+
+
+_TO_REST = {
+    'issues': ('nodes', issue_to_rest),
+    'pull_requests': ('nodes', pull_request_to_rest),
+    'stargazers': ('edges', stargazer_to_rest),
+}
+
+
+def extract_repos_batch(repos: List[Tuple[str, str]], connections: Tuple[str, ...] = ('issues', 'pull_requests', 'stargazers'),
+                        options: Optional[Dict[str, Dict[str, Any]]] = None,
+                        include_repo: bool = True) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch repo metadata plus the given connections for many (owner, repo) pairs.
+    Returns {"owner/repo": {"repo": {...}, "issues": [...], ...}} in REST layout.
+    `options` maps a connection name to its filters ({'state': 'open', 'since': ...}).
+    With include_repo=False only the connections are selected and "repo" stays None.
+    """
+    options = options or {}
+    results = {f"{owner}/{repo}": {'repo': None, **{c: [] for c in connections}} for owner, repo in repos}
+    pending = []  # (owner, repo, connection, cursor)
+
+    def collect(owner: str, repo: str, name: str, conn: Optional[Dict[str, Any]]):
+        full_name = f"{owner}/{repo}"
+        if conn is None:
+            print(f"GraphQL: {full_name} {name} not found or not accessible; skipping.")
+            return
+        items_key, to_rest = _TO_REST[name]
+        results[full_name][name].extend(to_rest(item, full_name) for item in conn.get(items_key) or [])
+        if conn['pageInfo']['hasNextPage']:
+            pending.append((owner, repo, name, conn['pageInfo']['endCursor']))
+
+    for start in range(0, len(repos), GRAPHQL_BATCH_SIZE):
+        chunk = repos[start:start + GRAPHQL_BATCH_SIZE]
+        parts = []
+        for i, (owner, repo) in enumerate(chunk):
+            fields = ([REPO_FIELDS] if include_repo else []) + [_connection_query(c, options.get(c, {})) for c in connections]
+            parts.append(_repo_alias(owner, repo, ' '.join(fields), f'r{i}'))
+        data = graphql_request(_query(parts))
+        for i, (owner, repo) in enumerate(chunk):
+            node = data.get(f'r{i}')
+            if node is None:
+                print(f"GraphQL: {owner}/{repo} not found or not accessible; skipping.")
+                continue
+            if include_repo:
+                results[f"{owner}/{repo}"]['repo'] = repo_to_rest(node)
+            for name in connections:
+                collect(owner, repo, name, node.get(name))
+
+    # Page every unfinished connection, many cursors per query
+    while pending:
+        chunk, pending = pending[:GRAPHQL_BATCH_SIZE], pending[GRAPHQL_BATCH_SIZE:]
+        parts = [_repo_alias(owner, repo, _connection_query(name, options.get(name, {}), cursor), f'p{i}')
+                 for i, (owner, repo, name, cursor) in enumerate(chunk)]
+        data = graphql_request(_query(parts))
+        for i, (owner, repo, name, _) in enumerate(chunk):
+            # The repo can disappear (or turn private) between two pages
+            collect(owner, repo, name, (data.get(f'p{i}') or {}).get(name))
+    return results
+
+
+class RepoBatches:
+    """
+    One connection per job for many repos, fetched GRAPHQL_BATCH_SIZE repos per query.
+    The runner creates it with the run's repo list; the first job to ask for a
+    (batch of repos, connection) runs extract_repos_batch for the whole batch and
+    the other repos' jobs take their records from that result.
+    """
+
+    def __init__(self, repos: List[Tuple[str, str]], options: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.options = options or {}
+        self._batch_of: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        for start in range(0, len(repos), GRAPHQL_BATCH_SIZE):
+            batch = tuple(repos[start:start + GRAPHQL_BATCH_SIZE])
+            for owner, repo in batch:
+                self._batch_of[f"{owner}/{repo}"] = batch
+        self._results: Dict[Tuple[Any, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def records(self, owner: str, repo: str, connection: str) -> List[Dict[str, Any]]:
+        """REST-shaped records of one repo's connection (each is handed out once)."""
+        full_name = f"{owner}/{repo}"
+        key = (self._batch_of.get(full_name, ((owner, repo),)), connection)
+        with self._lock:
+            future = self._results.get(key)
+            fetch = future is None
+            if fetch:
+                future = self._results[key] = Future()
+        if fetch:
+            try:
+                future.set_result(extract_repos_batch(list(key[0]), (connection,), self.options, include_repo=False))
+            except Exception as exc:
+                future.set_exception(exc)
+        return future.result()[full_name].pop(connection, [])
+
+
+def iter_connection_pages(owner: str, repo: str, name: str,
+                          options: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield one repo's connection a page (up to PAGE_SIZE REST-shaped records) at a time."""
+    full_name = f"{owner}/{repo}"
+    items_key, to_rest = _TO_REST[name]
+    cursor = None
+    while True:
+        data = graphql_request(_query([_repo_alias(owner, repo, _connection_query(name, options or {}, cursor), 'r')]))
+        conn = (data.get('r') or {}).get(name)
+        if conn is None:
+            print(f"GraphQL: {full_name} {name} not found or not accessible; skipping.")
+            return
+        yield [to_rest(item, full_name) for item in conn.get(items_key) or []]
+        if not conn['pageInfo']['hasNextPage']:
+            return
+        cursor = conn['pageInfo']['endCursor']
+
+
+def _records(pages: Iterator[List[Dict[str, Any]]], stream: bool) -> extract.Records:
+    return pages if stream else [row for page in pages for row in page]
+
+
+def _iter_repo_pages(username: str, is_org: bool) -> Iterator[List[Dict[str, Any]]]:
+    root = 'organization' if is_org else 'user'
+    cursor = None
+    while True:
+        after = f', after: {_lit(cursor)}' if cursor else ''
+        data = graphql_request(_query([
+            f'owner: {root}(login: {_lit(username)}) {{ repositories(first: {PAGE_SIZE}{after}) '
+            f'{{ pageInfo {{ hasNextPage endCursor }} nodes {{ {REPO_FIELDS} }} }} }}']))
+        if data.get('owner') is None:
+            print(f"GraphQL: {username} not found or not accessible; skipping.")
+            return
+        conn = data['owner']['repositories']
+        yield [repo_to_rest(node) for node in conn['nodes']]
+        if not conn['pageInfo']['hasNextPage']:
+            return
+        cursor = conn['pageInfo']['endCursor']
+
+
+def extract_repos(username: str, is_org: bool = True, stream: bool = False) -> extract.Records:
+    """Extract repositories for a given user/org."""
+    return _records(_iter_repo_pages(username, is_org), stream)
+
+
+def extract_issues(owner: str, repo: str, state: str = 'all', since: Optional[str] = None,
+                   stream: bool = False) -> extract.Records:
+    """Extract issues (not pull requests) for a given repo. State can be 'open', 'closed', or 'all'."""
+    return _records(iter_connection_pages(owner, repo, 'issues', {'state': state, 'since': since}), stream)
+
+
+def extract_pull_requests(owner: str, repo: str, state: str = 'all', stream: bool = False) -> extract.Records:
+    """Extract pull requests for a given repo. State can be 'open', 'closed', or 'all'."""
+    return _records(iter_connection_pages(owner, repo, 'pull_requests', {'state': state}), stream)
+
+
+def extract_stargazers(owner: str, repo: str, stream: bool = False) -> extract.Records:
+    """Extract stargazers for a given repo, with starred_at."""
+    return _records(iter_connection_pages(owner, repo, 'stargazers'), stream)
@@ -3,47 +3,420 @@ Module: load.py
 Handles loading of raw GitHub data into the data warehouse (e.g., Postgres).
 """
 
+import hashlib
+import io
+import itertools
 import os
+import threading
+import time
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 import json
-from typing import List, Dict, Any
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from contextlib import contextmanager
+from functools import partial
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Union
 from dotenv import load_dotenv
 
+from github_etl import metrics
+from github_etl.passthrough import RawPage, copy_bytes_escape, iter_page_batches, record_field
+from github_etl.transform import ENTITIES, output_schema
+
 # Load environment variables from .env in project root
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 
 POSTGRES_URL = os.getenv("POSTGRES_URL")
 
+# Rows per INSERT batch / transaction when loading raw tables
+DEFAULT_BATCH_SIZE = int(os.getenv("ETL_LOAD_BATCH_SIZE", "1000"))
+
+# Raw-load strategy: 'copy' (COPY ... FROM STDIN) or 'insert' (execute_batch INSERTs)
+DEFAULT_LOAD_METHOD = os.getenv("ETL_LOAD_METHOD", "copy")
+
+# Upper bound on pooled connections shared by all loads in a run
+PG_POOL_MAX = int(os.getenv("ETL_PG_POOL_MAX", "8"))
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+# Tables whose DDL already ran in this process (see ensure_table)
+_ENSURED_TABLES = set()
+_ENSURED_LOCK = threading.Lock()
+
+
 def get_pg_conn():
     if not POSTGRES_URL:
         raise RuntimeError("POSTGRES_URL not found in environment.")
     return psycopg2.connect(POSTGRES_URL)
 
 
-def load_raw_to_postgres(table: str, data: List[Dict[str, Any]]):
+def get_pg_pool() -> psycopg2.pool.ThreadedConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            if not POSTGRES_URL:
+                raise RuntimeError("POSTGRES_URL not found in environment.")
+            _POOL = psycopg2.pool.ThreadedConnectionPool(1, PG_POOL_MAX, POSTGRES_URL)
+        return _POOL
+
+
+@contextmanager
+def pooled_conn():
+    """
+    Borrow a connection from the shared pool. The transaction is rolled back if the
+    block raises; broken connections are discarded instead of returned to the pool.
+    """
+    pool = get_pg_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def ensure_table(table: str, ddl: str):
+    """Run a table's CREATE/ALTER DDL once per process, in its own short transaction."""
+    with _ENSURED_LOCK:
+        if table in _ENSURED_TABLES:
+            return
+        with pooled_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(ddl)
+            conn.commit()
+        _ENSURED_TABLES.add(table)
+
+
+def close_pg_pool():
+    """Close every pooled connection (call once at the end of a run)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.closeall()
+            _POOL = None
+
+
+def copy_text_escape(value: str) -> str:
+    """Escape a value for the COPY text format (backslash, tab, newline, carriage return)."""
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(cur, table: str, columns: List[str], rows: Iterable[tuple]):
+    """Stream rows of text values into `table` with COPY ... FROM STDIN."""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(copy_text_escape(value) for value in row))
+        buf.write('\n')
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+
+
+def copy_raw_slices(cur, table: str, rows: Iterable[tuple]):
+    """
+    COPY (natural_key, content_hash, raw) rows whose raw value is undecoded JSON bytes
+    already escaped for the COPY text format (RawPage.copy_records).
+    """
+    buf = io.BytesIO()
+    for key, digest, payload in rows:
+        buf.write(b'\t'.join((copy_text_escape(key).encode('utf-8'), digest.encode('ascii'), payload)))
+        buf.write(b'\n')
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} (natural_key, content_hash, raw) FROM STDIN", buf)
+
+
+# Natural key per raw table, built from a field getter (get('user.id')) so decoded
+# records and passthrough pages key identically; other tables are keyed by content hash
+RAW_NATURAL_KEYS = {
+    'raw_repos': lambda get: str(get('id')),
+    'raw_commits': lambda get: get('sha'),
+    'raw_issues': lambda get: str(get('id')),
+    'raw_pull_requests': lambda get: str(get('id')),
+    'raw_events': lambda get: str(get('id')),
+    'raw_stargazers': lambda get: f"{get('user.id')}:{get('starred_at')}",
+    # Anonymous contributors have no id, only an email
+    'raw_contributors': lambda get: str(get('id') or get('email')),
+}
+
+# Per-repo listings whose records don't name their repo: the same user appears once per
+# repo, so their natural key is prefixed with the repo_full_name the caller passes in
+REPO_SCOPED_TABLES = {'raw_stargazers', 'raw_contributors'}
+
+
+def _key_function(table: str, repo_full_name: Optional[str]):
+    key_fn = RAW_NATURAL_KEYS.get(table)
+    if table not in REPO_SCOPED_TABLES:
+        return key_fn
+    if not repo_full_name:
+        raise ValueError(f"{table} rows are keyed per repo; pass repo_full_name")
+    return lambda get: f"{repo_full_name}:{key_fn(get)}"
+
+
+def prepare_raw_rows(table: str, rows: List[Dict[str, Any]], repo_full_name: Optional[str] = None) -> List[tuple]:
+    """
+    Serialize a batch to (natural_key, content_hash, raw_json) tuples.
+    JSON is canonical (sorted keys) so unchanged payloads hash identically across runs.
+    Duplicate keys within a batch keep the last occurrence. REPO_SCOPED_TABLES need
+    `repo_full_name`.
+    """
+    key_fn = _key_function(table, repo_full_name)
+    prepared = {}
+    for row in rows:
+        payload = json.dumps(row, sort_keys=True, separators=(',', ':'))
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        prepared[key_fn(partial(record_field, row)) if key_fn else digest] = digest, payload
+    return [(key, digest, payload) for key, (digest, payload) in prepared.items()]
+
+
+def prepare_raw_slices(table: str, pages: Iterable[RawPage], repo_full_name: Optional[str] = None) -> List[tuple]:
+    """
+    Passthrough counterpart of prepare_raw_rows: (natural_key, content_hash, raw_bytes)
+    per record of undecoded response pages, the bytes already escaped for COPY. Only the
+    natural-key fields are decoded, a column per page, and the bytes are hashed as
+    received (GitHub's key order is stable between requests).
+    """
+    key_fn = _key_function(table, repo_full_name)
+    prepared = {}
+    for page in pages:
+        columns = {}
+
+        def column(path: str, page=page, columns=columns) -> List[Any]:
+            if path not in columns:
+                columns[path] = page.values(path)
+            return columns[path]
+
+        for index, (raw, payload) in enumerate(zip(page.records(), page.copy_records())):
+            digest = hashlib.sha256(raw).hexdigest()
+            prepared[key_fn(lambda path: column(path)[index]) if key_fn else digest] = digest, payload
+    return [(key, digest, payload) for key, (digest, payload) in prepared.items()]
+
+
+def filter_unchanged(cur, table: str, prepared: List[tuple]) -> List[tuple]:
+    """Drop rows whose natural key is already stored with the same content hash."""
+    cur.execute(
+        f"SELECT natural_key, content_hash FROM {table} WHERE natural_key = ANY(%s)",
+        ([key for key, _, _ in prepared],))
+    stored = dict(cur.fetchall())
+    return [row for row in prepared if stored.get(row[0]) != row[1]]
+
+
+def iter_batches(data: Iterable[Any], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Regroup records into lists of at most `batch_size`. `data` may yield records
+    (dicts) or pages of records (lists), as produced by extract_*(stream=True).
+    """
+    batch = []
+    for item in data:
+        rows = item if isinstance(item, list) else [item]
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def load_raw_to_postgres(table: str, data: Iterable[Any], batch_size: int = DEFAULT_BATCH_SIZE,
+                         method: str = DEFAULT_LOAD_METHOD, repo_full_name: Optional[str] = None) -> int:
     """
     Load raw JSON data into a Postgres table as a JSONB column.
-    Table will be auto-created if not exists, with columns: id (serial), raw jsonb, loaded_at timestamp.
+    Table will be auto-created if not exists, with columns: id (serial), natural_key text (unique),
+    content_hash text, raw jsonb, repo_full_name text, loaded_at timestamp.
+
+    `repo_full_name` is stored with each row, and is required for REPO_SCOPED_TABLES,
+    whose natural keys include it.
+
+    Loads are idempotent: rows are upserted by natural key (see RAW_NATURAL_KEYS) and
+    rows whose content hash is unchanged are skipped, so reruns write almost nothing.
+    loaded_at is bumped only when a row is inserted or its content changes.
+
+    `data` can be a list or any iterable of records or pages (e.g. a streaming extract).
+    Rows are written and committed in batches of `batch_size`, so memory stays flat
+    and loading proceeds while later pages are still being fetched.
+    method='copy' streams each batch with COPY FROM STDIN; method='insert' uses
+    execute_batch INSERTs. Connections come from the shared pool.
+    Returns the number of records inserted or updated.
     """
-    if not data:
-        print(f"No data to load for {table}.")
-        return
-    create_sql = f'''
+    if method not in ('copy', 'insert'):
+        raise ValueError(f"Unknown load method: {method}")
+    batches = ((len(batch), prepare_raw_rows(table, batch, repo_full_name))
+               for batch in iter_batches(data, batch_size))
+    return _load_raw_batches(table, batches, method, repo_full_name)
+
+
+def load_raw_passthrough(table: str, pages: Iterable[RawPage], batch_size: int = DEFAULT_BATCH_SIZE,
+                         repo_full_name: Optional[str] = None) -> int:
+    """
+    load_raw_to_postgres for undecoded response pages (extract_*(raw=True)): each
+    record's bytes go into the COPY stream as received, keyed and hashed without
+    decoding the record (see passthrough.py). Whole pages are grouped into batches of
+    at least `batch_size` records. Returns the number of records inserted or updated.
+    """
+    batches = ((sum(len(page) for page in group), prepare_raw_slices(table, group, repo_full_name))
+               for group in iter_page_batches(pages, batch_size))
+    return _load_raw_batches(table, batches, 'passthrough', repo_full_name)
+
+
+def _load_raw_batches(table: str, batches: Iterator[tuple], method: str, repo_full_name: Optional[str] = None) -> int:
+    """Upsert (record_count, prepared_rows) batches into `table`, one transaction each."""
+    table_ddl = f'''
     CREATE TABLE IF NOT EXISTS {table} (
         id SERIAL PRIMARY KEY,
+        natural_key TEXT,
+        content_hash TEXT,
         raw JSONB NOT NULL,
+        repo_full_name TEXT,
         loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS natural_key TEXT;
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS content_hash TEXT;
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS repo_full_name TEXT;
+    CREATE UNIQUE INDEX IF NOT EXISTS {table}_natural_key_idx ON {table} (natural_key)'''
+    # Temp tables belong to the session, so each pooled connection creates its own
+    stage_sql = f'''
+    CREATE TEMP TABLE IF NOT EXISTS {table}_stage (
+        natural_key TEXT, content_hash TEXT, raw JSONB
+    ) ON COMMIT DELETE ROWS'''
+    upsert_clause = f'''
+    ON CONFLICT (natural_key) DO UPDATE
+        SET raw = EXCLUDED.raw, content_hash = EXCLUDED.content_hash, repo_full_name = EXCLUDED.repo_full_name,
+            loaded_at = CURRENT_TIMESTAMP
+        WHERE {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash'''
+    insert_sql = (f"INSERT INTO {table} (natural_key, content_hash, raw, repo_full_name) "
+                  f"VALUES (%s, %s, %s, %s){upsert_clause}")
+    merge_sql = (f"INSERT INTO {table} (natural_key, content_hash, raw, repo_full_name) "
+                 f"SELECT natural_key, content_hash, raw, %s FROM {table}_stage{upsert_clause}")
+    total = 0
+    skipped = 0
+    with metrics.span('load_raw', table=table, method=method) as span:
+        first = next(batches, None)
+        if first is not None:
+            ensure_table(table, table_ddl)
+            with pooled_conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(stage_sql)
+                for count, prepared in itertools.chain([first], batches):
+                    tx_start = time.perf_counter()
+                    with conn.cursor() as cur:
+                        changed = filter_unchanged(cur, table, prepared)
+                        if changed and method == 'insert':
+                            with metrics.timer('pg_copy_seconds', table=table, method=method):
+                                psycopg2.extras.execute_batch(cur, insert_sql, [row + (repo_full_name,) for row in changed])
+                        elif changed:
+                            with metrics.timer('pg_copy_seconds', table=table, method=method):
+                                if method == 'passthrough':
+                                    copy_raw_slices(cur, f"{table}_stage", changed)
+                                else:
+                                    copy_rows(cur, f"{table}_stage", ['natural_key', 'content_hash', 'raw'], changed)
+                            cur.execute(merge_sql, (repo_full_name,))
+                    conn.commit()
+                    metrics.observe('pg_transaction_seconds', time.perf_counter() - tx_start, table=table)
+                    total += len(changed)
+                    skipped += count - len(changed)
+        span.set(rows=total, skipped=skipped)
+    metrics.inc('rows_loaded_total', total, table=table)
+    metrics.inc('rows_skipped_total', skipped, table=table)
+    if span.duration:
+        metrics.set_gauge('load_rows_per_second', (total + skipped) / span.duration, table=table)
+    if not total and not skipped:
+        print(f"No data to load for {table}.")
+        return 0
+    print(f"Loaded {total} records into {table} ({skipped} unchanged skipped).")
+    return total
+
+
+def pg_type_for_arrow(arrow_type: pa.DataType) -> str:
+    """Postgres column type for an Arrow column type."""
+    if pa.types.is_integer(arrow_type):
+        return 'BIGINT'
+    if pa.types.is_floating(arrow_type):
+        return 'DOUBLE PRECISION'
+    if pa.types.is_boolean(arrow_type):
+        return 'BOOLEAN'
+    if pa.types.is_timestamp(arrow_type):
+        return 'TIMESTAMPTZ' if arrow_type.tz else 'TIMESTAMP'
+    return 'TEXT'
+
+
+def copy_arrow_table(cur, table: str, data: pa.Table):
+    """COPY an Arrow table into Postgres, CSV-encoded by Arrow (no per-row Python objects)."""
+    buf = io.BytesIO()
+    pacsv.write_csv(data, buf, write_options=pacsv.WriteOptions(include_header=False))
+    buf.seek(0)
+    col_names = ', '.join(f'"{name}"' for name in data.schema.names)
+    # Arrow quotes every string, so an unquoted empty field is NULL and "" is an empty string
+    cur.copy_expert(f"COPY {table} ({col_names}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def typed_table_ddl(entity: str) -> str:
+    """CREATE TABLE statement for an entity's typed table, keyed on the entity key."""
+    spec = ENTITIES[entity]
+    cols_sql = ', '.join(f'"{f.name}" {pg_type_for_arrow(f.type)}' for f in output_schema(entity))
+    key_sql = ', '.join(f'"{k}"' for k in spec['key'])
+    return f'''
+    CREATE TABLE IF NOT EXISTS {spec['table']} (
+        {cols_sql},
+        PRIMARY KEY ({key_sql})
     )'''
-    insert_sql = f"INSERT INTO {table} (raw) VALUES (%s)"
-    with get_pg_conn() as conn:
+
+
+def load_typed_to_postgres(entity: str, data: Union[pa.Table, Iterable[pa.Table]]) -> int:
+    """
+    Upsert transformed rows (see transform.ENTITIES) into the entity's typed table.
+    `data` is one Arrow table or an iterable of them (e.g. transform_stream); each is
+    COPYed into a staging table and merged on the entity key in its own transaction.
+    When a key occurs more than once in a table the newest record wins: the latest
+    updated_at where the entity has one, else the one that came last.
+    Returns the number of rows written.
+    """
+    spec = ENTITIES[entity]
+    table = spec['table']
+    schema = output_schema(entity)
+    key_sql = ', '.join(f'"{k}"' for k in spec['key'])
+    col_sql = ', '.join(f'"{name}"' for name in schema.names)
+    updates = ', '.join(f'"{f.name}" = EXCLUDED."{f.name}"' for f in schema if f.name not in spec['key'])
+    newest = '"updated_at" DESC NULLS LAST, ' if 'updated_at' in schema.names else ''
+    # stage_seq numbers staged rows in COPY order
+    stage_sql = f'''
+    CREATE TEMP TABLE IF NOT EXISTS {table}_stage (LIKE {table}, stage_seq BIGSERIAL) ON COMMIT DELETE ROWS'''
+    merge_sql = f'''
+    INSERT INTO {table} ({col_sql})
+    SELECT DISTINCT ON ({key_sql}) {col_sql} FROM {table}_stage
+    ORDER BY {key_sql}, {newest}stage_seq DESC
+    ON CONFLICT ({key_sql}) DO UPDATE SET {updates}'''
+    if isinstance(data, pa.Table):
+        data = [data]
+    total = 0
+    ensure_table(table, typed_table_ddl(entity))
+    with metrics.span('load_typed', table=table) as span, pooled_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(create_sql)
-            psycopg2.extras.execute_batch(cur, insert_sql, [(json.dumps(row),) for row in data])
+            cur.execute(stage_sql)
         conn.commit()
-    print(f"Loaded {len(data)} records into {table}.")
+        for part in data:
+            if not part.num_rows:
+                continue
+            tx_start = time.perf_counter()
+            with conn.cursor() as cur:
+                with metrics.timer('pg_copy_seconds', table=table, method='copy'):
+                    copy_arrow_table(cur, f"{table}_stage", part.select(schema.names))
+                cur.execute(merge_sql)
+                total += cur.rowcount
+            conn.commit()
+            metrics.observe('pg_transaction_seconds', time.perf_counter() - tx_start, table=table)
+        span.set(rows=total)
+    metrics.inc('rows_loaded_total', total, table=table)
+    if span.duration:
+        metrics.set_gauge('load_rows_per_second', total / span.duration, table=table)
+    print(f"Loaded {total} records into {table}.")
+    return total
+
 
 def load_repos_to_postgres(repos: List[Dict[str, Any]]):
     """Load transformed repo data into Postgres."""
-    # TODO: Implement loading logic
-    pass
+    return load_typed_to_postgres('repos', pa.Table.from_pylist(repos, schema=output_schema('repos')))
@@ -0,0 +1,315 @@
+"""
+Module: metrics.py
+Run metrics and tracing for the ETL: counters, gauges, latency histograms and a span tree.
+
+Everything is recorded into one process-wide registry. start_run(name) begins a
+run with a fresh registry and root span; span() blocks nest under the span open
+in the current thread (or under the run root in worker threads), so a run yields
+a tree like run > stage > repo > extract/load. finish_run() closes the root and,
+when a directory is given (or ETL_METRICS_DIR is set), writes:
+- <name>.prom: Prometheus text format, for node_exporter's textfile collector
+- <name>-<timestamp>.json: run summary with metrics and the span tree
+
+Recording is thread-safe and cheap (a lock and a dict update), so it is always on.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+METRICS_DIR = os.getenv('ETL_METRICS_DIR')
+
+# Seconds; spans GitHub round trips through multi-second COPYs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PREFIX = 'etl_'
+
+HELP = {
+    'github_request_seconds': 'GitHub REST request latency by status code',
+    'github_requests_total': 'GitHub REST requests by status code',
+    'github_pages_total': 'GitHub pages fetched (200 responses)',
+    'github_bytes_total': 'GitHub response body bytes received',
+    'github_not_modified_total': 'GitHub pages answered 304 and served from the HTTP cache',
+    'github_rate_limited_total': 'GitHub responses that hit a rate limit, by kind',
+    'github_rate_limit_sleep_seconds_total': 'Seconds slept waiting for GitHub rate limits to reset',
+    'github_graphql_request_seconds': 'GitHub GraphQL request latency',
+    'github_graphql_points_total': 'GitHub GraphQL rate-limit points spent',
+    'pg_copy_seconds': 'Duration of one COPY (or batched INSERT) into a table',
+    'pg_transaction_seconds': 'Duration of one load transaction, from first statement to commit',
+    'rows_loaded_total': 'Rows inserted or updated, by table',
+    'rows_skipped_total': 'Rows skipped as unchanged, by table',
+    'load_rows_per_second': 'Throughput of the most recent load into a table',
+    'runner_stage_busy_seconds_total': 'Seconds etl_runner workers spent processing items, by stage',
+    'runner_backpressure_seconds_total': 'Seconds a stage blocked handing chunks to a full downstream queue',
+    'raw_payload_bytes_total': 'Raw record bytes before and after payload projection, by endpoint',
+    'replay_query_seconds': 'Latency of replayed query_history statements, by fingerprint',
+    'backfill_shards_total': 'GH Archive backfill shards by outcome (loaded, skipped, failed)',
+    'runner_jobs_failed_total': 'etl_runner (repo, endpoint) jobs that failed, by stage',
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        out, running = [], 0
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            running += count
+            out.append(('+Inf' if bound == float('inf') else repr(bound), running))
+        return out
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        if not self.count:
+            return None
+        target, running = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float('inf')
+
+
+class Span:
+    """One timed operation in the run's span tree."""
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.children: List['Span'] = []
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {'name': self.name, 'started_at': self.started_at,
+               'seconds': self.duration if self.duration is not None else time.perf_counter() - self._start}
+        if self.attrs:
+            out['attrs'] = self.attrs
+        if self.error:
+            out['error'] = self.error
+        if self.children:
+            out['children'] = [child.to_dict() for child in self.children]
+        return out
+
+
+class Metrics:
+    """Registry of counters, gauges and histograms plus the span tree of one run."""
+
+    def __init__(self, run_name: str = 'etl'):
+        self.run_name = run_name
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.root = Span(run_name)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observe the duration of the block into histogram `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_span(self) -> Span:
+        stack = self._stack()
+        return stack[-1] if stack else self.root
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attrs) -> Span:
+        """
+        Open a span without making it current; the caller finishes it. For work whose
+        lifetime crosses threads (e.g. one repo moving through pipeline stages).
+        """
+        parent = parent or self.current_span()
+        span = Span(name, parent, **attrs)
+        with self._lock:
+            parent.children.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attrs) -> Iterator[Span]:
+        """
+        Time the block as a child of the current thread's open span, or of `parent`
+        (pass the submitter's span when the work runs on another thread).
+        """
+        span = self.start_span(name, parent, **attrs)
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            span.finish()
+            stack.pop()
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        def fmt(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+        lines = []
+        with self._lock:
+            families = {}
+            for kind, store in (('counter', self.counters), ('gauge', self.gauges), ('histogram', self.histograms)):
+                for (name, labels), value in sorted(store.items(), key=lambda item: item[0]):
+                    families.setdefault((name, kind), []).append((labels, value))
+            for (name, kind), series in families.items():
+                metric = PREFIX + name
+                if name in HELP:
+                    lines.append(f'# HELP {metric} {HELP[name]}')
+                lines.append(f'# TYPE {metric} {kind}')
+                for labels, value in series:
+                    if kind != 'histogram':
+                        lines.append(f'{metric}{fmt(labels)} {value}')
+                        continue
+                    for bound, count in value.cumulative():
+                        lines.append(f'{metric}_bucket{fmt(labels, (("le", bound),))} {count}')
+                    lines.append(f'{metric}_sum{fmt(labels)} {value.sum}')
+                    lines.append(f'{metric}_count{fmt(labels)} {value.count}')
+            duration = self.root.duration if self.root.duration is not None else time.perf_counter() - self.root._start
+            lines.append(f'# TYPE {PREFIX}run_seconds gauge')
+            lines.append(f'{PREFIX}run_seconds{{run="{self.run_name}"}} {duration}')
+            lines.append(f'# TYPE {PREFIX}run_timestamp_seconds gauge')
+            lines.append(f'{PREFIX}run_timestamp_seconds{{run="{self.run_name}"}} {self.root.started_at}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-serialisable run summary: metrics plus the span tree."""
+        def series(store):
+            return [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(store.items(), key=lambda item: item[0])]
+
+        with self._lock:
+            histograms = [{'name': name, 'labels': dict(labels), 'count': h.count, 'sum': h.sum,
+                           'p50': h.quantile(0.5), 'p95': h.quantile(0.95), 'p99': h.quantile(0.99)}
+                          for (name, labels), h in sorted(self.histograms.items(), key=lambda item: item[0])]
+            return {'run': self.run_name, 'started_at': self.root.started_at,
+                    'counters': series(self.counters), 'gauges': series(self.gauges),
+                    'histograms': histograms, 'spans': self.root.to_dict()}
+
+    def write(self, out_dir: str) -> Tuple[str, str]:
+        """Write <run>.prom (atomically, for textfile collectors) and a timestamped JSON summary."""
+        os.makedirs(out_dir, exist_ok=True)
+        prom_path = os.path.join(out_dir, f'{self.run_name}.prom')
+        tmp = prom_path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, prom_path)
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(self.root.started_at))
+        json_path = os.path.join(out_dir, f'{self.run_name}-{stamp}.json')
+        with open(json_path, 'w') as f:
+            json.dump(self.summary(), f, indent=2, default=str)
+        return prom_path, json_path
+
+
+_METRICS = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return _METRICS
+
+
+def start_run(name: str) -> Metrics:
+    """Begin a new run with an empty registry; returns it."""
+    global _METRICS
+    _METRICS = Metrics(name)
+    return _METRICS
+
+
+def finish_run(out_dir: Optional[str] = METRICS_DIR) -> Metrics:
+    """Close the run's root span and, if `out_dir` is set, export it."""
+    metrics = _METRICS
+    metrics.root.finish()
+    if out_dir:
+        prom_path, json_path = metrics.write(out_dir)
+        print(f"Metrics written to {prom_path} and {json_path}")
+    return metrics
+
+
+def inc(name: str, value: float = 1, **labels):
+    _METRICS.inc(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels):
+    _METRICS.set_gauge(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    _METRICS.observe(name, value, **labels)
+
+
+def timer(name: str, **labels):
+    return _METRICS.timer(name, **labels)
+
+
+def span(name: str, parent: Optional[Span] = None, **attrs):
+    return _METRICS.span(name, parent=parent, **attrs)
+
+
+def start_span(name: str, parent: Optional[Span] = None, **attrs) -> Span:
+    return _METRICS.start_span(name, parent=parent, **attrs)
+
+
+def current_span() -> Span:
+    return _METRICS.current_span()
@@ -0,0 +1,255 @@
+"""
+Module: passthrough.py
+Load GitHub response bytes into raw_* tables without decoding whole records.
+
+On the default path each page is decoded by resp.json(), load.py encodes every
+record again with json.dumps, and Postgres parses it a third time into JSONB. In
+passthrough mode a RawPage splits the response body into per-record byte slices
+with a vectorized (numpy) scan of the JSON structure, only the few fields needed
+for natural keys and incremental watermarks are decoded, and the slices are
+written to the COPY stream as they arrived (load.load_raw_passthrough).
+
+Content hashes are then taken over the response bytes rather than canonical
+JSON, so the first passthrough load of rows stored by the decoded path rewrites
+each of them once; after that unchanged records are skipped as usual.
+"""
+
+import copy
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+_QUOTE, _BACKSLASH, _COLON = ord('"'), ord('\\'), ord(':')
+_OPEN, _CLOSE = ord('{'), ord('}')
+_SCALAR = re.compile(rb'-?[0-9][0-9.eE+-]*|true|false|null')
+_INTEGER = re.compile(rb'-?[0-9]+')
+# Whitespace between JSON tokens, and the bytes the COPY text format escapes
+_SPACE = np.zeros(256, dtype=bool)
+_SPACE[list(b' \t\r\n')] = True
+_COPY_SPECIAL = np.zeros(256, dtype=bool)
+_COPY_SPECIAL[list(b'\\\t\n\r')] = True
+
+
+def record_field(record: Optional[Dict[str, Any]], path: str) -> Any:
+    """Value at a dotted path of a decoded record, or None if any step is missing."""
+    value = record
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def copy_bytes_escape(value: bytes) -> bytes:
+    """Escape bytes for the COPY text format (backslash, tab, newline, carriage return)."""
+    return value.replace(b'\\', b'\\\\').replace(b'\t', b'\\t').replace(b'\n', b'\\n').replace(b'\r', b'\\r')
+
+
+class RawPage:
+    """
+    One response body (a JSON array of objects, or a single object) split into
+    record slices. Nothing is decoded up front: the scan finds the quotes that
+    delimit strings (those not escaped by a backslash) and the brackets outside
+    strings with the nesting depth after each, which is enough to find every
+    record's span. The first field lookup indexes every object key of the page
+    in one more vectorized pass, and each dotted path is then resolved for all
+    records at once and cached.
+    """
+
+    def __init__(self, body: bytes):
+        self.body = bytes(body)
+        self._data = data = np.frombuffer(self.body, dtype=np.uint8)
+        quotes = np.flatnonzero(data == _QUOTE)
+        slashes = np.flatnonzero(data == _BACKSLASH)
+        if quotes.size and slashes.size:
+            # In a run of backslashes every other one escapes the byte after it
+            run_start = np.r_[True, np.diff(slashes) != 1]
+            offset = np.arange(slashes.size) - np.flatnonzero(run_start)[np.cumsum(run_start) - 1]
+            escaped = np.zeros(data.size + 1, dtype=bool)
+            escaped[slashes[offset % 2 == 0] + 1] = True
+            quotes = quotes[~escaped[quotes]]
+        if quotes.size % 2:
+            raise ValueError('Unterminated string in JSON page')
+        self._quotes = quotes
+        # '{' | 0x20 == '[' | 0x20 and likewise for the closers
+        folded = data | 0x20
+        opens, closes = np.flatnonzero(folded == _OPEN), np.flatnonzero(folded == _CLOSE)
+        brackets = np.concatenate([opens, closes])
+        steps = np.concatenate([np.ones(opens.size, np.int32), -np.ones(closes.size, np.int32)])
+        order = np.argsort(brackets, kind='stable')
+        brackets, steps = brackets[order], steps[order]
+        # Brackets inside strings come after an odd number of quotes
+        outside = np.searchsorted(quotes, brackets) % 2 == 0
+        self._brackets, self._steps = brackets[outside], steps[outside]
+        self._depths = np.cumsum(self._steps, dtype=np.int32)
+        if self._depths.size and (self._depths[-1] != 0 or self._depths.min() < 0):
+            raise ValueError('Unbalanced JSON page')
+
+        first = next((c for c in self.body if c not in b' \t\r\n'), None)
+        if first == ord('['):
+            starts = np.flatnonzero((self._steps > 0) & (self._depths == 2))
+            ends = np.flatnonzero((self._steps < 0) & (self._depths == 1))
+        elif first == ord('{'):
+            starts = np.zeros(1, dtype=np.int64)
+            ends = np.array([self._brackets.size - 1])
+        else:
+            starts = ends = np.zeros(0, dtype=np.int64)
+        if starts.size != ends.size:
+            raise ValueError('Scalar records are not supported in a JSON page')
+        self._starts, self._ends = starts, ends
+        self._rows: Optional[np.ndarray] = None  # record indexes kept by subset()
+        # Key table, key-name matches and decoded columns, shared with subsets
+        self._cache: Dict[Any, Any] = {}
+
+    def __len__(self) -> int:
+        return int(self._starts.size if self._rows is None else self._rows.size)
+
+    def _spans(self) -> tuple:
+        starts, ends = self._brackets[self._starts], self._brackets[self._ends] + 1
+        if self._rows is not None:
+            starts, ends = starts[self._rows], ends[self._rows]
+        return starts.tolist(), ends.tolist()
+
+    def records(self) -> List[bytes]:
+        """Each record's bytes exactly as received."""
+        return [self.body[s:e] for s, e in zip(*self._spans())]
+
+    def copy_records(self) -> List[bytes]:
+        """Each record's bytes escaped for the COPY text format, escaping the page once."""
+        starts, ends = self._spans()
+        special = np.flatnonzero(_COPY_SPECIAL[self._data])
+        if not special.size:
+            return [self.body[s:e] for s, e in zip(starts, ends)]
+        # Every special byte before an offset shifts it right by one
+        body = copy_bytes_escape(self.body)
+        starts = (starts + np.searchsorted(special, starts)).tolist()
+        ends = (ends + np.searchsorted(special, ends)).tolist()
+        return [body[s:e] for s, e in zip(starts, ends)]
+
+    def _key_table(self) -> tuple:
+        """
+        (position, length, value offset, owning object) of every object key on the page:
+        a string followed by ':'. The owner is the bracket index of the enclosing '{'.
+        """
+        keys = self._cache.get('keys')
+        if keys is None:
+            data, last = self._data, self._data.size - 1
+            opens, closes = self._quotes[0::2], self._quotes[1::2]
+            after = np.minimum(closes + 1, last)
+            while True:
+                space = np.flatnonzero(_SPACE[data[after]] & (after < last))
+                if not space.size:
+                    break
+                after[space] += 1
+            is_key = data[after] == _COLON
+            opens, closes, value = opens[is_key], closes[is_key], np.minimum(after[is_key] + 1, last)
+            while True:
+                space = np.flatnonzero(_SPACE[data[value]] & (value < last))
+                if not space.size:
+                    break
+                value[space] += 1
+            # The enclosing object is the last '{' at the key's depth before it
+            before = np.searchsorted(self._brackets, opens) - 1
+            depth = self._depths[before]
+            owner = np.full(opens.size, -1, dtype=np.int64)
+            index = np.arange(self._brackets.size)
+            for level in np.unique(depth).tolist():
+                latest = np.maximum.accumulate(
+                    np.where((self._steps > 0) & (self._depths == level), index, -1))
+                at_level = depth == level
+                owner[at_level] = latest[before[at_level]]
+            keys = self._cache['keys'] = opens, closes - opens - 1, value, owner
+        return keys
+
+    def _named(self, name: str) -> np.ndarray:
+        """Indexes into the key table of the keys spelled `name` (no escapes in key names)."""
+        found = self._cache.get(('name', name))
+        if found is None:
+            opens, lengths, _, _ = self._key_table()
+            raw = np.frombuffer(name.encode('utf-8'), dtype=np.uint8)
+            found = np.flatnonzero(lengths == raw.size)
+            if found.size and raw.size:
+                spelled = self._data[opens[found, None] + 1 + np.arange(raw.size)]
+                found = found[(spelled == raw).all(axis=1)]
+            self._cache[('name', name)] = found
+        return found
+
+    def _scalar(self, pos: int) -> Any:
+        """The number, boolean or null starting at byte `pos` (None for objects and arrays)."""
+        match = _SCALAR.match(self.body, pos)
+        if not match:
+            return None
+        token = match.group()
+        return int(token) if _INTEGER.fullmatch(token) else json.loads(token)
+
+    def _column(self, path: str) -> List[Any]:
+        """Scalar at a dotted path for every record of the whole page (cached)."""
+        column = self._cache.get(('path', path))
+        if column is not None:
+            return column
+        _, _, value, owner = self._key_table()
+        records = np.arange(self._starts.size)
+        objects = self._starts  # bracket index of each record's current object, ascending
+        keys = path.split('.')
+        for n, name in enumerate(keys):
+            found = self._named(name)
+            slot = np.minimum(np.searchsorted(objects, owner[found]), max(objects.size - 1, 0))
+            if objects.size:
+                mine = objects[slot] == owner[found]
+                found, slot = found[mine], slot[mine]
+            else:
+                found, slot = found[:0], slot[:0]
+            # Keys are in page order, so this keeps each object's first match
+            slot, first = np.unique(slot, return_index=True)
+            records, positions = records[slot], value[found[first]]
+            if n < len(keys) - 1:
+                nested = self._data[positions] == _OPEN
+                records, positions = records[nested], positions[nested]
+                objects = np.searchsorted(self._brackets, positions)
+        # Strings end at the next unescaped quote; most need no unescaping
+        closes = np.zeros_like(positions)
+        strings = self._data[positions] == _QUOTE
+        closes[strings] = self._quotes[np.searchsorted(self._quotes, positions[strings]) + 1]
+        body, column = self.body, [None] * self._starts.size
+        for record, pos, close in zip(records.tolist(), positions.tolist(), closes.tolist()):
+            if not close:
+                column[record] = self._scalar(pos)
+            elif b'\\' in body[pos + 1:close]:
+                column[record] = json.loads(body[pos:close + 1])
+            else:
+                column[record] = body[pos + 1:close].decode('utf-8')
+        self._cache[('path', path)] = column
+        return column
+
+    def field(self, index: int, path: str) -> Any:
+        """Decode one scalar at a dotted path of record `index` (None if missing or not a scalar)."""
+        return self.values(path)[index]
+
+    def values(self, path: str) -> List[Any]:
+        """Scalar at a dotted path for each record (None where missing or not a scalar)."""
+        column = self._column(path)
+        return column if self._rows is None else [column[i] for i in self._rows.tolist()]
+
+    def subset(self, indexes: Iterable[int]) -> 'RawPage':
+        """The same page restricted to the records at `indexes` (the scan and lookups are shared)."""
+        page = copy.copy(self)
+        indexes = np.asarray(list(indexes), dtype=np.int64)
+        page._rows = indexes if self._rows is None else self._rows[indexes]
+        return page
+
+
+def iter_page_batches(pages: Iterable[RawPage], batch_size: int) -> Iterator[List[RawPage]]:
+    """Group whole pages into lists holding at least `batch_size` records (the last may hold fewer)."""
+    batch, rows = [], 0
+    for page in pages:
+        if not len(page):
+            continue
+        batch.append(page)
+        rows += len(page)
+        if rows >= batch_size:
+            yield batch
+            batch, rows = [], 0
+    if batch:
+        yield batch
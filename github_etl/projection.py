@@ -0,0 +1,151 @@
+"""
+Module: projection.py
+Shrink raw GitHub payloads before they are stored in raw_* JSONB tables.
+
+Most of a REST record is hypermedia (*_url fields) and full copies of nested users
+(owner, user, actor, ...), each with ~20 more URLs. A projection keeps:
+- every path the typed transform and the ELT read (transform.ENTITIES fields), plus
+  the extra paths declared in PROJECTIONS (or in config.yaml's `projection:` section)
+- each ref key (e.g. user, assignees) as a compact reference, {id, login} or {id, name}
+and drops everything else, so raw tables, WAL and TOAST shrink while natural keys,
+content hashes and the typed tables stay consistent.
+
+Measure what a projection would save before turning it on:
+    python -m github_etl.projection owner/name [--endpoints issues events] [--pages 2]
+"""
+
+import argparse
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from github_etl.transform import ENTITIES, field_paths
+
+# Keys kept when a nested object is reduced to a reference
+REF_KEYS = ('id', 'login', 'name')
+
+# Per endpoint: paths kept on top of the transform's fields, and keys kept as references
+PROJECTIONS = {
+    'repos': {
+        'keep': ['topics', 'size', 'watchers_count', 'license.spdx_id', 'visibility', 'homepage'],
+        'refs': ['owner'],
+    },
+    'commits': {
+        'keep': ['parents.sha', 'commit.tree.sha', 'commit.verification.verified'],
+        'refs': ['author', 'committer'],
+    },
+    'issues': {
+        'keep': ['labels.name', 'milestone.title', 'milestone.number', 'locked', 'author_association',
+                 'state_reason', 'reactions.total_count'],
+        'refs': ['user', 'assignee', 'assignees', 'closed_by'],
+    },
+    'pull_requests': {
+        'keep': ['labels.name', 'head.ref', 'base.sha', 'base.repo.id', 'author_association',
+                 'auto_merge', 'milestone.title'],
+        'refs': ['user', 'assignee', 'assignees', 'requested_reviewers', 'merged_by'],
+    },
+    'events': {
+        'keep': ['payload.ref', 'payload.ref_type', 'payload.size', 'payload.distinct_size',
+                 'payload.push_id', 'payload.number', 'payload.head'],
+        'refs': ['actor', 'repo', 'org'],
+    },
+    'stargazers': {
+        'keep': [],
+        'refs': ['user'],
+    },
+    'contributors': {
+        'keep': ['site_admin'],
+        'refs': [],
+    },
+}
+
+_TREES: Dict[Tuple[str, str], Any] = {}
+
+
+def _add_path(tree: dict, path: List[str]):
+    head, *rest = path
+    if not rest:
+        tree[head] = True
+    elif tree.get(head) is not True:
+        _add_path(tree.setdefault(head, {}), rest)
+
+
+def keep_tree(entity: str, overrides: Optional[Dict[str, Any]] = None) -> dict:
+    """
+    Nested dict of the keys to keep for `entity` (True = keep the whole value).
+    `overrides` ({'keep': [...], 'refs': [...]}) adds to the built-in projection.
+    """
+    cache_key = (entity, json.dumps(overrides, sort_keys=True))
+    tree = _TREES.get(cache_key)
+    if tree is None:
+        spec = PROJECTIONS.get(entity, {})
+        overrides = overrides or {}
+        tree = {}
+        for key in list(spec.get('refs', [])) + list(overrides.get('refs', [])):
+            for ref_key in REF_KEYS:
+                _add_path(tree, [key, ref_key])
+        paths = [source for _, path, _ in ENTITIES[entity]['fields'] for source in field_paths(path)]
+        for path in paths + list(spec.get('keep', [])) + list(overrides.get('keep', [])):
+            _add_path(tree, path.split('.'))
+        _TREES[cache_key] = tree
+    return tree
+
+
+def _project(value: Any, tree: Any) -> Any:
+    if tree is True:
+        return value
+    if isinstance(value, list):
+        return [_project(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: _project(value[key], sub) for key, sub in tree.items() if key in value}
+
+
+def project_record(entity: str, record: Dict[str, Any], overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return _project(record, keep_tree(entity, overrides))
+
+
+def project_records(entity: str, rows: Iterable[Dict[str, Any]],
+                    overrides: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Project a batch of raw records, e.g. before load_raw_to_postgres(f"raw_{entity}", ...)."""
+    tree = keep_tree(entity, overrides)
+    return [_project(row, tree) for row in rows]
+
+
+def payload_bytes(rows: Iterable[Dict[str, Any]]) -> int:
+    """Bytes the rows occupy as stored by load_raw_to_postgres (canonical JSON)."""
+    return sum(len(json.dumps(row, sort_keys=True, separators=(',', ':')).encode('utf-8')) for row in rows)
+
+
+def measure(entity: str, rows: List[Dict[str, Any]], overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Bytes before and after projecting `rows`."""
+    before = payload_bytes(rows)
+    after = payload_bytes(project_records(entity, rows, overrides))
+    return {'endpoint': entity, 'records': len(rows), 'bytes_before': before, 'bytes_after': after,
+            'saved_pct': round(100.0 * (before - after) / before, 1) if before else 0.0}
+
+
+def print_report(reports: List[Dict[str, Any]]):
+    print(f"{'endpoint':<15}{'records':>9}{'before':>14}{'after':>14}{'saved':>8}")
+    for r in reports:
+        print(f"{r['endpoint']:<15}{r['records']:>9}{r['bytes_before']:>14,}{r['bytes_after']:>14,}"
+              f"{r['saved_pct']:>7.1f}%")
+
+
+if __name__ == '__main__':
+    import itertools
+
+    from github_etl import extract
+
+    parser = argparse.ArgumentParser(description='Report raw payload bytes before and after projection for a repo.')
+    parser.add_argument('repo', help='owner/name to sample')
+    parser.add_argument('--endpoints', nargs='*', default=[e for e in PROJECTIONS if e != 'repos'],
+                        choices=[e for e in PROJECTIONS if e != 'repos'])
+    parser.add_argument('--pages', type=int, default=1, help='pages sampled per endpoint')
+    args = parser.parse_args()
+    owner, name = args.repo.split('/')
+    reports = []
+    for endpoint in args.endpoints:
+        pages = getattr(extract, f"extract_{endpoint}")(owner, name, stream=True)
+        rows = [row for page in itertools.islice(pages, args.pages) for row in page]
+        reports.append(measure(endpoint, rows))
+    print_report(reports)
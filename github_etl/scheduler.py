@@ -0,0 +1,120 @@
+"""
+Module: scheduler.py
+Rate-limit-aware scheduling of GitHub API requests across a pool of tokens.
+
+TokenPool tracks each PAT's remaining quota from the X-RateLimit-* response
+headers and hands out the token with the most quota left, so requests move to
+another token before one runs dry instead of sleeping the whole process at the
+first 403. Secondary (abuse) limits back off the offending token for Retry-After
+seconds. The process only sleeps when every token is exhausted or backing off.
+"""
+
+import os
+import threading
+import time
+from typing import List, Optional
+
+from github_etl import metrics
+
+# Keep this many requests in reserve per token; below it the token is skipped until reset
+RATE_LIMIT_RESERVE = int(os.getenv('GITHUB_RATE_LIMIT_RESERVE', '10'))
+
+# Back-off used for secondary limits that come without a Retry-After header
+SECONDARY_LIMIT_BACKOFF = 60
+
+
+def load_github_tokens() -> List[str]:
+    """PATs from GITHUB_PATS (comma-separated), falling back to the single GITHUB_PAT."""
+    tokens = [t.strip() for t in os.getenv('GITHUB_PATS', '').split(',') if t.strip()]
+    if not tokens and os.getenv('GITHUB_PAT'):
+        tokens = [os.getenv('GITHUB_PAT')]
+    if not tokens:
+        raise RuntimeError("GITHUB_PAT not found in environment.")
+    return tokens
+
+
+class TokenState:
+    """Last known quota for one token."""
+
+    def __init__(self, token: str):
+        self.token = token
+        self.remaining: Optional[int] = None  # unknown until the first response
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+
+    def available(self, now: float) -> bool:
+        if self.blocked_until > now:
+            return False
+        if self.remaining is not None and self.remaining <= RATE_LIMIT_RESERVE and self.reset_at > now:
+            return False
+        return True
+
+    def ready_at(self) -> float:
+        """Earliest time this token can be used again."""
+        exhausted = self.remaining is not None and self.remaining <= RATE_LIMIT_RESERVE
+        return max(self.blocked_until, self.reset_at if exhausted else 0.0)
+
+
+class TokenPool:
+    """Thread-safe pool of GitHub tokens with header-driven quota tracking."""
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = [TokenState(t) for t in tokens]
+        self.stats = {'requests': 0, 'primary_limited': 0, 'secondary_limited': 0, 'sleep_seconds': 0.0}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> TokenState:
+        """Return the available token with the most remaining quota, sleeping if none is available."""
+        while True:
+            with self._lock:
+                now = time.time()
+                candidates = [t for t in self.tokens if t.available(now)]
+                if candidates:
+                    # Unknown quota sorts first so every token gets probed once
+                    best = max(candidates, key=lambda t: float('inf') if t.remaining is None else t.remaining)
+                    if best.remaining is not None:
+                        best.remaining -= 1  # reserve our request until the response reports the real count
+                    self.stats['requests'] += 1
+                    return best
+                wait = max(min(t.ready_at() for t in self.tokens) - now, 1)
+                self.stats['sleep_seconds'] += wait
+            metrics.inc('github_rate_limit_sleep_seconds_total', wait)
+            print(f"All {len(self.tokens)} GitHub tokens rate limited. Sleeping for {int(wait)} seconds...")
+            time.sleep(wait)
+
+    def update(self, token: TokenState, status_code: int, headers, secondary: bool = False) -> bool:
+        """
+        Record quota from a response. Returns True if the request hit a rate limit
+        and must be retried (with whichever token acquire() picks next).
+        `secondary` flags a 403 whose body names the secondary rate limit.
+        """
+        with self._lock:
+            if 'X-RateLimit-Remaining' in headers:
+                token.remaining = int(headers['X-RateLimit-Remaining'])
+                token.reset_at = float(headers.get('X-RateLimit-Reset', 0))
+            if status_code not in (403, 429):
+                return False
+            if 'Retry-After' in headers:
+                token.blocked_until = time.time() + int(headers['Retry-After'])
+                self.stats['secondary_limited'] += 1
+                metrics.inc('github_rate_limited_total', kind='secondary')
+                return True
+            if token.remaining == 0:
+                self.stats['primary_limited'] += 1
+                metrics.inc('github_rate_limited_total', kind='primary')
+                return True
+            if status_code == 429 or secondary:
+                token.blocked_until = time.time() + SECONDARY_LIMIT_BACKOFF
+                self.stats['secondary_limited'] += 1
+                metrics.inc('github_rate_limited_total', kind='secondary')
+                return True
+            return False
+
+    def report(self):
+        """Print per-token quota and limit statistics."""
+        for i, t in enumerate(self.tokens):
+            reset = time.strftime('%H:%M:%S', time.localtime(t.reset_at)) if t.reset_at else '-'
+            print(f"token {i}: remaining={t.remaining} reset={reset}")
+        print(f"{self.stats['requests']} requests, {self.stats['primary_limited']} primary and "
+              f"{self.stats['secondary_limited']} secondary limit hits, {self.stats['sleep_seconds']:.0f}s slept.")
+
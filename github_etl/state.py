@@ -0,0 +1,88 @@
+"""
+Module: state.py
+Persisted per-endpoint extraction state (watermarks and pagination cursors).
+
+One row per (owner, repo, endpoint):
+- watermark: newest updated_at / created_at / starred_at fully extracted so far
+- next_url / pending_watermark: checkpoint of an in-progress crawl, so a crashed
+  run resumes from the last completed page instead of page 1
+- last_page_url: last page of an append-only listing (stargazers), so the next
+  run starts there instead of walking every page again
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.etl_state.sqlite')
+
+
+class WatermarkStore:
+    """SQLite-backed store of extraction watermarks and cursors."""
+
+    def __init__(self, path: str = DEFAULT_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS etl_watermarks (
+            owner TEXT NOT NULL,
+            repo TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            watermark TEXT,
+            next_url TEXT,
+            pending_watermark TEXT,
+            last_page_url TEXT,
+            updated_at REAL,
+            PRIMARY KEY (owner, repo, endpoint)
+        )''')
+        self._conn.commit()
+
+    def get(self, owner: str, repo: str, endpoint: str) -> Dict[str, Any]:
+        """Return the state row for an endpoint (all fields None if never run)."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT watermark, next_url, pending_watermark, last_page_url '
+                'FROM etl_watermarks WHERE owner = ? AND repo = ? AND endpoint = ?',
+                (owner, repo, endpoint)).fetchone()
+        keys = ('watermark', 'next_url', 'pending_watermark', 'last_page_url')
+        return dict(zip(keys, row or (None,) * len(keys)))
+
+    def _upsert(self, owner: str, repo: str, endpoint: str, **fields):
+        cols = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        updates = ', '.join(f'{col} = excluded.{col}' for col in fields)
+        with self._lock:
+            self._conn.execute(
+                f'INSERT INTO etl_watermarks (owner, repo, endpoint, {cols}, updated_at) '
+                f'VALUES (?, ?, ?, {placeholders}, ?) '
+                f'ON CONFLICT (owner, repo, endpoint) DO UPDATE SET {updates}, updated_at = excluded.updated_at',
+                (owner, repo, endpoint, *fields.values(), time.time()))
+            self._conn.commit()
+
+    def checkpoint(self, owner: str, repo: str, endpoint: str, next_url: Optional[str],
+                   pending_watermark: Optional[str]):
+        """Record the next page to fetch and the newest timestamp seen by the running crawl."""
+        self._upsert(owner, repo, endpoint, next_url=next_url, pending_watermark=pending_watermark)
+
+    def complete(self, owner: str, repo: str, endpoint: str, watermark: Optional[str],
+                 last_page_url: Optional[str] = None):
+        """Advance the watermark and clear the in-progress cursor after a finished crawl."""
+        self._upsert(owner, repo, endpoint, watermark=watermark, next_url=None,
+                     pending_watermark=None, last_page_url=last_page_url)
+
+    def reset(self, owner: str, repo: str, endpoint: str):
+        """Forget all state for an endpoint so the next run does a full crawl."""
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM etl_watermarks WHERE owner = ? AND repo = ? AND endpoint = ?',
+                (owner, repo, endpoint))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
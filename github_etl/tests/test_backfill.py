@@ -0,0 +1,113 @@
+"""
+Offline tests for the day-sharded GH Archive backfill in scripts/bq_to_neon.py,
+with local parquet shards standing in for BigQuery (no Postgres).
+"""
+import datetime
+import importlib.util
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'bq_to_neon.py')
+_spec = importlib.util.spec_from_file_location('bq_to_neon', _SCRIPT)
+bq_to_neon = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bq_to_neon)
+
+DAYS = ['20230101', '20230102', '20230103']
+
+
+@pytest.fixture
+def archive_dir(tmp_path):
+    root = tmp_path / 'archive'
+    for n, day in enumerate(DAYS):
+        shards = {
+            'fact_events': {'event_id': [f'{day}-{i}' for i in range(5)], 'actor_id': [1, 2, 3, 4, n + 10]},
+            'dim_actors': {'actor_id': [1, 2, n + 10], 'login': ['a', 'b', f'x{n}']},
+            'dim_repositories': {'repo_id': [7], 'name': ['o/r']},
+            'dim_event_types': {'event_type': ['PushEvent']},
+        }
+        for table_name, columns in shards.items():
+            os.makedirs(root / table_name, exist_ok=True)
+            pq.write_table(pa.table(columns), root / table_name / f'{day}.parquet')
+    return root
+
+
+class NoArchive:
+    """Fails if a shard is fetched again instead of being read from github_data/."""
+
+    def events(self, *args):
+        raise AssertionError('events fetched twice')
+
+    def dimension(self, *args):
+        raise AssertionError('dimension fetched twice')
+
+
+def test_backfill_days_inclusive():
+    days = bq_to_neon.backfill_days(datetime.date(2023, 1, 30), datetime.date(2023, 2, 2))
+    assert [d.isoformat() for d in days] == ['2023-01-30', '2023-01-31', '2023-02-01', '2023-02-02']
+
+
+def test_backfill_writes_each_shard_once(archive_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(bq_to_neon, 'DATA_DIR', str(tmp_path / 'out'))
+    start, end = datetime.date(2023, 1, 1), datetime.date(2023, 1, 3)
+    results = bq_to_neon.backfill(start, end, archive=bq_to_neon.ParquetArchive(str(archive_dir)),
+                                  to_postgres=False, workers=2, batch_size=2)
+    assert sorted(results) == [f'day.{day}' for day in DAYS]
+    assert results['day.20230102']['dim_actors'] == 3
+    for table_name in ('fact_events', 'dim_actors', 'dim_repositories', 'dim_event_types'):
+        for day in DAYS:
+            copied = pq.read_table(tmp_path / 'out' / table_name / f'{day}.parquet')
+            assert copied.equals(pq.read_table(archive_dir / table_name / f'{day}.parquet'))
+    # Shards already in github_data/ are not fetched again
+    bq_to_neon.backfill(start, end, archive=NoArchive(), to_postgres=False, workers=2)
+
+
+def test_failed_shard_does_not_stop_the_others(archive_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(bq_to_neon, 'DATA_DIR', str(tmp_path / 'out'))
+    os.remove(archive_dir / 'fact_events' / '20230102.parquet')
+    with pytest.raises(RuntimeError, match='day.20230102'):
+        bq_to_neon.backfill(datetime.date(2023, 1, 1), datetime.date(2023, 1, 3),
+                            archive=bq_to_neon.ParquetArchive(str(archive_dir)), to_postgres=False, workers=3)
+    assert os.path.exists(tmp_path / 'out' / 'fact_events' / '20230103.parquet')
+
+
+@pytest.mark.parametrize('month, granularity, expected', [
+    ('202402', 'day', 29),
+    ('202312', 'day', 31),
+    ('202312', 'month', 1),
+])
+def test_event_partitions_cover_the_month(month, granularity, expected):
+    partitions = bq_to_neon.event_partitions(month, granularity)
+    assert len(partitions) == expected
+    # Contiguous, non-overlapping ranges from the 1st to the 1st of the next month
+    assert partitions[0][1] == datetime.date(int(month[:4]), int(month[4:]), 1)
+    assert all(prev[2] == nxt[1] for prev, nxt in zip(partitions, partitions[1:]))
+    suffix, lower, upper, source = partitions[-1]
+    if granularity == 'day':
+        assert (suffix, source) == (lower.strftime('%Y%m%d'), f'day.{suffix}')
+        assert upper - lower == datetime.timedelta(days=1)
+    else:
+        assert (suffix, source, upper) == ('202312', 'month.202312', datetime.date(2024, 1, 1))
+
+
+def test_event_partitions_rejects_unknown_granularity():
+    with pytest.raises(ValueError):
+        bq_to_neon.event_partitions('202301', 'week')
+
+
+@pytest.mark.parametrize('granularity', ['day', 'month'])
+def test_partition_query_is_bounded_to_the_partition(granularity):
+    suffix, lower, upper, source = bq_to_neon.event_partitions('202301', granularity)[-1]
+    sql = bq_to_neon.partition_query(source, granularity, lower, upper)
+    assert f'FROM `githubarchive.{source}`' in sql
+    assert f"created_at >= TIMESTAMP('{lower.isoformat()}') AND created_at < TIMESTAMP('{upper.isoformat()}')" in sql
+    assert ('ORDER BY created_at' in sql) == (granularity == 'day')
+
+
+def test_shard_queries_read_one_day():
+    for table_name, query in bq_to_neon.SHARD_QUERIES.items():
+        sql = query.format(source='day.20230101')
+        assert 'FROM `githubarchive.day.20230101`' in sql
+        assert bq_to_neon.DIMENSIONS[table_name][0] in sql
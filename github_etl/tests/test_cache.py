@@ -0,0 +1,76 @@
+"""
+Offline tests for the ETag conditional-request cache.
+"""
+from github_etl import extract
+from github_etl.cache import HttpCache
+
+URL = "https://api.github.com/orgs/o/repos"
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.content = body
+        self.headers = headers or {}
+        self.url = URL
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        import json
+        return json.loads(self.content)
+
+
+class EtagSession:
+    """Answers 304 whenever the client presents the current ETag."""
+    def __init__(self):
+        self.sent = []
+
+    def get(self, url, headers=None, params=None):
+        self.sent.append(dict(headers))
+        if headers.get('If-None-Match') == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(200, b'[{"id": 1}]', {'ETag': '"v1"'})
+
+
+def test_put_get_and_lru_eviction(tmp_path):
+    cache = HttpCache(str(tmp_path / 'http.sqlite'), max_bytes=10)
+    cache.put('a', URL, {'ETag': '"a"'}, b'12345')
+    cache.put('b', URL, {'ETag': '"b"'}, b'12345')
+    assert cache.get('a') is not None  # touch a, so b is least recently used
+    cache.put('c', URL, {'ETag': '"c"'}, b'12345')
+    assert cache.get('b') is None
+    assert cache.get('a')[1] == b'12345'
+    assert cache.conditional_headers('c') == {'If-None-Match': '"c"'}
+    assert cache.stats['evictions'] == 1
+
+
+def test_not_modified_served_from_cache(tmp_path, monkeypatch):
+    session = EtagSession()
+    monkeypatch.setenv('GITHUB_PAT', 'test')
+    monkeypatch.setattr(extract, 'get_github_session', lambda: session)
+    monkeypatch.setattr(extract, '_CACHE', HttpCache(str(tmp_path / 'http.sqlite')))
+    first = extract.github_api_get(URL)
+    second = extract.github_api_get(URL)
+    assert first == second == [{'id': 1}]
+    assert 'If-None-Match' not in session.sent[0]
+    assert session.sent[1]['If-None-Match'] == '"v1"'
+    assert extract._CACHE.stats['hits'] == 1
+    assert extract._CACHE.stats['misses'] == 1
+
+
+def test_wal_and_buffered_last_access(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / 'http.sqlite')
+    cache = HttpCache(path)
+    assert cache._conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    cache.put('a', URL, {'ETag': '"a"'}, b'12345')
+    stored = cache._conn.execute('SELECT last_access FROM http_cache').fetchone()[0]
+    cache.get('a')
+    # The hit is only buffered until the next eviction, a full batch, or close
+    assert cache._conn.execute('SELECT last_access FROM http_cache').fetchone()[0] == stored
+    monkeypatch.setattr(extract, '_CACHE', cache)
+    extract.close_http_cache()
+    assert '1 hits, 0 misses' in capsys.readouterr().out
+    reopened = HttpCache(path)
+    assert reopened._conn.execute('SELECT last_access FROM http_cache').fetchone()[0] > stored
@@ -0,0 +1,120 @@
+"""
+Offline tests for the findings, totals and profile comparison in server/check_raw_tables.py (no Postgres).
+"""
+import importlib.util
+import os
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', 'server', 'check_raw_tables.py')
+_spec = importlib.util.spec_from_file_location('check_raw_tables', _SCRIPT)
+check_raw_tables = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(check_raw_tables)
+
+MB = 1 << 20
+
+
+def table(name, **overrides):
+    t = {'schema': 'public', 'table': name, 'partition_of': None, 'partitioned': False,
+         'live_tuples': 100000, 'dead_tuples': 0, 'dead_ratio': 0.0, 'table_bytes': 10 * MB, 'toast_bytes': 0,
+         'total_bytes': 12 * MB, 'estimated_bloat_bytes': 0, 'seq_scan': 5, 'idx_scan': 100,
+         'avg_rows_per_seq_scan': 0.0, 'missing_index_suspect': False, 'unindexed_id_columns': [],
+         'indexes': [], 'updates': 0, 'hot_updates': 0, 'modified_since_analyze': 0}
+    t.update(overrides)
+    t.setdefault('findings', check_raw_tables.table_findings(t))
+    return t
+
+
+def index(name, unused=False, size=MB):
+    return {'index': name, 'bytes': size, 'scans': 0 if unused else 10, 'unused': unused}
+
+
+def test_healthy_table_has_no_findings():
+    assert table('raw_issues')['findings'] == []
+
+
+def test_table_findings():
+    findings = table('raw_events', dead_tuples=50000, dead_ratio=0.33, toast_bytes=20 * MB,
+                     missing_index_suspect=True, seq_scan=40, avg_rows_per_seq_scan=90000,
+                     unindexed_id_columns=['actor_id', 'repo_id'],
+                     indexes=[index('raw_events_pkey'), index('raw_events_old_idx', unused=True)],
+                     updates=50000, hot_updates=100, modified_since_analyze=30000)['findings']
+    assert findings == [
+        '33% dead tuples; vacuum is behind',
+        'TOAST is larger than the heap: wide JSONB/text values dominate scans',
+        '40 seq scans averaging 90,000 rows; unindexed id columns: actor_id, repo_id',
+        'unused indexes: raw_events_old_idx',
+        'few HOT updates; a lower fillfactor may help',
+        'statistics are stale (over 20% modified since the last analyze)',
+    ]
+    # Thresholds: a few dead tuples or a few updates are not worth reporting
+    assert table('raw_events', dead_tuples=500, dead_ratio=0.5, updates=5000, hot_updates=0)['findings'] == []
+
+
+def test_totals_count_partitions_once():
+    tables = [
+        table('fact_events', partitioned=True, total_bytes=30 * MB, estimated_bloat_bytes=MB,
+              indexes=[index('fact_events_actor_idx', unused=True, size=3 * MB)]),
+        table('fact_events_2023_01', partition_of='fact_events', total_bytes=10 * MB, estimated_bloat_bytes=MB,
+              indexes=[index('fact_events_2023_01_actor_idx', unused=True)]),
+        table('raw_commits', total_bytes=5 * MB, findings=['unused indexes: x']),
+    ]
+    totals = check_raw_tables.profile_totals(tables)
+    assert totals['tables'] == 3
+    assert totals['total_bytes'] == 35 * MB
+    assert totals['estimated_bloat_bytes'] == MB
+    assert totals['unused_index_bytes'] == 3 * MB
+    assert totals['tables_with_findings'] == 3
+
+
+def test_compare_profiles():
+    old = {'tables': [table('raw_issues'), table('raw_commits')],
+           'statements': {'top_by_total_time': [{'queryid': '1', 'mean_ms': 10, 'query': 'select 1'},
+                                                {'queryid': '2', 'mean_ms': 10, 'query': 'select 2'}]}}
+    new = {'tables': [table('raw_issues', total_bytes=40 * MB, seq_scan=60, missing_index_suspect=True,
+                            avg_rows_per_seq_scan=20000),
+                      table('raw_commits', total_bytes=12 * MB + 1000, seq_scan=6, idx_scan=150),
+                      table('raw_events', total_bytes=MB)],
+           'statements': {'top_by_total_time': [{'queryid': '1', 'mean_ms': 25, 'query': 'select 1'},
+                                                {'queryid': '2', 'mean_ms': 12, 'query': 'select 2'},
+                                                {'queryid': '3', 'mean_ms': 5, 'query': 'select 3'}]},
+           'query_history': {'top_by_total_time': []}}
+    assert check_raw_tables.compare_profiles(old, new) == [
+        f'public.raw_issues: {12 * MB:,} -> {40 * MB:,} bytes',
+        'public.raw_issues: 55 seq scans vs 0 index scans since the previous profile',
+        'public.raw_issues: 60 seq scans averaging 20,000 rows; unindexed id columns: none',
+        f'public.raw_events: new table, {MB:,} bytes',
+        'statements 1: mean 10 -> 25 ms: select 1',
+        'statements 3: new in top list, mean 5 ms: select 3',
+    ]
+    assert check_raw_tables.compare_profiles(new, new) == []
+
+
+class DictCursor:
+    """Answers each execute() with the next canned list of dict rows, like a RealDictCursor."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.sql = []
+
+    def execute(self, sql, params=None):
+        self.sql.append(sql)
+        self.rows = self.results.pop(0)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_profile_statements_reads_dict_rows():
+    top = [{'queryid': '1', 'query': 'select 1', 'calls': 3, 'mean_ms': 2.5}]
+    cur = DictCursor([{'?column?': 1}], [{'column_name': 'total_exec_time'}], top)
+    assert check_raw_tables.profile_statements(cur, 5) == {'available': True, 'top_by_total_time': top}
+    assert 'total_exec_time' in cur.sql[-1]
+
+    cur = DictCursor([{'?column?': 1}], [{'column_name': 'total_time'}], top)
+    check_raw_tables.profile_statements(cur, 5)
+    assert 's.total_time' in cur.sql[-1]
+
+    assert not check_raw_tables.profile_statements(DictCursor([{'?column?': 1}], []), 5)['available']
+    assert not check_raw_tables.profile_statements(DictCursor([]), 5)['available']
@@ -0,0 +1,36 @@
+"""
+Tests for in-database ELT SQL generation.
+"""
+from github_etl import elt
+
+
+def test_field_sql_casts():
+    assert elt.field_sql('commit.author.date', 'ts') == "(raw #>> '{commit,author,date}')::timestamptz"
+    assert elt.field_sql('id', 'int_str') == "(raw #>> '{id}')::bigint"
+    assert 'jsonb_typeof' in elt.field_sql('pull_request', 'present')
+    assert elt.field_sql(['login', 'email'], 'str') == "(COALESCE(raw #>> '{login}', raw #>> '{email}'))"
+
+
+def test_merge_sql_is_incremental_upsert():
+    sql = elt.merge_sql('issues')
+    assert 'FROM raw_issues' in sql and 'loaded_at > %(watermark)s' in sql
+    assert 'ON CONFLICT ("issue_id") DO UPDATE' in sql
+    assert 'fact_issues."title" IS DISTINCT FROM EXCLUDED."title"' in sql
+
+
+def test_watermark_stops_before_open_transactions():
+    # loaded_at is a transaction's start time: a load still open may commit older rows later
+    sql = elt.merge_sql('commits')
+    assert 'LEAST(\n               (SELECT max(loaded_at) FROM delta)' in sql
+    assert "min(xact_start)::timestamp - interval '1 microsecond' FROM pg_stat_activity" in sql
+    assert 'pid <> pg_backend_pid()' in sql
+
+
+def test_raw_indexes_cover_loaded_at_and_join_keys():
+    statements = elt.raw_index_sql('events')
+    assert statements[0].endswith('ON raw_events (loaded_at)')
+    assert any("((raw #>> '{repo,id}'))" in s for s in statements)
+
+
+def test_context_entities_not_supported():
+    assert not elt.supported('stargazers') and elt.supported('commits')
@@ -0,0 +1,154 @@
+"""
+Offline tests for the pipelined etl_runner against the local stand-in GitHub REST API.
+"""
+import threading
+import time
+
+import pytest
+
+from github_etl import etl_runner, extract, metrics
+from github_etl.benchmarks.fake_github import FakeGitHubServer
+from github_etl.scheduler import TokenPool
+from github_etl.state import WatermarkStore
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with FakeGitHubServer(pages=3, per_page=10, latency=0.02) as server:
+        monkeypatch.setattr(extract, 'GITHUB_API_BASE', server.url)
+        monkeypatch.setattr(extract, '_TOKEN_POOL', TokenPool(['t']))
+        monkeypatch.setattr(extract, '_CACHE', None)
+        yield server
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def load_typed(entity, table, delay=0.05):
+        time.sleep(delay)
+        if table.column('repo_full_name')[0].as_py() == 'bad/repo':
+            raise RuntimeError('constraint violated')
+        with lock:
+            calls.append((entity, table.num_rows))
+        return table.num_rows
+
+    monkeypatch.setattr(etl_runner.load, 'load_typed_to_postgres', load_typed)
+    monkeypatch.setattr(etl_runner.load, 'load_raw_to_postgres', lambda table, rows, **kwargs: len(rows))
+    return calls
+
+
+def test_failures_stay_in_their_job(server, loads):
+    run = metrics.start_run('runner_test')
+    repos = [{'owner': 'o', 'name': 'a'}, {'owner': 'bad', 'name': 'repo'}, {'owner': 'o', 'name': 'b'}]
+    results = etl_runner.Pipeline(repos, ['commits', 'stargazers'], chunk_rows=10).run()
+    metrics.finish_run(None)
+
+    for name in ('o/a', 'o/b'):
+        assert results[name] == {e: {'extracted': 30, 'loaded': 30, 'error': None} for e in ('commits', 'stargazers')}
+    assert all(r['error'].startswith('load: RuntimeError') for r in results['bad/repo'].values())
+    assert sum(rows for _, rows in loads) == 120
+
+    pipeline = run.root.children[0]
+    assert [s.name for s in pipeline.children].count('repo') == 3
+    bad = next(s for s in pipeline.children if s.attrs.get('repo') == 'bad/repo')
+    assert all(job.error and job.duration is not None for job in bad.children)
+
+
+def test_stages_overlap(server, loads, monkeypatch):
+    intervals = {'extract': [], 'load': []}
+
+    def timed(stage, fn):
+        def run(self, item):
+            start = time.perf_counter()
+            try:
+                return fn(self, item)
+            finally:
+                intervals[stage].append((start, time.perf_counter()))
+        return run
+
+    monkeypatch.setattr(etl_runner.Pipeline, '_extract', timed('extract', etl_runner.Pipeline._extract))
+    monkeypatch.setattr(etl_runner.Pipeline, '_load', timed('load', etl_runner.Pipeline._load))
+    repos = [{'owner': 'o', 'name': f'r{i}'} for i in range(4)]
+    pipeline = etl_runner.Pipeline(repos, ['commits'], extract_workers=2, load_workers=1, queue_size=2, chunk_rows=10)
+    pipeline.run()
+    assert len(loads) == 12
+    assert len(intervals['extract']) == 4 and len(intervals['load']) == 12
+    # Some chunk was loading while a job was still fetching pages
+    assert any(e_start < l_end and l_start < e_end
+               for e_start, e_end in intervals['extract'] for l_start, l_end in intervals['load'])
+
+
+def test_load_config_expands_env(tmp_path, monkeypatch):
+    monkeypatch.setenv('CFG_TOKEN', 'abc')
+    monkeypatch.delenv('MISSING_VAR', raising=False)
+    path = tmp_path / 'config.yaml'
+    path.write_text('repos:\n  - {owner: o, name: r}\ngithub_token: "${CFG_TOKEN}"\n'
+                    'db: {password: "${MISSING_VAR}", user: "p$w0rd", host: "h-${CFG_TOKEN}-$MISSING_VAR"}\n'
+                    'runner: {load_workers: 5}\n')
+    config = etl_runner.load_config(str(path))
+    assert config['github_token'] == 'abc'
+    assert config['db']['password'] is None
+    # Only a whole-value reference is dropped when unset; other '$' stay as written
+    assert config['db']['user'] == 'p$w0rd'
+    assert config['db']['host'] == 'h-abc-$MISSING_VAR'
+    assert config['endpoints'] == etl_runner.ENDPOINTS
+    assert config['runner']['load_workers'] == 5 and config['runner']['extract_workers'] == 4
+
+
+def test_incremental_checkpoints_after_load(server, loads, tmp_path):
+    store = WatermarkStore(str(tmp_path / 'state.sqlite'))
+    pipeline = etl_runner.Pipeline([{'owner': 'o', 'name': 'r'}], ['commits'], incremental=True, store=store)
+    assert pipeline.run()['o/r']['commits'] == {'extracted': 30, 'loaded': 30, 'error': None}
+    assert store.get('o', 'r', 'commits')['watermark']
+
+
+@pytest.mark.parametrize('mode', [True, 'measure'])
+def test_project_raw(server, loads, monkeypatch, mode):
+    stored = []
+    monkeypatch.setattr(etl_runner.load, 'load_raw_to_postgres', lambda table, rows, **kwargs: stored.extend(rows))
+    etl_runner.Pipeline([{'owner': 'o', 'name': 'r'}], ['issues'], project_raw=mode).run()
+    assert len(stored) == 30
+    assert ('body' in stored[0]) == (mode == 'measure')
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_passthrough_skips_decoding(server, loads, monkeypatch, tmp_path, incremental):
+    raw_loads, refreshed = [], []
+    monkeypatch.setattr(etl_runner.load, 'load_raw_passthrough',
+                        lambda table, pages, **kwargs: raw_loads.append(table) or sum(len(p) for p in pages))
+    monkeypatch.setattr(etl_runner.elt, 'refresh_all', lambda entities: refreshed.extend(entities) or {})
+    store = WatermarkStore(str(tmp_path / 'state.sqlite'))
+    results = etl_runner.Pipeline([{'owner': 'o', 'name': 'r'}], ['commits', 'stargazers'], passthrough=True,
+                                  incremental=incremental, store=store).run()
+    assert results['o/r']['commits'] == {'extracted': 30, 'loaded': 30, 'error': None}
+    assert set(raw_loads) == {'raw_commits'} and refreshed == ['commits']
+    # stargazers need repo context the raw table lacks, so they take the decoded path
+    assert [entity for entity, _ in loads] == ['stargazers'] * len(loads) and loads
+    if incremental:
+        assert store.get('o', 'r', 'commits')['watermark']
+    with pytest.raises(ValueError):
+        etl_runner.Pipeline([], passthrough=True, project_raw=True)
+
+
+def test_repos_job_loads_repo_metadata(server, loads, monkeypatch):
+    raw = []
+    monkeypatch.setattr(etl_runner.load, 'load_raw_to_postgres', lambda table, rows, **kwargs: raw.append((table, rows)))
+    repos = [{'owner': 'o', 'name': 'a'}, {'owner': 'o', 'name': 'b'}]
+    results = etl_runner.Pipeline(repos, ['repos', 'commits'], chunk_rows=10).run()
+    assert all(r['repos'] == {'extracted': 1, 'loaded': 1, 'error': None} for r in results.values())
+    assert sorted(rows[0]['full_name'] for table, rows in raw if table == 'raw_repos') == ['o/a', 'o/b']
+    assert ('repos', 1) in loads and etl_runner.ENDPOINTS[0] == 'repos'
+
+
+def test_extract_runs_jobs_in_priority_order(server, loads, monkeypatch):
+    order = []
+    extract_job = etl_runner.Pipeline._extract
+    monkeypatch.setattr(etl_runner.Pipeline, '_extract',
+                        lambda self, job: (order.append((job.full_name, job.endpoint)), extract_job(self, job)))
+    repos = [{'owner': 'o', 'name': 'a'}, {'owner': 'o', 'name': 'b'}]
+    etl_runner.Pipeline(repos, ['commits', 'stargazers', 'issues'], extract_workers=1, chunk_rows=10,
+                        priorities={'stargazers': -1, 'issues': 1}).run()
+    assert order == [('o/a', 'stargazers'), ('o/b', 'stargazers'), ('o/a', 'commits'), ('o/b', 'commits'),
+                     ('o/a', 'issues'), ('o/b', 'issues')]
@@ -37,12 +37,12 @@ def test_extract_and_load_all():
     print("Testing extract_stargazers...")
     stargazers = extract_stargazers(owner, repo)
     print(f"Stargazers: {len(stargazers)}")
-    load_raw_to_postgres("raw_stargazers", stargazers)
+    load_raw_to_postgres("raw_stargazers", stargazers, repo_full_name=f"{owner}/{repo}")
 
     print("Testing extract_contributors...")
     contributors = extract_contributors(owner, repo)
     print(f"Contributors: {len(contributors)}")
-    load_raw_to_postgres("raw_contributors", contributors)
+    load_raw_to_postgres("raw_contributors", contributors, repo_full_name=f"{owner}/{repo}")
 
 if __name__ == "__main__":
     test_extract_and_load_all()
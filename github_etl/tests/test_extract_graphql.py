@@ -0,0 +1,100 @@
+"""
+Tests for the GraphQL extraction backend against the local stand-in server.
+"""
+import pytest
+
+from github_etl import extract_graphql
+from github_etl.benchmarks.fake_graphql import FakeGraphQLServer, make_fake_data, Parser
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    monkeypatch.setenv('GITHUB_PAT', 'test')
+    monkeypatch.setattr(extract_graphql, '_TOKEN_POOL', None)
+    with FakeGraphQLServer(make_fake_data(repos=3, issues=150, pull_requests=4, stargazers=120)) as server:
+        monkeypatch.setattr(extract_graphql, 'GITHUB_GRAPHQL_URL', server.url)
+        yield server
+
+
+def test_parser_handles_aliases_fragments_and_literals():
+    sel = Parser('{ a: repository(owner: "o", name: "r") { x: issues(first: 2, states: [OPEN], '
+                 'filterBy: {since: "2024"}) { totalCount } owner { ... on User { id } } } }').document()
+    assert sel[0]['alias'] == 'a' and sel[0]['name'] == 'repository'
+    issues = sel[0]['selections'][0]
+    assert issues['args'] == {'first': 2, 'states': ['OPEN'], 'filterBy': {'since': '2024'}}
+    assert sel[0]['selections'][1]['selections'][0]['on'] == 'User'
+
+
+def test_batch_pages_nested_cursors_together(fake):
+    repos = [('fake-org', f'repo{i}') for i in range(3)]
+    result = extract_graphql.extract_repos_batch(repos)
+    assert all(len(r['issues']) == 150 and len(r['stargazers']) == 120 for r in result.values())
+    assert len({i['id'] for r in result.values() for i in r['issues']}) == 450
+    # One query for all three repos, then one query for the six second pages
+    assert fake.requests == 2
+
+
+def test_rest_shaped_records(fake):
+    issues = extract_graphql.extract_issues('fake-org', 'repo0', state='open')
+    assert issues and all(i['state'] == 'open' for i in issues)
+    assert issues[0]['repository_url'].endswith('repos/fake-org/repo0')
+    prs = extract_graphql.extract_pull_requests('fake-org', 'repo0')
+    assert {p['state'] for p in prs} == {'open', 'closed'}
+    stars = extract_graphql.extract_stargazers('fake-org', 'repo1')
+    assert stars[0]['user']['id'] == 1000 and stars[0]['starred_at']
+    repos = extract_graphql.extract_repos('fake-org')
+    assert sorted(r['full_name'] for r in repos) == ['fake-org/repo0', 'fake-org/repo1', 'fake-org/repo2']
+    assert extract_graphql.STATS['points'] >= fake.requests
+
+
+def recording(monkeypatch, before=None):
+    queries = []
+    request = extract_graphql.graphql_request
+
+    def record(query):
+        queries.append(query)
+        if before:
+            before(len(queries))
+        return request(query)
+
+    monkeypatch.setattr(extract_graphql, 'graphql_request', record)
+    return queries
+
+
+def test_single_connection_selects_nothing_else(fake, monkeypatch):
+    queries = recording(monkeypatch)
+    extract_graphql.extract_stargazers('fake-org', 'repo0')
+    extract_graphql.extract_repos_batch([('fake-org', 'repo0')], ('issues',), include_repo=False)
+    assert queries and not any('nameWithOwner' in q or 'pullRequests' in q for q in queries)
+    assert not any('issues' in q for q in queries[:2])
+
+
+def test_stream_yields_bounded_pages(fake):
+    pages = list(extract_graphql.extract_issues('fake-org', 'repo0', stream=True))
+    assert [len(page) for page in pages] == [100, 50]
+    assert fake.requests == 2
+
+
+def test_missing_repos_are_skipped(fake, monkeypatch, capsys):
+    result = extract_graphql.extract_repos_batch([('fake-org', 'repo0'), ('fake-org', 'gone')], ('issues',))
+    assert result['fake-org/gone'] == {'repo': None, 'issues': []}
+    assert len(result['fake-org/repo0']['issues']) == 150
+    assert extract_graphql.extract_stargazers('fake-org', 'gone') == []
+
+    # repo1 disappears after the first query: its second page comes back as a null alias
+    recording(monkeypatch, before=lambda n: n == 2 and fake.data['repos'].pop('fake-org/repo1'))
+    result = extract_graphql.extract_repos_batch([('fake-org', 'repo1'), ('fake-org', 'repo2')], ('issues',))
+    assert len(result['fake-org/repo1']['issues']) == 100
+    assert len(result['fake-org/repo2']['issues']) == 150
+    assert 'fake-org/repo1 issues not found' in capsys.readouterr().out
+
+
+def test_runner_batches_repos(fake, monkeypatch):
+    from github_etl import etl_runner
+    monkeypatch.setattr(etl_runner.load, 'load_typed_to_postgres', lambda entity, table: table.num_rows)
+    monkeypatch.setattr(etl_runner.load, 'load_raw_to_postgres', lambda table, rows, **kwargs: len(rows))
+    repos = [{'owner': 'fake-org', 'name': f'repo{i}'} for i in range(3)]
+    results = etl_runner.Pipeline(repos, ['issues', 'stargazers'], backend='graphql', extract_workers=3).run()
+    assert all(r['issues']['loaded'] == 150 and r['stargazers']['loaded'] == 120 for r in results.values())
+    # Per connection: one query for the three repos, then one for their second pages
+    assert fake.requests == 4
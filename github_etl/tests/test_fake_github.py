@@ -0,0 +1,61 @@
+"""
+Offline tests running extract_* against the local stand-in GitHub REST API.
+"""
+import pytest
+
+from github_etl import extract, scheduler
+from github_etl.benchmarks.fake_github import FakeGitHubServer
+from github_etl.cache import HttpCache
+from github_etl.scheduler import TokenPool
+from github_etl.transform import transform_records
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    def start(tokens=1, **kwargs):
+        server = FakeGitHubServer(**kwargs).__enter__()
+        started.append(server)
+        monkeypatch.setattr(extract, 'GITHUB_API_BASE', server.url)
+        monkeypatch.setattr(extract, '_TOKEN_POOL', TokenPool([f't{i}' for i in range(tokens)]))
+        monkeypatch.setattr(extract, '_CACHE', None)
+        return server
+    started = []
+    yield start
+    for server in started:
+        server.__exit__(None, None, None)
+
+
+@pytest.mark.parametrize('concurrency', [1, 4])
+def test_pages_follow_link_headers(fake, monkeypatch, concurrency):
+    server = fake(pages=4, per_page=10)
+    monkeypatch.setattr(extract, 'DEFAULT_CONCURRENCY', concurrency)
+    commits = extract.extract_commits('o', 'r')
+    assert len(commits) == 40
+    assert len({c['sha'] for c in commits}) == 40
+    assert server.stats['pages'] == 4
+    assert transform_records('commits', commits).column('repo_full_name').to_pylist() == ['o/r'] * 40
+
+
+def test_etags_served_from_cache(fake, monkeypatch, tmp_path):
+    server = fake(pages=3, per_page=10)
+    cache = HttpCache(str(tmp_path / 'cache.sqlite'))
+    monkeypatch.setattr(extract, '_CACHE', cache)
+    first = extract.extract_issues('o', 'r')
+    server.reset_stats()
+    assert extract.extract_issues('o', 'r') == first
+    assert server.stats['not_modified'] == 3 and server.stats['pages'] == 0
+    cache.close()
+
+
+def test_quota_spreads_over_tokens(fake, monkeypatch):
+    monkeypatch.setattr(scheduler, 'RATE_LIMIT_RESERVE', 0)
+    server = fake(tokens=2, pages=4, per_page=10, quota=2, reset_seconds=60)
+    assert len(extract.extract_events('o', 'r')) == 40
+    assert server.stats['rate_limited'] == 0
+    assert server.stats['tokens'] == {'t0', 't1'}
+
+
+def test_secondary_limit_moves_to_other_token(fake):
+    server = fake(tokens=2, pages=3, per_page=10, secondary_every=2)
+    assert len(extract.extract_stargazers('o', 'r')) == 30
+    assert server.stats['secondary_limited'] >= 1
@@ -0,0 +1,107 @@
+"""
+Offline tests for watermark-based incremental extraction.
+"""
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+from github_etl import extract
+from github_etl.state import WatermarkStore
+
+BASE = "https://api.github.com/repos/o/r/"
+
+
+class FakeResponse:
+    def __init__(self, url, rows, next_url=None):
+        self.status_code = 200
+        self.url = url
+        self.headers = {'Link': f'<{next_url}>; rel="next"'} if next_url else {}
+        self._rows = rows
+        self.content = b''
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._rows
+
+
+class ListingSession:
+    """Serves `rows` two per page, following ?page=N."""
+    def __init__(self, path, rows):
+        self.path = path
+        self.rows = rows
+        self.calls = []
+
+    def get(self, url, headers=None, params=None):
+        self.calls.append((url, params))
+        page = int(parse_qs(urlsplit(url).query).get('page', ['1'])[0])
+        chunk = self.rows[(page - 1) * 2:page * 2]
+        next_url = f'{BASE}{self.path}?page={page + 1}' if page * 2 < len(self.rows) else None
+        return FakeResponse(f'{BASE}{self.path}?page={page}', chunk, next_url)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv('GITHUB_PAT', 'test')
+    return WatermarkStore(str(tmp_path / 'state.sqlite'))
+
+
+def _serve(monkeypatch, path, rows):
+    session = ListingSession(path, rows)
+    monkeypatch.setattr(extract, 'get_github_session', lambda: session)
+    return session
+
+
+def test_stop_early_on_seen_records(store, monkeypatch):
+    prs = [{'id': i, 'updated_at': f'2024-01-0{i}T00:00:00Z'} for i in (6, 5, 4, 3, 2, 1)]
+    _serve(monkeypatch, 'pulls', prs[3:])
+    assert len(extract.extract_incremental('o', 'r', 'pull_requests', store)) == 3
+    assert store.get('o', 'r', 'pull_requests')['watermark'] == '2024-01-03T00:00:00Z'
+
+    session = _serve(monkeypatch, 'pulls', prs)
+    new = extract.extract_incremental('o', 'r', 'pull_requests', store)
+    # Page 2 holds the watermark record, so page 3 is never requested
+    assert [r['id'] for r in new] == [6, 5, 4, 3]
+    assert len(session.calls) == 2
+
+
+def test_since_param_passed_from_watermark(store, monkeypatch):
+    store.complete('o', 'r', 'issues', '2024-02-01T00:00:00Z')
+    session = _serve(monkeypatch, 'issues', [])
+    extract.extract_incremental('o', 'r', 'issues', store)
+    assert session.calls[0][1]['since'] == '2024-02-01T00:00:00Z'
+
+
+def test_append_only_restarts_from_last_page(store, monkeypatch):
+    stars = [{'user': {'id': i}, 'starred_at': f'2024-03-0{i}T00:00:00Z'} for i in range(1, 6)]
+    _serve(monkeypatch, 'stargazers', stars[:3])
+    extract.extract_incremental('o', 'r', 'stargazers', store)
+    assert store.get('o', 'r', 'stargazers')['last_page_url'].endswith('page=2')
+
+    session = _serve(monkeypatch, 'stargazers', stars)
+    new = extract.extract_incremental('o', 'r', 'stargazers', store)
+    assert session.calls[0][0].endswith('page=2')
+    assert [r['user']['id'] for r in new] == [3, 4, 5]
+
+
+def test_crash_resumes_from_checkpointed_cursor(store, monkeypatch):
+    events = [{'id': i, 'created_at': f'2024-04-0{i}T00:00:00Z'} for i in (6, 5, 4, 3, 2, 1)]
+    _serve(monkeypatch, 'events', events)
+    loaded = []
+
+    def flaky_load(rows):
+        if len(loaded) == 2:
+            raise RuntimeError('worker died')
+        loaded.extend(rows)
+
+    with pytest.raises(RuntimeError):
+        extract.extract_incremental('o', 'r', 'events', store, on_page=flaky_load)
+    assert store.get('o', 'r', 'events')['next_url'].endswith('page=2')
+
+    session = _serve(monkeypatch, 'events', events)
+    extract.extract_incremental('o', 'r', 'events', store, on_page=loaded.extend)
+    assert session.calls[0][0].endswith('page=2')
+    assert [r['id'] for r in loaded] == [6, 5, 4, 3, 2, 1]
+    state = store.get('o', 'r', 'events')
+    assert state['watermark'] == '2024-04-06T00:00:00Z' and state['next_url'] is None
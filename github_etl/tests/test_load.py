@@ -0,0 +1,98 @@
+"""
+Offline tests for raw-table loading helpers.
+"""
+import pytest
+
+from github_etl.load import iter_batches
+
+
+def test_iter_batches_accepts_records_and_pages():
+    pages = iter([[{'id': 1}, {'id': 2}], [{'id': 3}], {'id': 4}, [{'id': 5}]])
+    batches = list(iter_batches(pages, batch_size=2))
+    assert [[r['id'] for r in b] for b in batches] == [[1, 2], [3, 4], [5]]
+
+
+def test_copy_text_escape():
+    import json
+    from github_etl.load import copy_text_escape
+    encoded = copy_text_escape(json.dumps({'msg': 'a\tb\nc \\ "d"'}))
+    assert '\t' not in encoded and '\n' not in encoded
+    # COPY text format turns '\\' back into a single backslash
+    assert json.loads(encoded.replace('\\\\', '\\')) == {'msg': 'a\tb\nc \\ "d"'}
+
+
+def test_prepare_raw_rows_keys_and_hashes():
+    from github_etl.load import prepare_raw_rows
+    rows = prepare_raw_rows('raw_commits', [
+        {'sha': 'abc', 'message': 'old'},
+        {'sha': 'def', 'message': 'x'},
+        {'message': 'new', 'sha': 'abc'},
+    ])
+    assert [key for key, _, _ in rows] == ['abc', 'def']
+    # Last duplicate wins; key order in the payload does not affect the hash
+    again = prepare_raw_rows('raw_commits', [{'sha': 'abc', 'message': 'new'}])
+    assert rows[0][1:] == again[0][1:]
+    star = {'user': {'id': 7}, 'starred_at': '2024-01-01T00:00:00Z'}
+    assert prepare_raw_rows('raw_stargazers', [star], 'o/a')[0][0] == 'o/a:7:2024-01-01T00:00:00Z'
+    # The same contributor in two repos keeps one row per repo
+    keys = {prepare_raw_rows('raw_contributors', [{'id': 9, 'contributions': n}], repo)[0][0]
+            for n, repo in enumerate(['o/a', 'o/b'])}
+    assert keys == {'o/a:9', 'o/b:9'}
+    with pytest.raises(ValueError, match='repo_full_name'):
+        prepare_raw_rows('raw_stargazers', [star])
+
+
+class RecordingConn:
+    """Stands in for a pooled connection; keeps every statement executed on it."""
+
+    def __init__(self):
+        self.sql = []
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=None):
+        self.sql.append(sql)
+        self.rowcount = 0
+
+    def copy_expert(self, sql, buf):
+        self.sql.append(sql)
+
+    def commit(self):
+        pass
+
+
+def test_typed_merge_keeps_newest_duplicate(monkeypatch):
+    from contextlib import contextmanager
+    from github_etl import load
+    from github_etl.transform import transform_records
+    conn = RecordingConn()
+    monkeypatch.setattr(load, 'pooled_conn', contextmanager(lambda: (yield conn)))
+    monkeypatch.setattr(load, '_ENSURED_TABLES', set())
+    issues = transform_records('issues', [{'id': 1, 'title': 'old'}, {'id': 1, 'title': 'new'}])
+    load.load_typed_to_postgres('issues', issues)
+    assert any('stage_seq BIGSERIAL' in sql for sql in conn.sql)
+    merge = conn.sql[-1]
+    assert 'ORDER BY "issue_id", "updated_at" DESC NULLS LAST, stage_seq DESC' in merge
+    load.load_typed_to_postgres('commits', transform_records('commits', [{'sha': 'abc'}]))
+    assert 'ORDER BY "sha", stage_seq DESC' in conn.sql[-1]
+
+
+def test_raw_table_ddl_runs_once_per_process(monkeypatch):
+    from contextlib import contextmanager
+    from github_etl import load
+    conn = RecordingConn()
+    conn.fetchall = lambda: []
+    monkeypatch.setattr(load, 'pooled_conn', contextmanager(lambda: (yield conn)))
+    monkeypatch.setattr(load, '_ENSURED_TABLES', set())
+    for _ in range(2):
+        load.load_raw_to_postgres('raw_commits', [{'sha': 'abc'}])
+    assert sum('CREATE UNIQUE INDEX' in sql for sql in conn.sql) == 1
+    # The session-local staging table is still checked per load
+    assert sum('CREATE TEMP TABLE' in sql for sql in conn.sql) == 2
@@ -0,0 +1,48 @@
+"""
+Offline tests for run metrics, the span tree and their exports.
+"""
+import json
+import threading
+
+from github_etl import extract, metrics
+from github_etl.benchmarks.fake_github import FakeGitHubServer
+from github_etl.scheduler import TokenPool
+
+
+def test_span_tree_and_exports(tmp_path):
+    run = metrics.start_run('test_run')
+    with metrics.span('stage', stage='extract') as stage:
+        with metrics.span('repo', repo='o/r'):
+            metrics.observe('github_request_seconds', 0.02, status=200)
+            metrics.observe('github_request_seconds', 3.0, status=200)
+        worker = threading.Thread(target=lambda: metrics.span('job', parent=stage).__enter__().finish())
+        worker.start()
+        worker.join()
+    metrics.inc('rows_loaded_total', 5, table='raw_x')
+    metrics.finish_run(str(tmp_path))
+
+    tree = run.summary()['spans']
+    assert [c['name'] for c in tree['children']] == ['stage']
+    assert [c['name'] for c in tree['children'][0]['children']] == ['repo', 'job']
+
+    prom = (tmp_path / 'test_run.prom').read_text()
+    assert 'etl_github_request_seconds_bucket{status="200",le="0.025"} 1' in prom
+    assert 'etl_github_request_seconds_bucket{status="200",le="+Inf"} 2' in prom
+    assert 'etl_github_request_seconds_count{status="200"} 2' in prom
+    assert 'etl_rows_loaded_total{table="raw_x"} 5' in prom
+
+    summary = json.loads(next(tmp_path.glob('test_run-*.json')).read_text())
+    assert summary['histograms'][0]['p50'] == 0.025
+
+
+def test_extract_records_pages_and_bytes(monkeypatch):
+    run = metrics.start_run('extract_run')
+    with FakeGitHubServer(pages=3, per_page=10) as server:
+        monkeypatch.setattr(extract, 'GITHUB_API_BASE', server.url)
+        monkeypatch.setattr(extract, '_TOKEN_POOL', TokenPool(['t']))
+        monkeypatch.setattr(extract, '_CACHE', None)
+        extract.extract_commits('o', 'r')
+    metrics.finish_run(None)
+    assert run.counters[('github_pages_total', ())] == 3
+    assert run.counters[('github_bytes_total', ())] == server.stats['bytes']
+    assert run.root.children[0].attrs == {'url': '/repos/o/r/commits', 'rows': 30}
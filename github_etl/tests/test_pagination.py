@@ -0,0 +1,127 @@
+"""
+Offline tests for Link-header pagination in github_api_get.
+"""
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+from github_etl import extract
+
+BASE = "https://api.github.com/repos/o/r/commits"
+LAST_PAGE = 5
+
+
+class FakeResponse:
+    def __init__(self, page):
+        self.status_code = 200
+        self.headers = {}
+        if page < LAST_PAGE:
+            self.headers['Link'] = (f'<{BASE}?per_page=2&page={page + 1}>; rel="next", '
+                                    f'<{BASE}?per_page=2&page={LAST_PAGE}>; rel="last"')
+        self._page = page
+        self.content = b''
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return [{'page': self._page, 'i': 0}, {'page': self._page, 'i': 1}]
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, headers=None, params=None):
+        self.calls.append(url)
+        page = int(parse_qs(urlsplit(url).query).get('page', ['1'])[0])
+        return FakeResponse(page)
+
+
+def _run(monkeypatch, concurrency):
+    session = FakeSession()
+    monkeypatch.setenv('GITHUB_PAT', 'test')
+    monkeypatch.setattr(extract, 'get_github_session', lambda: session)
+    return extract.github_api_get(BASE, concurrency=concurrency), session
+
+
+def test_parse_link_header():
+    rels = extract.parse_link_header(f'<{BASE}?page=2>; rel="next", <{BASE}?page=9>; rel="last"')
+    assert rels == {'next': f'{BASE}?page=2', 'last': f'{BASE}?page=9'}
+
+
+def test_page_urls_from_last_keeps_params():
+    urls = extract.page_urls_from_last(f'{BASE}?per_page=100&since=2024-01-01&page=4')
+    assert [parse_qs(urlsplit(u).query)['page'][0] for u in urls] == ['2', '3', '4']
+    assert all(parse_qs(urlsplit(u).query)['since'] == ['2024-01-01'] for u in urls)
+
+
+def test_concurrent_matches_sequential(monkeypatch):
+    sequential, _ = _run(monkeypatch, 1)
+    concurrent, session = _run(monkeypatch, 4)
+    assert concurrent == sequential
+    assert [row['page'] for row in concurrent[::2]] == list(range(1, LAST_PAGE + 1))
+    assert len(session.calls) == LAST_PAGE
+
+
+def test_stream_yields_pages_in_order(monkeypatch):
+    for concurrency in (1, 3):
+        session = FakeSession()
+        monkeypatch.setenv('GITHUB_PAT', 'test')
+        monkeypatch.setattr(extract, 'get_github_session', lambda: session)
+        pages = list(extract.github_api_get(BASE, concurrency=concurrency, stream=True))
+        assert [page[0]['page'] for page in pages] == list(range(1, LAST_PAGE + 1))
+
+
+def test_prefetch_reraises_fetch_errors():
+    def pages():
+        yield [{'page': 1}]
+        raise RuntimeError('boom')
+
+    stream = extract.prefetch(pages())
+    assert next(stream) == [{'page': 1}]
+    try:
+        next(stream)
+    except RuntimeError as exc:
+        assert str(exc) == 'boom'
+    else:
+        raise AssertionError('expected RuntimeError')
+
+
+def _new_threads(before):
+    time.sleep(0.2)  # let the producer fill the buffer and block
+    return set(threading.enumerate()) - before
+
+
+def test_prefetch_producer_exits_when_consumer_stops_early():
+    closed = threading.Event()
+
+    def pages():
+        try:
+            for i in range(100):
+                yield [{'page': i}]
+        except GeneratorExit:
+            closed.set()
+            raise
+
+    # Blocked on a page: the producer stops and closes the page generator
+    before = set(threading.enumerate())
+    source = pages()
+    stream = extract.prefetch(source, depth=1)
+    assert next(stream) == [{'page': 0}]
+    producers = _new_threads(before)
+    stream.close()
+    for thread in producers:
+        thread.join(2)
+        assert not thread.is_alive()
+    assert closed.is_set()
+
+    # Blocked on the end-of-pages marker
+    before = set(threading.enumerate())
+    stream = extract.prefetch(iter([[{'page': 0}], [{'page': 1}]]), depth=1)
+    assert next(stream) == [{'page': 0}]
+    producers = _new_threads(before)
+    stream.close()
+    for thread in producers:
+        thread.join(2)
+        assert not thread.is_alive()
@@ -0,0 +1,44 @@
+"""
+Tests for raw payload projection.
+"""
+import pytest
+
+from github_etl import projection
+from github_etl.benchmarks.fake_github import make_record
+from github_etl.load import prepare_raw_rows
+from github_etl.transform import transform_records
+
+KINDS = {'repos': 'repos', 'commits': 'commits', 'issues': 'issues', 'pull_requests': 'pulls',
+         'events': 'events', 'stargazers': 'stargazers', 'contributors': 'contributors'}
+
+
+def sample(entity, n=20):
+    return [make_record(KINDS[entity], 'o', 'r', i, 'https://api.github.com/', 'x' * 300) for i in range(n)]
+
+
+@pytest.mark.parametrize('entity', list(KINDS))
+def test_projection_keeps_what_transform_and_keys_read(entity):
+    rows = sample(entity)
+    projected = projection.project_records(entity, rows)
+    context = {'repo_full_name': 'o/r'}
+    assert transform_records(entity, projected, context).equals(transform_records(entity, rows, context))
+    table = f'raw_{entity}'
+    assert [key for key, _, _ in prepare_raw_rows(table, projected, 'o/r')] == \
+        [key for key, _, _ in prepare_raw_rows(table, rows, 'o/r')]
+    report = projection.measure(entity, rows)
+    assert report['bytes_after'] <= report['bytes_before']
+
+
+def test_refs_become_compact_and_urls_drop():
+    issue = sample('issues', 1)[0]
+    issue['assignees'] = [dict(issue['user'], avatar_url='https://avatars/1', gravatar_id='')]
+    projected = projection.project_record('issues', issue)
+    assert projected['user'] == {'id': issue['user']['id'], 'login': issue['user']['login']}
+    assert projected['assignees'] == [{'id': issue['user']['id'], 'login': issue['user']['login']}]
+    assert 'body' not in projected
+    assert projected['repository_url'] == issue['repository_url']  # read by the transform
+
+
+def test_overrides_add_fields():
+    issue = sample('issues', 1)[0]
+    assert projection.project_record('issues', issue, {'keep': ['body']})['body'] == issue['body']
@@ -0,0 +1,75 @@
+"""
+Offline tests for the read-only guards in scripts/replay_query_history.py (no Postgres).
+"""
+import importlib.util
+import os
+
+import pytest
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'replay_query_history.py')
+_spec = importlib.util.spec_from_file_location('replay_query_history', _SCRIPT)
+replay = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(replay)
+
+
+@pytest.mark.parametrize('text, replayable', [
+    ('SELECT 1', True),
+    ("select ';' AS semicolon, 'commit' AS word;", True),
+    ('WITH a AS (SELECT 1) SELECT * FROM a -- done; really', True),
+    ('SELECT 1; COMMIT; DELETE FROM raw_events', False),
+    ('SELECT 1; SELECT 2', False),
+    ('DELETE FROM raw_events', False),
+    ('COMMIT', False),
+    ("SELECT set_config('default_transaction_read_only', 'off', false)", False),
+    ('SELECT $$;$$', False),
+])
+def test_is_replayable(text, replayable):
+    assert replay.is_replayable(text) is replayable
+
+
+class HistoryConn:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def rollback(self):
+        pass
+
+
+def test_workload_skips_multi_statement_texts():
+    conn = HistoryConn([('SELECT 1', 5), ('SELECT 1; COMMIT; DELETE FROM t', 3), ('SELECT 2', 7)])
+    workload = replay.load_workload(conn)
+    assert sorted(text for entry in workload.values() for text in entry['texts']) == ['SELECT 1', 'SELECT 2']
+
+
+def test_replayer_refuses_unsafe_workload_and_connects_read_only(monkeypatch):
+    with pytest.raises(ValueError, match='single read-only'):
+        replay.Replayer('postgres://target', {'fp': {'texts': ['SELECT 1; DROP TABLE t'], 'calls': 1}})
+
+    connected = {}
+
+    class Conn(HistoryConn):
+        def set_session(self, **kwargs):
+            connected['session'] = kwargs
+
+        def commit(self):
+            pass
+
+    monkeypatch.setattr(replay.psycopg2, 'connect', lambda url, **kwargs: connected.update(kwargs) or Conn([]))
+    replay.Replayer('postgres://target', {'fp': {'texts': ['SELECT 1'], 'calls': 1}})._connect()
+    assert connected['options'] == '-c default_transaction_read_only=on'
+    assert connected['session'] == {'readonly': True}
@@ -0,0 +1,74 @@
+"""
+Offline tests for query-shape routing in scripts/rollups.py (SQL generation only, no Postgres).
+"""
+import importlib.util
+import os
+
+import pytest
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'rollups.py')
+_spec = importlib.util.spec_from_file_location('rollups', _SCRIPT)
+rollups = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(rollups)
+
+
+@pytest.mark.parametrize('shape, source', [
+    ('events_per_type_per_day', 'rollup_events_day'),
+    ('events_per_type_per_month', 'rollup_events_day'),
+    ('active_actors_per_type_per_day', 'rollup_events_day'),
+    ('events_per_repo_per_day', 'rollup_events_repo_day'),
+    ('repo_activity_by_type', 'rollup_events_repo_day'),
+    ('events_per_actor_per_week', 'rollup_events_actor_day'),
+    ('top_repos', 'rollup_events_repo_day'),
+    ('top_actors', 'rollup_events_actor_day'),
+])
+def test_query_shapes_use_smallest_rollup(shape, source):
+    assert rollups.route_shape(shape)[2] == source
+
+
+@pytest.mark.parametrize('shape', [
+    # Distinct actors over a week or month can't be summed from daily rows
+    {'dimensions': ['event_type'], 'grain': 'month', 'measures': ['actors']},
+    {'dimensions': ['repo_id', 'event_type'], 'grain': 'week', 'measures': ['actors']},
+    # Per repo across event types: the rollup's rows are per type, so their distinct counts overlap
+    {'dimensions': ['repo_id'], 'grain': 'day', 'measures': ['actors']},
+    {'dimensions': ['event_type'], 'grain': None, 'measures': ['repos']},
+    # No rollup holds both dimensions, or the measure at that grain
+    {'dimensions': ['repo_id', 'actor_id'], 'grain': 'day'},
+    {'dimensions': ['repo_id'], 'grain': 'day', 'measures': ['repos']},
+])
+def test_unanswerable_shapes_fall_back_to_fact_events(shape):
+    sql, _, source = rollups.route(**shape)
+    assert source == 'fact_events'
+    measure = shape.get('measures', ['events'])[0]
+    assert f'{rollups.MEASURES[measure]} AS {measure} FROM fact_events' in sql
+
+
+def test_filter_pins_dimension_for_exact_distinct_counts():
+    sql, params, source = rollups.route(['repo_id'], 'day', ['actors'], filters={'event_type': 'PushEvent'},
+                                        since='2023-01-01', until='2023-02-01', labels=False)
+    assert source == 'rollup_events_repo_day'
+    assert 'sum(actors)::bigint AS actors' in sql
+    assert 'WHERE day >= %s AND day < %s AND event_type = %s' in sql
+    assert params == ['2023-01-01', '2023-02-01', 'PushEvent']
+
+
+def test_additive_measures_are_summed_on_rollups():
+    sql, _, source = rollups.route(['event_type'], 'month', ['events'], filters={'repo_id': 7}, labels=False)
+    assert source == 'rollup_events_repo_day'
+    assert sql.startswith("SELECT date_trunc('month', day)::date AS period, event_type, sum(events)::bigint AS events")
+    assert sql.endswith('GROUP BY period, event_type ORDER BY period, event_type')
+
+
+def test_top_and_labels():
+    sql, _, _ = rollups.route_shape('top_repos')
+    assert 'ORDER BY events DESC LIMIT 20' in sql
+    assert 'LEFT JOIN LATERAL (SELECT name FROM dim_repositories d WHERE d.repo_id = q.repo_id LIMIT 1) l0' in sql
+    assert sql.endswith('ORDER BY q.events DESC')
+
+
+def test_unknown_names_rejected():
+    with pytest.raises(ValueError, match='org_id'):
+        rollups.route(['org_id'])
+    with pytest.raises(ValueError, match='grain'):
+        rollups.route(['event_type'], grain='year')
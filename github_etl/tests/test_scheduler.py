@@ -0,0 +1,58 @@
+"""
+Offline tests for the rate-limit-aware token pool.
+"""
+import time
+
+from github_etl import extract
+from github_etl.scheduler import TokenPool
+
+
+def test_prefers_token_with_most_quota_and_skips_exhausted():
+    pool = TokenPool(['a', 'b'])
+    reset = str(int(time.time()) + 3600)
+    first = pool.acquire()
+    pool.update(first, 200, {'X-RateLimit-Remaining': '3', 'X-RateLimit-Reset': reset})
+    second = pool.acquire()
+    assert second.token != first.token  # unknown quota is probed before a nearly exhausted token
+    pool.update(second, 200, {'X-RateLimit-Remaining': '4000', 'X-RateLimit-Reset': reset})
+    assert pool.acquire() is second
+
+
+def test_rate_limited_request_retried_on_other_token(monkeypatch):
+    class Response:
+        def __init__(self, status, headers):
+            self.status_code, self.headers, self.url, self.text = status, headers, None, ''
+            self.content = b''
+
+        def raise_for_status(self):
+            assert self.status_code == 200
+
+        def json(self):
+            return [{'ok': True}]
+
+    class Session:
+        def __init__(self):
+            self.tokens = []
+
+        def get(self, url, headers=None, params=None):
+            self.tokens.append(headers['Authorization'])
+            if headers['Authorization'] == 'token a':
+                return Response(403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + 3600)})
+            return Response(200, {'X-RateLimit-Remaining': '10'})
+
+    session = Session()
+    pool = TokenPool(['a', 'b'])
+    monkeypatch.setattr(extract, 'get_github_session', lambda: session)
+    monkeypatch.setattr(extract, '_TOKEN_POOL', pool)
+    assert extract.github_api_get('https://api.github.com/x') == [{'ok': True}]
+    assert extract.github_api_get('https://api.github.com/y') == [{'ok': True}]
+    assert session.tokens == ['token a', 'token b', 'token b']
+    assert pool.stats['primary_limited'] == 1
+
+
+def test_secondary_limit_blocks_token_for_retry_after():
+    pool = TokenPool(['a'])
+    token = pool.acquire()
+    assert pool.update(token, 403, {'Retry-After': '30', 'X-RateLimit-Remaining': '100'})
+    assert not token.available(time.time()) and token.available(time.time() + 31)
+
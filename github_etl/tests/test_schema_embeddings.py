@@ -0,0 +1,72 @@
+"""
+Offline tests for scripts/refresh_schema_embeddings.py with the local embedding
+provider (no OpenAI, no Postgres).
+"""
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+_SCRIPTS = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts')
+sys.path.insert(0, _SCRIPTS)  # the script imports its sibling modules by name
+_spec = importlib.util.spec_from_file_location('refresh_schema_embeddings',
+                                               os.path.join(_SCRIPTS, 'refresh_schema_embeddings.py'))
+embeddings = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(embeddings)
+
+SNAPSHOT = [
+    {'table_schema': 'public', 'table_name': 'fact_issues',
+     'column_details': [{'name': 'issue_id', 'type': 'bigint'}, {'name': 'title', 'type': 'text'}]},
+    {'table_schema': 'public', 'table_name': 'dim_repos',
+     'column_details': [{'name': 'repo_id', 'type': 'bigint'}]},
+]
+
+
+class SlowProvider(embeddings.LocalEmbeddingProvider):
+    """Local vectors, but later batches answer first and concurrent calls are counted."""
+
+    def __init__(self):
+        super().__init__(dim=8)
+        self.batches = []
+        self.in_flight = self.peak = 0
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            delay = 0.05 / len(self.batches)
+        time.sleep(delay)
+        with self._lock:
+            self.in_flight -= 1
+        return super().embed(texts)
+
+
+def test_schema_hash_depends_on_text_and_model():
+    base = embeddings.schema_hash('Table: t\na int', 'model-a')
+    assert base == embeddings.schema_hash('Table: t\na int', 'model-a')
+    assert base != embeddings.schema_hash('Table: t\na bigint', 'model-a')
+    assert base != embeddings.schema_hash('Table: t\na int', 'model-b')
+
+
+def test_embed_texts_batches_and_keeps_order():
+    provider = SlowProvider()
+    texts = [f'Table: t{i}' for i in range(10)]
+    vectors = embeddings.embed_texts(provider, texts, batch_size=3, concurrency=4)
+    assert [len(batch) for batch in sorted(provider.batches, key=lambda b: b[0])] == [3, 3, 3, 1]
+    assert provider.peak > 1
+    assert vectors == embeddings.LocalEmbeddingProvider(dim=8).embed(texts)
+
+
+def test_build_table_schemas_with_local_provider():
+    schemas = embeddings.build_table_schemas(SNAPSHOT)
+    assert schemas == {'fact_issues': 'Table: fact_issues\nissue_id bigint\ntitle text',
+                       'dim_repos': 'Table: dim_repos\nrepo_id bigint'}
+    provider = embeddings.LocalEmbeddingProvider()
+    vectors = embeddings.embed_texts(provider, list(schemas.values()))
+    assert len(vectors) == 2 and all(len(v) == 1536 for v in vectors)
+    assert abs(sum(x * x for x in vectors[0]) - 1.0) < 1e-9
+    assert vectors[0] != vectors[1]
+    assert embeddings.to_vector_literal([0.5, -1.0]) == '[0.5,-1.0]'
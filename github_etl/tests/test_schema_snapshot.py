@@ -0,0 +1,59 @@
+"""
+Offline tests for scripts/schema_snapshot.py transaction handling (no Postgres).
+"""
+import importlib.util
+import os
+
+import psycopg2.errors
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'schema_snapshot.py')
+_spec = importlib.util.spec_from_file_location('schema_snapshot', _SCRIPT)
+schema_snapshot = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(schema_snapshot)
+
+
+class FakeConn:
+    """Records statements and transaction calls; the refresh function is missing until the DDL runs."""
+
+    def __init__(self):
+        self.log = []
+        self.installed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.log.append('COMMIT')
+
+    def rollback(self):
+        self.log.append('ROLLBACK')
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=None):
+        self.conn.log.append(sql.strip().split('\n')[0])
+        if sql == schema_snapshot.SNAPSHOT_DDL:
+            self.conn.installed = True
+        elif 'schema_snapshot_refresh(%s)' in sql and not self.conn.installed:
+            raise psycopg2.errors.UndefinedFunction()
+
+    def fetchone(self):
+        return (True,)
+
+
+def test_missing_function_rolls_back_to_savepoint_only():
+    conn = FakeConn()
+    assert schema_snapshot.refresh_snapshot(conn) is True
+    assert 'ROLLBACK' not in conn.log
+    assert conn.log[:3] == ['SAVEPOINT schema_snapshot_refresh', 'SELECT schema_snapshot_refresh(%s)',
+                            'ROLLBACK TO SAVEPOINT schema_snapshot_refresh']
+    assert conn.log[-2:] == ['SELECT schema_snapshot_refresh(%s)', 'COMMIT']
@@ -0,0 +1,65 @@
+"""
+Tests for the columnar transform layer.
+"""
+import json
+from datetime import datetime, timezone
+
+from github_etl.transform import ENTITIES, read_schema, transform_records, transform_ndjson, transform_stream, transform_repos
+
+EVENTS = [
+    {'id': '101', 'type': 'IssuesEvent', 'actor': {'id': 1, 'login': 'a', 'url': 'u'},
+     'repo': {'id': 9, 'name': 'o/r'}, 'payload': {'action': 'opened', 'issue': {}},
+     'public': True, 'created_at': '2024-01-01T12:00:00Z'},
+    {'id': '102', 'type': 'PushEvent', 'actor': {'id': 2, 'login': 'b'},
+     'repo': {'id': 9, 'name': 'o/r'}, 'org': {'id': 5}, 'payload': {'push_id': 1},
+     'public': True, 'created_at': '2024-01-02T12:00:00Z'},
+]
+
+
+def test_read_schema_only_holds_mapped_paths():
+    schema = read_schema('events')
+    assert set(schema.names) == {'id', 'type', 'actor', 'repo', 'org', 'payload', 'public', 'created_at'}
+    assert schema.field('payload').type.num_fields == 1
+
+
+def test_events_flattened_and_typed():
+    rows = transform_records('events', EVENTS).to_pylist()
+    assert rows[0]['event_id'] == 101
+    assert rows[0]['action'] == 'opened' and rows[1]['action'] is None
+    assert rows[0]['org_id'] is None and rows[1]['org_id'] == 5
+    assert rows[1]['created_at'] == datetime(2024, 1, 2, 12, tzinfo=timezone.utc)
+
+
+def test_ndjson_matches_records():
+    ndjson = '\n'.join(json.dumps(e) for e in EVENTS).encode()
+    assert transform_ndjson('events', ndjson).equals(transform_records('events', EVENTS))
+
+
+def test_derived_and_context_columns():
+    commits = transform_records('commits', [{
+        'sha': 'abc', 'url': 'https://api.github.com/repos/o/r/commits/abc',
+        'commit': {'author': {'name': 'n', 'date': '2024-01-01T00:00:00Z'}}}]).to_pylist()
+    assert commits[0]['repo_full_name'] == 'o/r' and commits[0]['author_id'] is None
+    stars = list(transform_stream('stargazers', [[{'user': {'id': 1}, 'starred_at': None}]] * 3,
+                                  context={'repo_full_name': 'o/r'}, batch_size=2))
+    assert [t.num_rows for t in stars] == [2, 1]
+    assert stars[0].column('repo_full_name').to_pylist() == ['o/r', 'o/r']
+
+
+def test_every_entity_key_is_an_output_column():
+    for entity, spec in ENTITIES.items():
+        columns = spec.get('context', []) + [col for col, _, _ in spec['fields']]
+        assert set(spec['key']) <= set(columns), entity
+
+
+def test_transform_repos_returns_dicts():
+    assert transform_repos([{'id': 1, 'full_name': 'o/r', 'owner': {'login': 'o'}}])[0]['owner_login'] == 'o'
+
+
+def test_contributor_falls_back_to_email():
+    rows = transform_records('contributors', [
+        {'login': 'octo', 'id': 1, 'type': 'User', 'contributions': 5},
+        {'email': 'anon@example.com', 'type': 'Anonymous', 'contributions': 2},
+    ], {'repo_full_name': 'o/r'}).to_pylist()
+    assert [r['contributor'] for r in rows] == ['octo', 'anon@example.com']
+    assert rows[1]['user_id'] is None and rows[1]['email'] == 'anon@example.com'
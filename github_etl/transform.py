@@ -1,13 +1,279 @@
 """
 Module: transform.py
 Handles transformation of raw GitHub data into warehouse-optimized schemas.
+
+Each entity is a declarative list of (column, source path, type) mappings. Raw
+records are converted to Arrow once (nested structs holding only the mapped
+paths) and every column is then projected, cast and derived with vectorized
+Arrow compute kernels, so there is no per-record Python work after conversion.
+Newline-delimited JSON can skip Python dicts entirely (see transform_ndjson).
+
+A source path may also be a list of paths: the first non-null one wins.
+
+Field types:
+- int / str / bool: copied as int64 / string / bool
+- ts: ISO8601 string parsed to a UTC timestamp
+- int_str: numeric string (e.g. event ids) cast to int64
+- present: True when the source object exists (e.g. issue.pull_request)
+- repo_from_url: "owner/name" extracted from an API URL
 """
 
-from typing import List, Dict, Any
+import io
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pajson
+
+DEFAULT_TRANSFORM_BATCH_SIZE = 50000
+
+# Arrow type used to read each field type from JSON before projection
+_READ_TYPES = {
+    'int': pa.int64(),
+    'str': pa.string(),
+    'bool': pa.bool_(),
+    'ts': pa.string(),
+    'int_str': pa.string(),
+    'repo_from_url': pa.string(),
+}
+
+_REPO_URL_PATTERN = r'/repos/(?P<repo>[^/]+/[^/]+)'
+
+ENTITIES = {
+    'repos': {
+        'table': 'dim_repos',
+        'key': ['repo_id'],
+        'fields': [
+            ('repo_id', 'id', 'int'),
+            ('repo_full_name', 'full_name', 'str'),
+            ('name', 'name', 'str'),
+            ('owner_id', 'owner.id', 'int'),
+            ('owner_login', 'owner.login', 'str'),
+            ('description', 'description', 'str'),
+            ('language', 'language', 'str'),
+            ('private', 'private', 'bool'),
+            ('fork', 'fork', 'bool'),
+            ('archived', 'archived', 'bool'),
+            ('default_branch', 'default_branch', 'str'),
+            ('stargazers_count', 'stargazers_count', 'int'),
+            ('forks_count', 'forks_count', 'int'),
+            ('open_issues_count', 'open_issues_count', 'int'),
+            ('created_at', 'created_at', 'ts'),
+            ('updated_at', 'updated_at', 'ts'),
+            ('pushed_at', 'pushed_at', 'ts'),
+        ],
+    },
+    'commits': {
+        'table': 'fact_commits',
+        'key': ['sha'],
+        'fields': [
+            ('sha', 'sha', 'str'),
+            ('repo_full_name', 'url', 'repo_from_url'),
+            ('author_id', 'author.id', 'int'),
+            ('author_login', 'author.login', 'str'),
+            ('author_name', 'commit.author.name', 'str'),
+            ('author_email', 'commit.author.email', 'str'),
+            ('authored_at', 'commit.author.date', 'ts'),
+            ('committer_id', 'committer.id', 'int'),
+            ('committed_at', 'commit.committer.date', 'ts'),
+            ('message', 'commit.message', 'str'),
+            ('comment_count', 'commit.comment_count', 'int'),
+        ],
+    },
+    'issues': {
+        'table': 'fact_issues',
+        'key': ['issue_id'],
+        'fields': [
+            ('issue_id', 'id', 'int'),
+            ('repo_full_name', 'repository_url', 'repo_from_url'),
+            ('number', 'number', 'int'),
+            ('title', 'title', 'str'),
+            ('state', 'state', 'str'),
+            ('user_id', 'user.id', 'int'),
+            ('user_login', 'user.login', 'str'),
+            ('comments', 'comments', 'int'),
+            ('is_pull_request', 'pull_request', 'present'),
+            ('created_at', 'created_at', 'ts'),
+            ('updated_at', 'updated_at', 'ts'),
+            ('closed_at', 'closed_at', 'ts'),
+        ],
+    },
+    'pull_requests': {
+        'table': 'fact_pull_requests',
+        'key': ['pr_id'],
+        'fields': [
+            ('pr_id', 'id', 'int'),
+            ('repo_full_name', 'base.repo.full_name', 'str'),
+            ('number', 'number', 'int'),
+            ('title', 'title', 'str'),
+            ('state', 'state', 'str'),
+            ('draft', 'draft', 'bool'),
+            ('user_id', 'user.id', 'int'),
+            ('user_login', 'user.login', 'str'),
+            ('head_sha', 'head.sha', 'str'),
+            ('base_ref', 'base.ref', 'str'),
+            ('merge_commit_sha', 'merge_commit_sha', 'str'),
+            ('created_at', 'created_at', 'ts'),
+            ('updated_at', 'updated_at', 'ts'),
+            ('closed_at', 'closed_at', 'ts'),
+            ('merged_at', 'merged_at', 'ts'),
+        ],
+    },
+    'events': {
+        # Not fact_events: that name is the GH Archive table loaded by scripts/bq_to_neon.py
+        'table': 'fact_repo_events',
+        'key': ['event_id'],
+        'fields': [
+            ('event_id', 'id', 'int_str'),
+            ('event_type', 'type', 'str'),
+            ('actor_id', 'actor.id', 'int'),
+            ('actor_login', 'actor.login', 'str'),
+            ('repo_id', 'repo.id', 'int'),
+            ('repo_full_name', 'repo.name', 'str'),
+            ('org_id', 'org.id', 'int'),
+            ('action', 'payload.action', 'str'),
+            ('public', 'public', 'bool'),
+            ('created_at', 'created_at', 'ts'),
+        ],
+    },
+    'stargazers': {
+        'table': 'fact_stargazers',
+        'key': ['repo_full_name', 'user_id'],
+        'context': ['repo_full_name'],
+        'fields': [
+            ('user_id', 'user.id', 'int'),
+            ('user_login', 'user.login', 'str'),
+            ('starred_at', 'starred_at', 'ts'),
+        ],
+    },
+    'contributors': {
+        'table': 'dim_contributors',
+        'key': ['repo_full_name', 'contributor'],
+        'context': ['repo_full_name'],
+        'fields': [
+            # login for users, email for anonymous contributors
+            ('contributor', ['login', 'email'], 'str'),
+            ('email', 'email', 'str'),
+            ('user_id', 'id', 'int'),
+            ('type', 'type', 'str'),
+            ('contributions', 'contributions', 'int'),
+        ],
+    },
+}
+
+
+def field_paths(path: Union[str, List[str]]) -> List[str]:
+    """The source paths of a field mapping, in fallback order."""
+    return [path] if isinstance(path, str) else list(path)
+
+
+def _insert_path(tree: dict, path: List[str], arrow_type: pa.DataType):
+    head = path[0]
+    if len(path) == 1:
+        tree.setdefault(head, arrow_type)
+        return
+    subtree = tree.setdefault(head, {})
+    if not isinstance(subtree, dict):
+        # A 'present' check on an object that also has mapped children
+        subtree = tree[head] = {}
+    _insert_path(subtree, path[1:], arrow_type)
+
+
+def _tree_to_fields(tree: dict) -> List[pa.Field]:
+    return [pa.field(name, pa.struct(_tree_to_fields(node)) if isinstance(node, dict) else node)
+            for name, node in tree.items()]
+
+
+def read_schema(entity: str) -> pa.Schema:
+    """Nested Arrow schema holding only the source paths the entity maps."""
+    tree = {}
+    for _, path, kind in ENTITIES[entity]['fields']:
+        for source in field_paths(path):
+            # 'present' only needs to know whether the object exists; an empty struct is enough
+            _insert_path(tree, source.split('.'), pa.struct([]) if kind == 'present' else _READ_TYPES[kind])
+    return pa.schema(_tree_to_fields(tree))
+
+
+def output_schema(entity: str) -> pa.Schema:
+    """Typed Arrow schema of the entity's warehouse table."""
+    out_types = {'int': pa.int64(), 'str': pa.string(), 'bool': pa.bool_(), 'ts': pa.timestamp('s', tz='UTC'),
+                 'int_str': pa.int64(), 'present': pa.bool_(), 'repo_from_url': pa.string()}
+    spec = ENTITIES[entity]
+    fields = [pa.field(col, pa.string()) for col in spec.get('context', [])]
+    fields += [pa.field(col, out_types[kind]) for col, _, kind in spec['fields']]
+    return pa.schema(fields)
+
+
+def _column(raw: pa.Table, path: Union[str, List[str]]) -> pa.ChunkedArray:
+    columns = []
+    for source in field_paths(path):
+        head, *rest = source.split('.')
+        column = raw.column(head)
+        columns.append(pc.struct_field(column, rest) if rest else column)
+    return columns[0] if len(columns) == 1 else pc.coalesce(*columns)
+
+
+def project(entity: str, raw: pa.Table, context: Optional[Dict[str, Any]] = None) -> pa.Table:
+    """
+    Project a nested raw Arrow table (as read with read_schema) into the entity's
+    typed output table. `context` fills constant columns such as repo_full_name for
+    endpoints whose payloads don't say which repo they belong to.
+    """
+    spec = ENTITIES[entity]
+    context = context or {}
+    columns, names = [], []
+    for col in spec.get('context', []):
+        names.append(col)
+        columns.append(pa.array([context.get(col)] * raw.num_rows, type=pa.string()))
+    for col, path, kind in spec['fields']:
+        values = _column(raw, path)
+        if kind == 'ts':
+            values = pc.cast(values, pa.timestamp('s', tz='UTC'))
+        elif kind == 'int_str':
+            values = pc.cast(values, pa.int64())
+        elif kind == 'present':
+            values = pc.is_valid(values)
+        elif kind == 'repo_from_url':
+            values = pc.struct_field(pc.extract_regex(values, _REPO_URL_PATTERN), 'repo')
+        names.append(col)
+        columns.append(values)
+    return pa.Table.from_arrays(columns, schema=output_schema(entity))
+
+
+def transform_records(entity: str, rows: List[Dict[str, Any]], context: Optional[Dict[str, Any]] = None) -> pa.Table:
+    """Transform a list of raw GitHub dicts (as returned by extract_*) into a typed Arrow table."""
+    raw = pa.Table.from_pylist(rows, schema=read_schema(entity))
+    return project(entity, raw, context)
+
+
+def transform_ndjson(entity: str, source: Union[bytes, str], context: Optional[Dict[str, Any]] = None) -> pa.Table:
+    """
+    Transform newline-delimited JSON (bytes or a file path) without building Python
+    dicts: Arrow's multithreaded JSON reader parses only the mapped fields.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    parse_options = pajson.ParseOptions(explicit_schema=read_schema(entity), unexpected_field_behavior='ignore')
+    raw = pajson.read_json(source, parse_options=parse_options)
+    return project(entity, raw, context)
+
+
+def transform_stream(entity: str, data: Iterable[Any], context: Optional[Dict[str, Any]] = None,
+                     batch_size: int = DEFAULT_TRANSFORM_BATCH_SIZE) -> Iterator[pa.Table]:
+    """
+    Transform a stream of records or pages (e.g. extract_*(stream=True)) in column
+    batches of up to `batch_size` rows, yielding one typed Arrow table per batch.
+    """
+    batch = []
+    for item in data:
+        batch.extend(item if isinstance(item, list) else [item])
+        if len(batch) >= batch_size:
+            yield transform_records(entity, batch, context)
+            batch = []
+    if batch:
+        yield transform_records(entity, batch, context)
 
-# Placeholder for transformation logic
 
 def transform_repos(raw_repos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Transform raw repo data into dim_repos schema."""
-    # TODO: Implement transformation logic
-    return []
+    return transform_records('repos', raw_repos).to_pylist()
@@ -0,0 +1,72 @@
+"""
+Benchmark: schema retrieval latency for the memory-mapped top-k index.
+
+Builds an index of random unit vectors for --tables synthetic tables in a temp
+directory, then reports open time, top-k query latency (p50/p95/p99) and the
+cost of an incremental refresh that changes 1% of the rows. Needs no network
+or database.
+
+Usage: python scripts/bench_schema_index.py --tables 20000 --dim 1536
+"""
+
+import argparse
+import tempfile
+import time
+from typing import Dict
+
+import numpy as np
+
+from schema_index import SchemaIndex
+
+
+def percentile_ms(samples, q: float) -> float:
+    return float(np.percentile(samples, q) * 1000)
+
+
+def run(tables: int, dim: int, k: int, queries: int) -> Dict[str, float]:
+    rng = np.random.default_rng(0)
+    names = [f"table_{i}" for i in range(tables)]
+    vectors = rng.standard_normal((tables, dim), dtype=np.float32)
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        SchemaIndex(path).write(names, [f"h{i}" for i in range(tables)], vectors)
+        print(f"build: {tables} x {dim} in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        index = SchemaIndex(path)
+        results['open_ms'] = (time.perf_counter() - start) * 1000
+        print(f" open: {results['open_ms']:.1f} ms")
+
+        samples = []
+        for q in rng.standard_normal((queries, dim), dtype=np.float32):
+            start = time.perf_counter()
+            index.search(q, k)
+            samples.append(time.perf_counter() - start)
+        for p in (50, 95, 99):
+            results[f'p{p}_ms'] = percentile_ms(samples, p)
+        print(f"query: top-{k} p50={results['p50_ms']:.2f} ms p95={results['p95_ms']:.2f} ms "
+              f"p99={results['p99_ms']:.2f} ms over {queries} queries")
+
+        changed = max(tables // 100, 1)
+        current = {n: f"h{i}" for i, n in enumerate(names)}
+        for i in range(changed):
+            current[names[i]] = f"h{i}-v2"
+        current.update({f"new_table_{i}": f"n{i}" for i in range(changed)})
+        fetched = {n: rng.standard_normal(dim, dtype=np.float32) for n in index.stale_tables(current)[0]}
+        start = time.perf_counter()
+        index.apply(current, fetched)
+        results['refresh_ms'] = (time.perf_counter() - start) * 1000
+        print(f"refresh: {changed} updated + {changed} added rows in {results['refresh_ms']:.1f} ms "
+              f"({len(index)} tables)")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tables', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+    run(args.tables, args.dim, args.k, args.queries)
@@ -1,39 +1,86 @@
+"""
+Export GH Archive tables from BigQuery to local files and NeonDB.
+
+Each selected table's query runs exactly once. Its result streams as Arrow record
+batches that are written both to the local parquet/csv file and to Postgres with
+COPY, so memory stays bounded by one batch regardless of the table size. If the
+local file already exists the query is skipped and Postgres is loaded from the file.
+
+fact_events is range-partitioned by created_at (one partition per day, or per month
+with --partition month). Each partition is queried from its own GH Archive table,
+loaded into a standalone table with its indexes built after the COPY, and only then
+attached, so partitions load in parallel and the parent is never locked for a load.
+Partitions that are already attached are skipped unless --force is given.
+
+--backfill START END loads a complete date range instead of one LIMITed month: it is
+split into githubarchive.day.* shards run --workers at a time. Each shard loads its
+fact_events day partition and merges its dimension rows into dim_* (rows whose key
+is already present are skipped, so dimensions stay deduplicated across shards), then
+records itself in backfill_shards; a rerun skips completed shards and retries failed
+ones. --source-dir reads shards from local parquet files instead of BigQuery.
+
+Usage:
+  python scripts/bq_to_neon.py                       # all tables
+  python scripts/bq_to_neon.py dim_actors fact_events
+  python scripts/bq_to_neon.py fact_events --no-postgres --force
+  python scripts/bq_to_neon.py fact_events --partition month --workers 2
+  python scripts/bq_to_neon.py --backfill 2023-01-01 2023-03-31 --workers 8
+  python scripts/bq_to_neon.py --backfill 2023-01-01 2023-01-07 --source-dir github_data --no-local
+"""
+
+import argparse
+import calendar
+import datetime
+import io
+import json
 import os
-print("GOOGLE_APPLICATION_CREDENTIALS:", os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"))
-import pandas as pd
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import psycopg2
-import psycopg2.extras
-from google.cloud import bigquery
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from github_etl import metrics
+
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
-# Set GOOGLE_APPLICATION_CREDENTIALS for BigQuery
-os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-
 # NeonDB connection info
 POSTGRES_URL = os.getenv('POSTGRES_URL')
 
-# Create BigQuery client
-client = bigquery.Client()
+DATA_DIR = 'github_data'
+DEFAULT_BATCH_SIZE = 100000
+# Parallel COPY connections per table (partitions loaded at once for fact_events)
+DEFAULT_WORKERS = int(os.getenv('BQ_TO_NEON_WORKERS', '4'))
+# GH Archive month exported, as YYYYMM
+ARCHIVE_MONTH = os.getenv('GH_ARCHIVE_MONTH', '202301')
+# fact_events partition granularity: 'day' or 'month'
+DEFAULT_PARTITION = os.getenv('BQ_TO_NEON_PARTITION', 'day')
+
+_bq_client = None
+_bq_client_lock = threading.Lock()
+
+
+def get_bq_client():
+    """Create the BigQuery client on first use (import and auth are deferred until a query runs)."""
+    global _bq_client
+    with _bq_client_lock:
+        if _bq_client is not None:
+            return _bq_client
+        from google.cloud import bigquery
+        credentials = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+        if credentials:
+            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials
+        print("GOOGLE_APPLICATION_CREDENTIALS:", credentials)
+        _bq_client = bigquery.Client()
+    return _bq_client
 
-def extract_github_data(query, output_filename):
-    output_file_path = f'github_data/{output_filename}'
-    if os.path.exists(output_file_path):
-        print(f"File {output_file_path} already exists. Skipping extraction.")
-        return
-    print(f"Running query: {query[:100]}...")
-    query_job = client.query(query)
-    results = query_job.result()
-    df = results.to_dataframe()
-    os.makedirs('github_data', exist_ok=True)
-    if output_filename.endswith('.csv'):
-        df.to_csv(output_file_path, index=False)
-    else:
-        df.to_parquet(output_file_path, index=False)
-    print(f"Saved {df.shape[0]} rows to github_data/{output_filename}")
-    return df
 
 def infer_pg_types_from_bq_schema(bq_schema):
     bq_to_pg_type = {
@@ -51,70 +98,646 @@ def infer_pg_types_from_bq_schema(bq_schema):
     }
     return [(field.name, bq_to_pg_type.get(field.field_type, 'TEXT')) for field in bq_schema]
 
+
+def infer_pg_types_from_arrow_schema(arrow_schema):
+    def pg_type(arrow_type):
+        if pa.types.is_integer(arrow_type):
+            return 'BIGINT'
+        if pa.types.is_floating(arrow_type):
+            return 'DOUBLE PRECISION'
+        if pa.types.is_boolean(arrow_type):
+            return 'BOOLEAN'
+        if pa.types.is_timestamp(arrow_type):
+            return 'TIMESTAMP'
+        if pa.types.is_date(arrow_type):
+            return 'DATE'
+        if pa.types.is_decimal(arrow_type):
+            return 'NUMERIC'
+        if pa.types.is_binary(arrow_type):
+            return 'BYTEA'
+        return 'TEXT'
+    return [(field.name, pg_type(field.type)) for field in arrow_schema]
+
+
 def print_create_table_statement(table_name, schema_cols):
     cols_sql = ',\n  '.join([f'"{name}" {typ}' for name, typ in schema_cols])
     create_sql = f'CREATE TABLE IF NOT EXISTS {table_name} (\n  {cols_sql}\n);'
     print(f"\n[PREVIEW] Proposed CREATE TABLE for '{table_name}':\n{create_sql}\n")
 
-def copy_to_neon(df, table_name, bq_schema=None):
-    if bq_schema:
-        schema_cols = infer_pg_types_from_bq_schema(bq_schema)
-    else:
-        schema_cols = [(col, 'TEXT') for col in df.columns]
+
+def copy_arrow_batch(cur, table_name, batch):
+    """COPY one Arrow record batch into Postgres, encoded as CSV by Arrow (no per-row Python)."""
+    buf = io.BytesIO()
+    pacsv.write_csv(batch, buf, write_options=pacsv.WriteOptions(include_header=False))
+    buf.seek(0)
+    col_names = ', '.join([f'"{name}"' for name in batch.schema.names])
+    # Arrow quotes every string, so an unquoted empty field is NULL and "" is an empty string
+    cur.copy_expert(f'COPY {table_name} ({col_names}) FROM STDIN WITH (FORMAT csv)', buf)
+
+
+class ParallelCopier:
+    """
+    COPY record batches into one table over several connections at once.
+
+    Batches go through a bounded queue to `workers` threads, each holding its own
+    connection and transaction (Arrow CSV encoding and the COPY itself release the
+    GIL, so the workers really run concurrently). Each worker commits on close();
+    if any worker fails, the others roll back, but a failure can still leave
+    earlier-committed workers' rows behind.
+    """
+
+    def __init__(self, table_name, workers=DEFAULT_WORKERS):
+        self.table_name = table_name
+        self.workers = max(workers, 1)
+        self.error = None
+        self.stats = [{'rows': 0, 'seconds': 0.0} for _ in range(self.workers)]
+        self._parent_span = metrics.current_span()
+        self._queue = queue.Queue(maxsize=self.workers * 2)
+        self._threads = [threading.Thread(target=self._work, args=(i,), daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self, worker_id):
+        conn = None
+        finished = False
+        try:
+            with metrics.span('copy_worker', parent=self._parent_span, table=self.table_name, worker=worker_id) as span:
+                conn = psycopg2.connect(POSTGRES_URL)
+                tx_start = time.perf_counter()
+                with conn.cursor() as cur:
+                    while True:
+                        batch = self._queue.get()
+                        if batch is None:
+                            finished = True
+                            break
+                        if self.error is not None:
+                            continue  # drain the queue so submit() never blocks
+                        start = time.perf_counter()
+                        copy_arrow_batch(cur, self.table_name, batch)
+                        elapsed = time.perf_counter() - start
+                        metrics.observe('pg_copy_seconds', elapsed, table=self.table_name, method='copy')
+                        self.stats[worker_id]['seconds'] += elapsed
+                        self.stats[worker_id]['rows'] += batch.num_rows
+                if self.error is None:
+                    conn.commit()
+                    metrics.observe('pg_transaction_seconds', time.perf_counter() - tx_start, table=self.table_name)
+                else:
+                    conn.rollback()
+                span.set(rows=self.stats[worker_id]['rows'], copy_seconds=self.stats[worker_id]['seconds'])
+        except Exception as exc:
+            self.error = self.error or exc
+            while not finished:
+                finished = self._queue.get() is None
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def submit(self, batch):
+        if self.error is not None:
+            raise self.error
+        self._queue.put(batch)
+
+    def _join(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def abort(self):
+        """Stop all workers and roll back their uncommitted batches."""
+        self.error = self.error or RuntimeError(f"Load into {self.table_name} aborted")
+        self._join()
+
+    def close(self):
+        """Wait for all workers to commit, print per-worker throughput and return the row count."""
+        self._join()
+        if self.error is not None:
+            raise self.error
+        for worker_id, stat in enumerate(self.stats):
+            rate = stat['rows'] / stat['seconds'] if stat['seconds'] else 0.0
+            print(f"  worker {worker_id}: {stat['rows']} rows in {stat['seconds']:.2f}s ({rate:,.0f} rows/sec)")
+        return sum(stat['rows'] for stat in self.stats)
+
+
+def create_pg_table(table_name, schema_cols):
     print_create_table_statement(table_name, schema_cols)
     conn = psycopg2.connect(POSTGRES_URL)
-    cur = conn.cursor()
-    cols = ', '.join([f'"{col}" {typ}' for col, typ in schema_cols])
-    cur.execute(f'CREATE TABLE IF NOT EXISTS {table_name} ({cols});')
-    columns = [col for col, _ in schema_cols]
-    # Convert missing values to None for SQL NULL insertion
-    values = [tuple(None if pd.isna(v) else v for v in row) for _, row in df.iterrows()]
-    col_names = ', '.join([f'"{col}"' for col in columns])
-    insert_sql = f'INSERT INTO {table_name} ({col_names}) VALUES %s'
-    psycopg2.extras.execute_values(cur, insert_sql, values, page_size=1000)
-    conn.commit()
-    cur.close()
-    conn.close()
-    print(f"Copied {df.shape[0]} rows to {table_name}")
+    try:
+        with conn.cursor() as cur:
+            cols = ', '.join([f'"{col}" {typ}' for col, typ in schema_cols])
+            cur.execute(f'CREATE TABLE IF NOT EXISTS {table_name} ({cols});')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class LocalWriter:
+    """Write record batches to github_data/<file>; the file only appears once complete."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.tmp_path = path + '.partial'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if path.endswith('.csv'):
+            self._writer = pacsv.CSVWriter(self.tmp_path, schema)
+        else:
+            self._writer = pq.ParquetWriter(self.tmp_path, schema)
+
+    def write_batch(self, batch):
+        self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def read_local_batches(path, batch_size):
+    """Stream record batches back from a previously exported local file."""
+    if path.endswith('.csv'):
+        reader = pacsv.open_csv(path)
+        return reader.schema, iter(reader)
+    parquet_file = pq.ParquetFile(path)
+    return parquet_file.schema_arrow, parquet_file.iter_batches(batch_size=batch_size)
+
+
+def query_batches(query, batch_size):
+    """Run a BigQuery query once and return (pg schema, Arrow record batch iterator)."""
+    print(f"Running query: {query[:100]}...")
+    with metrics.span('bq_query'):
+        rows = get_bq_client().query(query).result(page_size=batch_size)
+    return infer_pg_types_from_bq_schema(rows.schema), rows.to_arrow_iterable()
+
+
+class BigQueryArchive:
+    """GH Archive tables in BigQuery (githubarchive.day.* / githubarchive.month.*)."""
+
+    def events(self, source, granularity, batch_size, lower, upper):
+        return query_batches(partition_query(source, granularity, lower, upper), batch_size)[1]
+
+    def dimension(self, table_name, source, batch_size):
+        return query_batches(SHARD_QUERIES[table_name].format(source=source), batch_size)[1]
+
+
+class ParquetArchive:
+    """
+    GH Archive shards from local parquet files laid out like github_data/, i.e.
+    <root>/<table>/<suffix>.parquet (fact_events/20230101.parquet for day.20230101).
+    Stands in for BigQuery in tests and when reloading an earlier export.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _batches(self, table_name, source, batch_size):
+        path = os.path.join(self.root, table_name, f"{source.split('.', 1)[1]}.parquet")
+        return read_local_batches(path, batch_size)[1]
+
+    def events(self, source, granularity, batch_size, lower, upper):
+        return self._batches('fact_events', source, batch_size)
+
+    def dimension(self, table_name, source, batch_size):
+        return self._batches(table_name, source, batch_size)
+
+
+def export_table(table_name, query, output_filename, to_local=True, to_postgres=True,
+                 force=False, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS):
+    with metrics.span('export_table', table=table_name) as span:
+        output_file_path = os.path.join(DATA_DIR, output_filename)
+        from_local = os.path.exists(output_file_path) and not force
+        if from_local:
+            print(f"File {output_file_path} already exists. Skipping extraction.")
+            if not to_postgres:
+                return 0
+            arrow_schema, batches = read_local_batches(output_file_path, batch_size)
+            schema_cols = infer_pg_types_from_arrow_schema(arrow_schema)
+        else:
+            schema_cols, batches = query_batches(query, batch_size)
+
+        copier = None
+        if to_postgres:
+            create_pg_table(table_name, schema_cols)
+            copier = ParallelCopier(table_name, workers)
+
+        writer = None
+        total = 0
+        try:
+            for batch in batches:
+                if to_local and not from_local:
+                    if writer is None:
+                        writer = LocalWriter(output_file_path, batch.schema)
+                    writer.write_batch(batch)
+                if copier is not None:
+                    copier.submit(batch)
+                total += batch.num_rows
+        except BaseException:
+            if copier is not None:
+                copier.abort()
+            raise
+        if writer is not None:
+            writer.close()
+            print(f"Saved {total} rows to {output_file_path}")
+        if copier is not None:
+            copier.close()
+            print(f"Copied {total} rows to {table_name}")
+        span.set(rows=total, source='local' if from_local else 'bigquery')
+    if copier is not None:
+        metrics.inc('rows_loaded_total', total, table=table_name)
+        metrics.set_gauge('load_rows_per_second', total / span.duration if span.duration else 0.0, table=table_name)
+    return total
+
+
+# fact_events columns, as infer_pg_types_from_bq_schema maps events_query's result
+FACT_EVENTS_COLUMNS = [
+    ('event_id', 'TEXT'),
+    ('event_type', 'TEXT'),
+    ('actor_id', 'BIGINT'),
+    ('repo_id', 'BIGINT'),
+    ('org_id', 'BIGINT'),
+    ('created_at', 'TIMESTAMP'),
+    ('action', 'TEXT'),
+    ('public', 'BOOLEAN'),
+]
+
+# (index suffix, method, column); built on each partition after its COPY, then
+# matched to the parent's partitioned indexes when the partition is attached
+FACT_EVENTS_INDEXES = [
+    ('created_at_brin', 'brin', 'created_at'),
+    ('repo_id_idx', 'btree', 'repo_id'),
+    ('actor_id_idx', 'btree', 'actor_id'),
+]
+
+
+def event_partitions(month=ARCHIVE_MONTH, granularity=DEFAULT_PARTITION):
+    """(suffix, lower bound, upper bound, GH Archive table) for each partition of a YYYYMM month."""
+    year, mon = int(month[:4]), int(month[4:])
+    first = datetime.date(year, mon, 1)
+    following = first + datetime.timedelta(days=calendar.monthrange(year, mon)[1])
+    if granularity == 'month':
+        return [(month, first, following, f'month.{month}')]
+    if granularity != 'day':
+        raise ValueError(f"Unknown partition granularity: {granularity}")
+    days = [first + datetime.timedelta(days=i) for i in range((following - first).days)]
+    return [(day.strftime('%Y%m%d'), day, day + datetime.timedelta(days=1), f"day.{day.strftime('%Y%m%d')}")
+            for day in days]
+
+
+def partition_query(source, granularity, lower, upper):
+    # GH Archive tables are cut by archive time, so a table can hold a few events created
+    # just before its range; the bounds drop them rather than fail the partition's CHECK.
+    # Day tables are small enough to sort, so rows land in created_at order and the
+    # BRIN ranges stay tight; a month is too large for BigQuery's final ORDER BY
+    order_by = 'ORDER BY created_at' if granularity == 'day' else ''
+    return events_query.format(source=source, lower=lower.isoformat(), upper=upper.isoformat(), order_by=order_by)
+
+
+def create_partitioned_events():
+    """Create the partitioned fact_events parent and its indexes (moving aside an old heap table)."""
+    cols = ', '.join(f'"{col}" {typ}' for col, typ in FACT_EVENTS_COLUMNS)
+    conn = psycopg2.connect(POSTGRES_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('fact_events')")
+            row = cur.fetchone()
+            if row and row[0] == 'r':
+                print("fact_events is an unpartitioned table; renaming it to fact_events_unpartitioned.")
+                cur.execute('ALTER TABLE fact_events RENAME TO fact_events_unpartitioned')
+            cur.execute(f'CREATE TABLE IF NOT EXISTS fact_events ({cols}) PARTITION BY RANGE (created_at)')
+            for suffix, method, column in FACT_EVENTS_INDEXES:
+                cur.execute(f'CREATE INDEX IF NOT EXISTS fact_events_{suffix} ON fact_events USING {method} ("{column}")')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def attached_partitions(table_name='fact_events'):
+    conn = psycopg2.connect(POSTGRES_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute('''
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)''', (table_name,))
+            return {name for (name,) in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def load_events_partition(suffix, lower, upper, source, granularity, to_local=True, to_postgres=True,
+                          force=False, batch_size=DEFAULT_BATCH_SIZE, parent_span=None, archive=None):
+    """
+    Export one partition of fact_events. The rows are COPYed into a standalone
+    fact_events_p<suffix>_load table, which is indexed and given a CHECK constraint
+    for its range, then swapped in with ATTACH PARTITION. Thanks to the constraint the
+    attach skips the validation scan, so the parent is only locked for a moment.
+    Rows come from the local file if present, otherwise from `archive` (BigQuery by default).
+    """
+    partition = f'fact_events_p{suffix}'
+    staging = f'{partition}_load'
+    bounds = (lower.isoformat(), upper.isoformat())
+    output_file_path = os.path.join(DATA_DIR, TABLES['fact_events'][1], f'{suffix}.parquet')
+    with metrics.span('partition', parent=parent_span, partition=partition) as span:
+        from_local = os.path.exists(output_file_path) and not force
+        if from_local and not to_postgres:
+            return 0
+        if from_local:
+            _, batches = read_local_batches(output_file_path, batch_size)
+        else:
+            batches = (archive or BigQueryArchive()).events(source, granularity, batch_size, lower, upper)
+
+        conn = psycopg2.connect(POSTGRES_URL) if to_postgres else None
+        writer = None
+        total = 0
+        try:
+            if conn is not None:
+                cols = ', '.join(f'"{col}" {typ}' for col, typ in FACT_EVENTS_COLUMNS)
+                with conn.cursor() as cur:
+                    cur.execute(f'DROP TABLE IF EXISTS {staging}')
+                    cur.execute(f'CREATE TABLE {staging} ({cols})')
+            copy_seconds = 0.0
+            for batch in batches:
+                if to_local and not from_local:
+                    if writer is None:
+                        writer = LocalWriter(output_file_path, batch.schema)
+                    writer.write_batch(batch)
+                if conn is not None:
+                    start = time.perf_counter()
+                    with conn.cursor() as cur:
+                        copy_arrow_batch(cur, staging, batch)
+                    copy_seconds += time.perf_counter() - start
+                total += batch.num_rows
+            if writer is not None:
+                writer.close()
+                writer = None
+            if conn is not None:
+                metrics.observe('pg_copy_seconds', copy_seconds, table='fact_events', method='copy')
+                with conn.cursor() as cur:
+                    for _, method, column in FACT_EVENTS_INDEXES:
+                        cur.execute(f'CREATE INDEX ON {staging} USING {method} ("{column}")')
+                    # Same bounds as the partition, so ATTACH can prove the range without a scan
+                    cur.execute(f'''ALTER TABLE {staging} ADD CONSTRAINT {staging}_range CHECK (
+                        created_at IS NOT NULL AND created_at >= %s::timestamp AND created_at < %s::timestamp)''',
+                                bounds)
+                conn.commit()
+                attach_start = time.perf_counter()
+                with conn.cursor() as cur:
+                    cur.execute('SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%s)', (partition,))
+                    if cur.fetchone():
+                        cur.execute(f'ALTER TABLE fact_events DETACH PARTITION {partition}')
+                    cur.execute(f'DROP TABLE IF EXISTS {partition}')
+                    cur.execute(f'ALTER TABLE {staging} RENAME TO {partition}')
+                    cur.execute(f'ALTER TABLE fact_events ATTACH PARTITION {partition} '
+                                'FOR VALUES FROM (%s::timestamp) TO (%s::timestamp)', bounds)
+                    cur.execute(f'ALTER TABLE {partition} DROP CONSTRAINT {staging}_range')
+                conn.commit()
+                metrics.observe('pg_transaction_seconds', time.perf_counter() - attach_start, table='fact_events')
+        except BaseException:
+            if conn is not None:
+                conn.rollback()
+            raise
+        finally:
+            if conn is not None:
+                conn.close()
+        span.set(rows=total, source='local' if from_local else 'bigquery')
+    print(f"  {partition}: {total} rows" + (' attached' if to_postgres else ''))
+    return total
+
+
+def export_events(to_local=True, to_postgres=True, force=False, batch_size=DEFAULT_BATCH_SIZE,
+                  workers=DEFAULT_WORKERS, granularity=DEFAULT_PARTITION, month=ARCHIVE_MONTH):
+    """Export fact_events one partition at a time, `workers` partitions in parallel."""
+    partitions = event_partitions(month, granularity)
+    with metrics.span('export_table', table='fact_events', partitions=len(partitions)) as span:
+        if to_postgres:
+            create_partitioned_events()
+            if not force:
+                done = attached_partitions()
+                skipped = [p for p in partitions if f'fact_events_p{p[0]}' in done]
+                if skipped:
+                    print(f"{len(skipped)} of {len(partitions)} fact_events partitions already attached; skipping them.")
+                partitions = [p for p in partitions if p not in skipped]
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = [pool.submit(load_events_partition, suffix, lower, upper, source, granularity,
+                                   to_local=to_local, to_postgres=to_postgres, force=force,
+                                   batch_size=batch_size, parent_span=span)
+                       for suffix, lower, upper, source in partitions]
+            total = sum(future.result() for future in futures)
+        span.set(rows=total)
+    print(f"Exported {total} rows into {len(partitions)} fact_events partitions in {span.duration:.2f}s")
+    if to_postgres:
+        metrics.inc('rows_loaded_total', total, table='fact_events')
+        metrics.set_gauge('load_rows_per_second', total / span.duration if span.duration else 0.0, table='fact_events')
+    return total
+
+
+# Dimension tables merged per backfill shard: (key column, columns as SHARD_QUERIES return them)
+DIMENSIONS = {
+    'dim_actors': ('actor_id', [('actor_id', 'BIGINT'), ('login', 'TEXT'), ('url', 'TEXT'), ('avatar_url', 'TEXT')]),
+    'dim_repositories': ('repo_id', [('repo_id', 'BIGINT'), ('name', 'TEXT'), ('url', 'TEXT')]),
+    'dim_event_types': ('event_type', [('event_type', 'TEXT')]),
+}
+
+BACKFILL_DDL = '''
+CREATE TABLE IF NOT EXISTS backfill_shards (
+    shard TEXT PRIMARY KEY,
+    rows JSONB NOT NULL,
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)'''
+
+
+def backfill_days(start, end):
+    """Every date from `start` to `end` inclusive."""
+    return [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def prepare_backfill():
+    """Create fact_events, the dimension tables with an index on their key, and backfill_shards."""
+    create_partitioned_events()
+    conn = psycopg2.connect(POSTGRES_URL)
+    try:
+        with conn.cursor() as cur:
+            for table_name, (key, columns) in DIMENSIONS.items():
+                cols = ', '.join(f'"{col}" {typ}' for col, typ in columns)
+                cur.execute(f'CREATE TABLE IF NOT EXISTS {table_name} ({cols})')
+                cur.execute(f'CREATE INDEX IF NOT EXISTS {table_name}_{key}_idx ON {table_name} ("{key}")')
+            cur.execute(BACKFILL_DDL)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def completed_shards():
+    conn = psycopg2.connect(POSTGRES_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT shard FROM backfill_shards')
+            return {shard for (shard,) in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def load_dimension_shard(table_name, source, archive, to_local=True, to_postgres=True, force=False,
+                         batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Merge one shard's rows into a dimension table. The rows are COPYed into a temp
+    table and only keys not yet in `table_name` are inserted (one row per key), under
+    an advisory lock so parallel shards can't insert the same key twice. The shard is
+    also kept as github_data/<table>/<suffix>.parquet, which later runs read instead of
+    querying again. Returns the number of new dimension rows (or rows read without Postgres).
+    """
+    key, columns = DIMENSIONS[table_name]
+    output_file_path = os.path.join(DATA_DIR, table_name, f"{source.split('.', 1)[1]}.parquet")
+    from_local = os.path.exists(output_file_path) and not force
+    if from_local and not to_postgres:
+        return 0
+    if from_local:
+        _, batches = read_local_batches(output_file_path, batch_size)
+    else:
+        batches = archive.dimension(table_name, source, batch_size)
+
+    conn = psycopg2.connect(POSTGRES_URL) if to_postgres else None
+    stage = f'{table_name}_shard'
+    writer = None
+    total = 0
+    try:
+        if conn is not None:
+            with conn.cursor() as cur:
+                cur.execute(f'CREATE TEMP TABLE {stage} (LIKE {table_name}) ON COMMIT DROP')
+        for batch in batches:
+            if to_local and not from_local:
+                if writer is None:
+                    writer = LocalWriter(output_file_path, batch.schema)
+                writer.write_batch(batch)
+            if conn is not None:
+                with conn.cursor() as cur:
+                    copy_arrow_batch(cur, stage, batch)
+            total += batch.num_rows
+        if writer is not None:
+            writer.close()
+            writer = None
+        if conn is None:
+            return total
+        cols = ', '.join(f'"{col}"' for col, _ in columns)
+        with conn.cursor() as cur:
+            cur.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', (table_name,))
+            cur.execute(f'''
+            INSERT INTO {table_name} ({cols})
+            SELECT DISTINCT ON ("{key}") {cols} FROM {stage} s
+            WHERE "{key}" IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM {table_name} d WHERE d."{key}" = s."{key}")
+            ORDER BY "{key}"''')
+            added = cur.rowcount
+        conn.commit()
+        return added
+    except BaseException:
+        if conn is not None:
+            conn.rollback()
+        raise
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def backfill_shard(day, archive, to_local=True, to_postgres=True, force=False, batch_size=DEFAULT_BATCH_SIZE,
+                   parent_span=None):
+    """Load one day: its dimension rows, then its fact_events partition, then the checkpoint."""
+    suffix = day.strftime('%Y%m%d')
+    source = f'day.{suffix}'
+    with metrics.span('shard', parent=parent_span, shard=source) as span:
+        rows = {}
+        for table_name in DIMENSIONS:
+            rows[table_name] = load_dimension_shard(table_name, source, archive, to_local=to_local,
+                                                    to_postgres=to_postgres, force=force, batch_size=batch_size)
+        rows['fact_events'] = load_events_partition(
+            suffix, day, day + datetime.timedelta(days=1), source, 'day', to_local=to_local,
+            to_postgres=to_postgres, force=force, batch_size=batch_size, parent_span=span, archive=archive)
+        if to_postgres:
+            conn = psycopg2.connect(POSTGRES_URL)
+            try:
+                with conn.cursor() as cur:
+                    cur.execute('''
+                    INSERT INTO backfill_shards (shard, rows) VALUES (%s, %s)
+                    ON CONFLICT (shard) DO UPDATE SET rows = EXCLUDED.rows, completed_at = CURRENT_TIMESTAMP''',
+                                (source, json.dumps(rows)))
+                conn.commit()
+            finally:
+                conn.close()
+        span.set(**rows)
+    return rows
+
+
+def backfill(start, end, archive=None, to_local=True, to_postgres=True, force=False,
+             batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS):
+    """
+    Load every day from `start` to `end` (inclusive), `workers` shards at a time.
+    Completed shards are skipped unless `force`; a failed shard doesn't stop the
+    others, and the run raises at the end so the failures are retried on the next one.
+    Returns {shard: rows per table} for the shards loaded by this run.
+    """
+    archive = archive or BigQueryArchive()
+    days = backfill_days(start, end)
+    results, failed = {}, {}
+    with metrics.span('backfill', start=start.isoformat(), end=end.isoformat(), shards=len(days)) as span:
+        if to_postgres:
+            prepare_backfill()
+            if not force:
+                done = completed_shards()
+                skipped = [day for day in days if f"day.{day.strftime('%Y%m%d')}" in done]
+                if skipped:
+                    print(f"{len(skipped)} of {len(days)} shards already loaded; skipping them.")
+                    metrics.inc('backfill_shards_total', len(skipped), status='skipped')
+                days = [day for day in days if day not in skipped]
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = {pool.submit(backfill_shard, day, archive, to_local=to_local, to_postgres=to_postgres,
+                                   force=force, batch_size=batch_size, parent_span=span): day for day in days}
+            for future in as_completed(futures):
+                shard = f"day.{futures[future].strftime('%Y%m%d')}"
+                try:
+                    results[shard] = future.result()
+                    metrics.inc('backfill_shards_total', status='loaded')
+                    print(f"{shard}: " + ', '.join(f"{t} {n}" for t, n in results[shard].items()))
+                except Exception as exc:
+                    failed[shard] = exc
+                    metrics.inc('backfill_shards_total', status='failed')
+                    print(f"{shard}: FAILED ({type(exc).__name__}: {exc})")
+        span.set(loaded=len(results), failed=len(failed))
+    events = sum(r['fact_events'] for r in results.values())
+    print(f"Backfilled {len(results)} shards ({events} events) in {span.duration:.2f}s"
+          + (f"; {len(failed)} failed, rerun to retry them" if failed else ''))
+    if to_postgres:
+        metrics.inc('rows_loaded_total', events, table='fact_events')
+    if failed:
+        raise RuntimeError(f"{len(failed)} backfill shard(s) failed: {', '.join(sorted(failed))}")
+    return results
+
 
 # Example queries (fixed to only use valid fields)
-actors_query = """
+actors_query = f"""
 SELECT DISTINCT
   actor.id AS actor_id,
   actor.login AS login,
   actor.url AS url,
   actor.avatar_url AS avatar_url
-FROM `githubarchive.month.202301`
+FROM `githubarchive.month.{ARCHIVE_MONTH}`
 LIMIT 500000
 """
-actors_job = client.query(actors_query)
-actors_df = actors_job.result().to_dataframe()
-extract_github_data(actors_query, 'dim_actors.parquet')
-copy_to_neon(actors_df, 'dim_actors', actors_job.result().schema)
 
-repos_query = """
+repos_query = f"""
 SELECT DISTINCT
   repo.id AS repo_id,
   repo.name AS name,
   repo.url AS url
-FROM `githubarchive.month.202301`
+FROM `githubarchive.month.{ARCHIVE_MONTH}`
 LIMIT 300000
 """
-repos_job = client.query(repos_query)
-repos_df = repos_job.result().to_dataframe()
-extract_github_data(repos_query, 'dim_repositories.parquet')
-copy_to_neon(repos_df, 'dim_repositories', repos_job.result().schema)
 
-event_types_query = """
+event_types_query = f"""
 SELECT DISTINCT
   type AS event_type
-FROM `githubarchive.month.202301`
+FROM `githubarchive.month.{ARCHIVE_MONTH}`
 """
-event_types_job = client.query(event_types_query)
-event_types_df = event_types_job.result().to_dataframe()
-extract_github_data(event_types_query, 'dim_event_types.csv')
-copy_to_neon(event_types_df, 'dim_event_types', event_types_job.result().schema)
 
+# One partition of fact_events; {source} is e.g. day.20230101 or month.202301 and
+# [{lower}, {upper}) the partition's created_at range
 events_query = """
 SELECT
   id AS event_id,
@@ -125,10 +748,101 @@ SELECT
   created_at,
   JSON_EXTRACT(payload, '$.action') AS action,
   public
-FROM `githubarchive.month.202301`
-LIMIT 1000000
+FROM `githubarchive.{source}`
+WHERE created_at >= TIMESTAMP('{lower}') AND created_at < TIMESTAMP('{upper}')
+{order_by}
 """
-events_job = client.query(events_query)
-events_df = events_job.result().to_dataframe()
-extract_github_data(events_query, 'fact_events.parquet')
-copy_to_neon(events_df, 'fact_events', events_job.result().schema)
+
+# One row per key from a single GH Archive table, for --backfill; {source} is e.g. day.20230101
+SHARD_QUERIES = {
+    'dim_actors': """
+SELECT actor.id AS actor_id, ANY_VALUE(actor.login) AS login, ANY_VALUE(actor.url) AS url,
+  ANY_VALUE(actor.avatar_url) AS avatar_url
+FROM `githubarchive.{source}`
+GROUP BY actor_id
+""",
+    'dim_repositories': """
+SELECT repo.id AS repo_id, ANY_VALUE(repo.name) AS name, ANY_VALUE(repo.url) AS url
+FROM `githubarchive.{source}`
+GROUP BY repo_id
+""",
+    'dim_event_types': """
+SELECT DISTINCT type AS event_type
+FROM `githubarchive.{source}`
+""",
+}
+
+# table name -> (query, local output file)
+TABLES = {
+    'dim_actors': (actors_query, 'dim_actors.parquet'),
+    'dim_repositories': (repos_query, 'dim_repositories.parquet'),
+    'dim_event_types': (event_types_query, 'dim_event_types.csv'),
+    # Partitioned: one parquet file per partition under github_data/fact_events/
+    'fact_events': (events_query, 'fact_events'),
+}
+
+
+def refresh_rollups():
+    """Aggregate the fact_events partitions attached since the last refresh (scripts/rollups.py)."""
+    from rollups import refresh
+    conn = psycopg2.connect(POSTGRES_URL)
+    try:
+        refresh(conn)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export GH Archive tables from BigQuery to github_data/ and NeonDB.')
+    parser.add_argument('tables', nargs='*', metavar='TABLE',
+                        help=f"tables to export (default: all of {', '.join(TABLES)})")
+    parser.add_argument('--no-local', action='store_true', help='do not write github_data/ files')
+    parser.add_argument('--no-postgres', action='store_true', help='do not load into Postgres')
+    parser.add_argument('--force', action='store_true', help='re-run queries even if the local file exists')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='rows per Arrow batch')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='parallel COPY connections per table (partitions at once for fact_events)')
+    parser.add_argument('--partition', choices=['day', 'month'], default=DEFAULT_PARTITION,
+                        help='fact_events partition granularity')
+    parser.add_argument('--no-rollups', action='store_true',
+                        help='do not refresh the fact_events rollups (scripts/rollups.py) after loading')
+    parser.add_argument('--backfill', nargs=2, metavar=('START', 'END'), type=datetime.date.fromisoformat,
+                        help='load every table for each day from START to END (YYYY-MM-DD, inclusive)')
+    parser.add_argument('--source-dir', help='with --backfill, read shards from <dir>/<table>/<YYYYMMDD>.parquet '
+                                             'instead of BigQuery')
+    args = parser.parse_args(argv)
+    unknown = [t for t in args.tables if t not in TABLES]
+    if unknown:
+        parser.error(f"unknown table(s): {', '.join(unknown)}")
+    if args.backfill and args.tables:
+        parser.error('--backfill loads every table for each shard; do not name tables')
+    if args.source_dir and not args.backfill:
+        parser.error('--source-dir only applies to --backfill')
+    if not args.no_postgres and not POSTGRES_URL:
+        raise RuntimeError('POSTGRES_URL not found in environment.')
+    metrics.start_run('bq_to_neon')
+    try:
+        if args.backfill:
+            backfill(*args.backfill, archive=ParquetArchive(args.source_dir) if args.source_dir else None,
+                     to_local=not args.no_local, to_postgres=not args.no_postgres, force=args.force,
+                     batch_size=args.batch_size, workers=args.workers)
+            if not args.no_postgres and not args.no_rollups:
+                refresh_rollups()
+            return
+        for table_name in args.tables or list(TABLES):
+            if table_name == 'fact_events':
+                export_events(to_local=not args.no_local, to_postgres=not args.no_postgres, force=args.force,
+                              batch_size=args.batch_size, workers=args.workers, granularity=args.partition)
+                if not args.no_postgres and not args.no_rollups:
+                    refresh_rollups()
+                continue
+            query, output_filename = TABLES[table_name]
+            export_table(table_name, query, output_filename, to_local=not args.no_local,
+                         to_postgres=not args.no_postgres, force=args.force, batch_size=args.batch_size,
+                         workers=args.workers)
+    finally:
+        metrics.finish_run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,70 +1,178 @@
+"""
+Refresh schema_embeddings: one embedding per public table, used for table retrieval.
+
+Each table's schema_text is hashed (together with the embedding model), and only
+tables whose hash changed are re-embedded. Changed texts are sent to the
+embeddings API in batched `input` lists with bounded concurrency, and all rows
+are written with one bulk upsert. Rows for dropped tables are removed, and the
+local retrieval index (schema_index.py) is refreshed with the changed rows.
+
+Providers (--provider / EMBEDDING_PROVIDER):
+  openai  text-embedding-ada-002 via the OpenAI API (default)
+  local   deterministic hash-based vectors, for offline runs and tests
+
+Usage: python scripts/refresh_schema_embeddings.py [--provider local] [--force] [--dry-run]
+"""
+
+import argparse
+import hashlib
+import math
 import os
-import openai
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
 import psycopg2
+import psycopg2.extras
 from dotenv import load_dotenv
 
+from schema_index import SchemaIndex
+from schema_snapshot import load_snapshot
+
 # Load environment variables from .env
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 POSTGRES_URL = os.getenv("POSTGRES_URL")
 
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+# Texts per embeddings request, and requests in flight
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
 
-# Utility: Get all tables and columns from NeonDB
-SCHEMA_SQL = """
-SELECT table_name, column_name, data_type
-FROM information_schema.columns
-WHERE table_schema = 'public'
-ORDER BY table_name, ordinal_position;
-"""
 
-# Utility: Generate embedding for a string using OpenAI API
+class OpenAIEmbeddingProvider:
+    """Embeddings from the OpenAI API; one request embeds a whole batch of texts."""
+
+    def __init__(self, model: str = "text-embedding-ada-002"):
+        import openai
+        self.model = model
+        self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(input=texts, model=self.model)
+        # The API may return items out of order; each carries its input index
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbeddingProvider:
+    """
+    Deterministic offline embeddings: a unit vector expanded from the SHA-256 of the
+    text. Same text, same vector; no network. Not semantically meaningful.
+    """
+
+    def __init__(self, dim: int = 1536):
+        self.model = f"local-sha256-{dim}"
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed_one(text) for text in texts]
+
+    def _embed_one(self, text: str) -> List[float]:
+        values = []
+        counter = 0
+        while len(values) < self.dim:
+            digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+            values.extend(v / 2**31 - 1.0 for v in struct.unpack(">8I", digest))
+            counter += 1
+        values = values[:self.dim]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+
+PROVIDERS = {
+    "openai": OpenAIEmbeddingProvider,
+    "local": LocalEmbeddingProvider,
+}
+
+
+def schema_hash(schema_text: str, model: str) -> str:
+    """Hash of the text and the model, so switching models re-embeds everything."""
+    return hashlib.sha256(f"{model}\n{schema_text}".encode("utf-8")).hexdigest()
+
+
+def to_vector_literal(embedding: List[float]) -> str:
+    """pgvector literal: '[x,y,...]'."""
+    return "[" + ",".join(repr(float(v)) for v in embedding) + "]"
+
+
+def build_table_schemas(snapshot_rows) -> Dict[str, str]:
+    """One schema_text per table from schema snapshot rows."""
+    return {row['table_name']: f"Table: {row['table_name']}\n"
+            + "\n".join(f"{c['name']} {c['type']}" for c in row['column_details'])
+            for row in snapshot_rows}
+
+
+def embed_texts(provider, texts: List[str], batch_size: int = EMBED_BATCH_SIZE,
+                concurrency: int = EMBED_CONCURRENCY) -> List[List[float]]:
+    """Embed texts in batches of `batch_size`, with at most `concurrency` requests in flight."""
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        results = list(pool.map(provider.embed, batches))
+    return [embedding for batch in results for embedding in batch]
 
-def get_embedding(text):
-    response = client.embeddings.create(
-        input=text,
-        model="text-embedding-ada-002"
-    )
-    return response.data[0].embedding
 
 # Main logic
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh schema_embeddings for changed tables.")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default=EMBEDDING_PROVIDER)
+    parser.add_argument("--force", action="store_true", help="re-embed every table")
+    parser.add_argument("--dry-run", action="store_true", help="report changed tables without embedding")
+    args = parser.parse_args(argv)
+
     conn = psycopg2.connect(POSTGRES_URL)
     cur = conn.cursor()
-    cur.execute(SCHEMA_SQL)
-    schema_rows = cur.fetchall()
-    # Build a list of unique table schemas as text
-    table_schemas = {}
-    for table, column, dtype in schema_rows:
-        table_schemas.setdefault(table, []).append(f"{column} {dtype}")
-    # Prepare for embeddings
-    embedding_rows = []
-    for table, columns in table_schemas.items():
-        schema_text = f"Table: {table}\n" + "\n".join(columns)
-        embedding = get_embedding(schema_text)
-        embedding_rows.append((table, schema_text, embedding))
-    # Upsert into schema_embeddings table
     cur.execute("""
         CREATE TABLE IF NOT EXISTS schema_embeddings (
             table_name TEXT PRIMARY KEY,
             schema_text TEXT,
             embedding VECTOR
         );
+        ALTER TABLE schema_embeddings ADD COLUMN IF NOT EXISTS schema_hash TEXT;
     """)
-    for table, schema_text, embedding in embedding_rows:
-        cur.execute(
-            """
-            INSERT INTO schema_embeddings (table_name, schema_text, embedding)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (table_name) DO UPDATE SET schema_text = EXCLUDED.schema_text, embedding = EXCLUDED.embedding;
+    conn.commit()
+    # Tables and columns come from the cached schema snapshot, not a catalog scan
+    table_schemas = build_table_schemas(load_snapshot(conn, schemas=['public']))
+    cur.execute("SELECT table_name, schema_hash FROM schema_embeddings")
+    stored_hashes = dict(cur.fetchall())
+
+    provider = PROVIDERS[args.provider]()
+    hashes = {table: schema_hash(text, provider.model) for table, text in table_schemas.items()}
+    changed = [table for table in table_schemas if args.force or stored_hashes.get(table) != hashes[table]]
+    dropped = [table for table in stored_hashes if table not in table_schemas]
+    print(f"{len(table_schemas)} tables: {len(changed)} changed, {len(dropped)} dropped.")
+    if args.dry_run:
+        for table in changed:
+            print(f"  would embed {table}")
+        conn.rollback()
+        cur.close()
+        conn.close()
+        return
+
+    embeddings = embed_texts(provider, [table_schemas[table] for table in changed])
+    if changed:
+        # Upsert into schema_embeddings table in one statement
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO schema_embeddings (table_name, schema_text, embedding, schema_hash)
+            VALUES %s
+            ON CONFLICT (table_name) DO UPDATE SET schema_text = EXCLUDED.schema_text,
+                embedding = EXCLUDED.embedding, schema_hash = EXCLUDED.schema_hash;
             """,
-            (table, schema_text, embedding)
-        )
+            [(table, table_schemas[table], to_vector_literal(embedding), hashes[table])
+             for table, embedding in zip(changed, embeddings)],
+            template="(%s, %s, %s::vector, %s)",
+            page_size=len(changed))
+    if dropped:
+        cur.execute("DELETE FROM schema_embeddings WHERE table_name = ANY(%s)", (dropped,))
     conn.commit()
+    print(f"Refreshed embeddings for {len(changed)} tables.")
+    # Keep the local retrieval index in step (fetches only the rows just written)
+    index = SchemaIndex()
+    fetched, removed = index.refresh(conn)
+    print(f"Schema index: {len(index)} tables ({fetched} fetched, {removed} removed).")
     cur.close()
     conn.close()
-    print(f"Refreshed embeddings for {len(embedding_rows)} tables.")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,315 @@
+"""
+Replay the editor workload recorded in query_history against a target Postgres.
+
+Historical statements are grouped by fingerprint (lower-cased, literals and
+numbers replaced by ?, whitespace collapsed; the same md5 the profiler in
+server/check_raw_tables.py reports). The replay draws statements with the
+historical mix (or uniformly with --uniform), keeping each fingerprint's real
+literals, and runs them on --concurrency connections, either closed-loop (each
+connection back to back) or open-loop at --rate statements/sec with Poisson
+arrivals. In open loop, latency is measured from the scheduled arrival, so
+queueing on a saturated target counts against it.
+
+Only single SELECT/WITH/TABLE/VALUES statements are sampled: texts holding several
+statements (the editor sends a whole buffer as one query), transaction control or
+read-only overrides are skipped. The connections default every transaction to
+read only (default_transaction_read_only=on) and each statement is rolled back,
+so a replay cannot change data.
+
+Reports p50/p95/p99 latency, throughput and errors per fingerprint and overall;
+--out saves the report as JSON and --compare shows the change against a saved
+run (e.g. before and after adding an index or partitioning a table).
+
+Usage:
+  python scripts/replay_query_history.py --concurrency 8 --duration 60
+  python scripts/replay_query_history.py --rate 20 --duration 120 --top 15 --out after.json --compare before.json
+  python scripts/replay_query_history.py --target postgres://...staging --requests 500
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from github_etl import metrics
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+POSTGRES_URL = os.getenv('POSTGRES_URL')
+# Where statements are replayed (defaults to the database holding query_history)
+REPLAY_TARGET_URL = os.getenv('REPLAY_TARGET_URL')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE = re.compile(r'\s+')
+_TRAILING_SEMICOLON = re.compile(r'\s*;\s*$')
+_READ_ONLY = re.compile(r'^\s*(select|with|table|values)\b', re.IGNORECASE)
+_COMMENT = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+# Anything that could end the read-only transaction or lift the read-only default
+_UNSAFE = re.compile(r'\b(begin|commit|rollback|abort|savepoint|release|start\s+transaction|prepare\s+transaction'
+                     r'|set_config|transaction_read_only|default_transaction_read_only)\b|\$', re.IGNORECASE)
+
+
+def normalize_query(text: str) -> str:
+    """Same normalization as check_raw_tables.NORMALIZED_QUERY_SQL."""
+    text = _STRING.sub('?', text.lower())
+    text = _NUMBER.sub('?', text)
+    text = _SPACE.sub(' ', text)
+    return _TRAILING_SEMICOLON.sub('', text)
+
+
+def is_replayable(text: str) -> bool:
+    """A single read-only statement with no transaction control (dollar quotes are refused too)."""
+    code = _TRAILING_SEMICOLON.sub('', _COMMENT.sub(' ', _STRING.sub("''", text)))
+    return bool(_READ_ONLY.match(code)) and ';' not in code and not _UNSAFE.search(code)
+
+
+def fingerprint(text: str) -> str:
+    return hashlib.md5(normalize_query(text).encode('utf-8')).hexdigest()
+
+
+def load_workload(conn, days: int = 30, limit: int = 50000, top: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    {fingerprint: {'query', 'texts', 'calls', 'history_mean_ms'}} from successful,
+    replayable (single, read-only) statements in query_history. With `top`, keeps the fingerprints with
+    the most total historical time.
+    """
+    with conn.cursor() as cur:
+        cur.execute('''
+        SELECT query_text, duration_ms FROM query_history
+        WHERE status = 'success' AND query_text IS NOT NULL
+          AND executed_at >= now() - make_interval(days => %s)
+        ORDER BY executed_at DESC
+        LIMIT %s''', (days, limit))
+        rows = cur.fetchall()
+    conn.rollback()
+    workload: Dict[str, Dict[str, Any]] = {}
+    for text, duration_ms in rows:
+        if not is_replayable(text):
+            continue
+        entry = workload.setdefault(fingerprint(text), {
+            'query': normalize_query(text), 'texts': [], 'calls': 0, 'history_total_ms': 0.0})
+        entry['texts'].append(text)
+        entry['calls'] += 1
+        entry['history_total_ms'] += float(duration_ms or 0)
+    for entry in workload.values():
+        entry['history_mean_ms'] = round(entry['history_total_ms'] / entry['calls'], 2)
+    if top:
+        keep = sorted(workload, key=lambda fp: workload[fp]['history_total_ms'], reverse=True)[:top]
+        workload = {fp: workload[fp] for fp in keep}
+    return workload
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Replayer:
+    """Run sampled statements on `concurrency` read-only connections and record latencies."""
+
+    def __init__(self, target_url: str, workload: Dict[str, Dict[str, Any]], concurrency: int = 4,
+                 rate: Optional[float] = None, uniform: bool = False, timeout_ms: int = 30000, seed: int = 0):
+        unsafe = [fp for fp, entry in workload.items() if not all(is_replayable(t) for t in entry['texts'])]
+        if unsafe:
+            raise ValueError(f"Workload holds statements that are not single read-only queries: {', '.join(unsafe)}")
+        self.target_url = target_url
+        self.workload = workload
+        self.concurrency = max(concurrency, 1)
+        self.rate = rate
+        self.timeout_ms = timeout_ms
+        self._random = random.Random(seed)
+        self._fingerprints = list(workload)
+        self._weights = None if uniform else [workload[fp]['calls'] for fp in self._fingerprints]
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {fp: [] for fp in workload}
+        self.errors: Dict[str, int] = {fp: 0 for fp in workload}
+        self.error_messages: Dict[str, str] = {}
+
+    def _draw(self):
+        with self._lock:
+            fp = self._random.choices(self._fingerprints, weights=self._weights)[0]
+            return fp, self._random.choice(self.workload[fp]['texts'])
+
+    def _connect(self):
+        # Read only for the whole session, not just psycopg2's first transaction
+        conn = psycopg2.connect(self.target_url, options='-c default_transaction_read_only=on')
+        conn.set_session(readonly=True)
+        with conn.cursor() as cur:
+            cur.execute('SET statement_timeout = %s', (self.timeout_ms,))
+        conn.commit()
+        return conn
+
+    def _execute(self, conn, fp: str, text: str, scheduled: float):
+        try:
+            with conn.cursor() as cur:
+                cur.execute(text)
+                if cur.description is not None:
+                    cur.fetchall()  # transfer time is part of what the editor waits for
+            latency = time.perf_counter() - scheduled
+            with self._lock:
+                self.samples[fp].append(latency)
+            metrics.observe('replay_query_seconds', latency, fingerprint=fp[:12])
+        except psycopg2.Error as exc:
+            with self._lock:
+                self.errors[fp] += 1
+                self.error_messages.setdefault(fp, str(exc).strip().splitlines()[0])
+        finally:
+            conn.rollback()
+
+    def run(self, duration: Optional[float] = None, requests: Optional[int] = None) -> float:
+        """Replay until `duration` seconds pass or `requests` statements were issued; returns wall seconds."""
+        deadline = time.perf_counter() + duration if duration else None
+        issued = [0]
+
+        def budget_left() -> bool:
+            with self._lock:
+                if requests is not None and issued[0] >= requests:
+                    return False
+                issued[0] += 1
+            return deadline is None or time.perf_counter() < deadline
+
+        arrivals: queue.Queue = queue.Queue()
+
+        def worker():
+            conn = self._connect()
+            try:
+                while True:
+                    if self.rate:
+                        item = arrivals.get()
+                        if item is None:
+                            return
+                        fp, text, scheduled = item
+                    else:
+                        if not budget_left():
+                            return
+                        (fp, text), scheduled = self._draw(), time.perf_counter()
+                    self._execute(conn, fp, text, scheduled)
+            finally:
+                conn.close()
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        if self.rate:
+            # Open loop: arrivals follow the schedule whether or not the target keeps up
+            next_at = time.perf_counter()
+            while budget_left():
+                next_at += self._random.expovariate(self.rate)
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                arrivals.put((*self._draw(), next_at))
+            for _ in threads:
+                arrivals.put(None)
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        def summarize(latencies: List[float], errors: int) -> Dict[str, Any]:
+            values = sorted(latencies)
+            ms = lambda v: round(v * 1000, 2) if v is not None else None
+            return {'count': len(values), 'errors': errors,
+                    'throughput_per_sec': round(len(values) / wall, 2) if wall else 0.0,
+                    'p50_ms': ms(percentile(values, 0.50)), 'p95_ms': ms(percentile(values, 0.95)),
+                    'p99_ms': ms(percentile(values, 0.99)), 'max_ms': ms(values[-1] if values else None)}
+
+        fingerprints = {}
+        for fp, entry in self.workload.items():
+            if not self.samples[fp] and not self.errors[fp]:
+                continue
+            fingerprints[fp] = dict(summarize(self.samples[fp], self.errors[fp]), query=entry['query'],
+                                    history_calls=entry['calls'], history_mean_ms=entry['history_mean_ms'])
+            if fp in self.error_messages:
+                fingerprints[fp]['first_error'] = self.error_messages[fp]
+        overall = summarize([v for values in self.samples.values() for v in values], sum(self.errors.values()))
+        return {'concurrency': self.concurrency, 'rate': self.rate, 'seconds': round(wall, 2),
+                'overall': overall, 'fingerprints': fingerprints}
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    o = report['overall']
+    print(f"{o['count']} statements in {report['seconds']}s ({o['throughput_per_sec']}/s), {o['errors']} errors; "
+          f"p50 {o['p50_ms']} ms, p95 {o['p95_ms']} ms, p99 {o['p99_ms']} ms")
+    old = (baseline or {}).get('fingerprints', {})
+    header = f"{'fingerprint':<14}{'count':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'hist ms':>10}"
+    print(header + ('  p95 vs baseline' if baseline else '') + '  query')
+    rows = sorted(report['fingerprints'].items(), key=lambda kv: -(kv[1]['p95_ms'] or 0) * kv[1]['count'])
+    for fp, r in rows:
+        line = (f"{fp[:12]:<14}{r['count']:>7}{r['errors']:>5}{r['p50_ms'] or '-':>10}{r['p95_ms'] or '-':>10}"
+                f"{r['p99_ms'] or '-':>10}{r['history_mean_ms']:>10}")
+        if baseline:
+            before = old.get(fp, {}).get('p95_ms')
+            change = f"{before} -> {r['p95_ms']}" if before and r['p95_ms'] else 'new'
+            line += f"  {change:<16}"
+        print(f"{line}  {r['query'][:70]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay query_history statements and report latency per fingerprint.')
+    parser.add_argument('--target', default=REPLAY_TARGET_URL or POSTGRES_URL, help='Postgres URL to replay against')
+    parser.add_argument('--concurrency', type=int, default=4, help='parallel connections')
+    parser.add_argument('--rate', type=float, help='open-loop arrival rate in statements/sec (default: closed loop)')
+    parser.add_argument('--duration', type=float, help='seconds to run')
+    parser.add_argument('--requests', type=int, help='statements to issue')
+    parser.add_argument('--days', type=int, default=30, help='history window to sample from')
+    parser.add_argument('--top', type=int, help='only the N fingerprints with the most historical time')
+    parser.add_argument('--uniform', action='store_true', help='draw fingerprints uniformly instead of by frequency')
+    parser.add_argument('--timeout-ms', type=int, default=30000, help='statement_timeout per statement')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='save the report as JSON')
+    parser.add_argument('--compare', metavar='BASELINE', help='show p95 changes against a saved report')
+    args = parser.parse_args(argv)
+    if not POSTGRES_URL or not args.target:
+        raise RuntimeError('POSTGRES_URL not found in environment.')
+    if args.duration is None and args.requests is None:
+        args.duration = 30.0
+
+    conn = psycopg2.connect(POSTGRES_URL)
+    try:
+        workload = load_workload(conn, days=args.days, top=args.top)
+    finally:
+        conn.close()
+    if not workload:
+        print('No read-only statements with duration_ms found in query_history.')
+        return 1
+    print(f"Replaying {len(workload)} fingerprints ({sum(e['calls'] for e in workload.values())} historical "
+          f"statements) on {args.concurrency} connections"
+          + (f" at {args.rate}/s" if args.rate else ', closed loop'))
+
+    metrics.start_run('replay')
+    try:
+        replayer = Replayer(args.target, workload, concurrency=args.concurrency, rate=args.rate,
+                            uniform=args.uniform, timeout_ms=args.timeout_ms, seed=args.seed)
+        report = replayer.report(replayer.run(duration=args.duration, requests=args.requests))
+    finally:
+        metrics.finish_run()
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
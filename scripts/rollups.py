@@ -0,0 +1,414 @@
+"""
+Incrementally maintained rollups of fact_events, and routing of common query shapes to them.
+
+Each rollup is a small table of per-day aggregates (events per repo/actor/type and
+day, with distinct actor/repo counts). Refreshes are incremental: rollup_state
+records, per rollup, which fact_events partitions (by name and oid) have been
+aggregated, so a refresh only aggregates partitions attached or reloaded since,
+and drops the days of partitions that were detached. When fact_events is a plain
+table the state is a created_at watermark instead, and only the days from the
+watermark's day onward are recomputed. Each refreshed range is deleted and
+re-aggregated in one transaction, so distinct counts stay exact.
+
+route() turns a query shape (group-by dimensions, time grain, measures, filters)
+into SQL over the smallest rollup that answers it exactly, falling back to
+fact_events when none does (e.g. distinct actors over a month need the raw rows).
+QUERY_SHAPES names the shapes dashboards use.
+
+Usage:
+  python scripts/rollups.py                 # refresh what changed
+  python scripts/rollups.py --status
+  python scripts/rollups.py --explain top_repos --since 2023-01-01 --until 2023-02-01
+  python scripts/rollups.py --run events_per_type_per_day --since 2023-01-01 --until 2023-01-08
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from github_etl import metrics
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+POSTGRES_URL = os.getenv('POSTGRES_URL')
+
+SOURCE_TABLE = 'fact_events'
+
+# Aggregate expressions over fact_events, by measure name
+MEASURES = {
+    'events': 'count(*)',
+    'actors': 'count(DISTINCT actor_id)',
+    'repos': 'count(DISTINCT repo_id)',
+}
+# Measures that can be summed across rollup rows; the others only hold at the rollup's own grain
+ADDITIVE = {'events'}
+
+DIMENSION_TYPES = {'repo_id': 'BIGINT', 'actor_id': 'BIGINT', 'event_type': 'TEXT'}
+
+# Smallest first: route() picks the first rollup that can answer a shape
+ROLLUPS = {
+    'rollup_events_day': {
+        'dims': ['event_type'],
+        'measures': ['events', 'actors', 'repos'],
+        'comment': 'Rollup of fact_events: events, distinct actors and repos per event type and day',
+    },
+    'rollup_events_repo_day': {
+        'dims': ['repo_id', 'event_type'],
+        'measures': ['events', 'actors'],
+        'comment': 'Rollup of fact_events: events and distinct actors per repo, event type and day',
+    },
+    'rollup_events_actor_day': {
+        'dims': ['actor_id', 'event_type'],
+        'measures': ['events', 'repos'],
+        'comment': 'Rollup of fact_events: events and distinct repos per actor, event type and day',
+    },
+}
+
+# Labels joined onto routed results: dimension -> (dimension table, key column, label column, alias)
+LABELS = {
+    'repo_id': ('dim_repositories', 'repo_id', 'name', 'repo_name'),
+    'actor_id': ('dim_actors', 'actor_id', 'login', 'actor_login'),
+}
+
+# Dashboard query shapes -> route() arguments
+QUERY_SHAPES = {
+    'events_per_type_per_day': {'dimensions': ['event_type'], 'grain': 'day'},
+    'events_per_type_per_month': {'dimensions': ['event_type'], 'grain': 'month'},
+    'active_actors_per_type_per_day': {'dimensions': ['event_type'], 'grain': 'day', 'measures': ['actors']},
+    'events_per_repo_per_day': {'dimensions': ['repo_id'], 'grain': 'day'},
+    'repo_activity_by_type': {'dimensions': ['repo_id', 'event_type'], 'grain': 'day',
+                              'measures': ['events', 'actors']},
+    'events_per_actor_per_week': {'dimensions': ['actor_id'], 'grain': 'week'},
+    'top_repos': {'dimensions': ['repo_id'], 'grain': None, 'top': 20},
+    'top_actors': {'dimensions': ['actor_id'], 'grain': None, 'top': 20},
+}
+
+STATE_DDL = """
+CREATE TABLE IF NOT EXISTS rollup_state (
+    rollup TEXT NOT NULL,
+    source TEXT NOT NULL,       -- partition name, or fact_events itself when unpartitioned
+    source_oid OID,
+    range_start TIMESTAMP,
+    range_end TIMESTAMP,        -- exclusive; for an unpartitioned source, the created_at watermark
+    refreshed_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (rollup, source)
+)"""
+
+PARTITIONS_SQL = """
+SELECT c.relname, c.oid, pg_get_expr(c.relpartbound, c.oid)
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = to_regclass(%s)
+ORDER BY c.relname"""
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# Arbitrary key for the session advisory lock that serialises refreshes
+_LOCK_KEY = 7242051
+
+
+def rollup_ddl(name: str) -> List[str]:
+    spec = ROLLUPS[name]
+    cols = ', '.join(['day DATE NOT NULL']
+                     + [f'{dim} {DIMENSION_TYPES[dim]}' for dim in spec['dims']]
+                     + [f'{measure} BIGINT NOT NULL' for measure in spec['measures']])
+    key = ', '.join(['day'] + spec['dims'])
+    statements = [
+        f'CREATE TABLE IF NOT EXISTS {name} ({cols})',
+        f'CREATE UNIQUE INDEX IF NOT EXISTS {name}_key ON {name} ({key})',
+        f"COMMENT ON TABLE {name} IS '{spec['comment']}'",
+    ]
+    # Per-entity time series (WHERE repo_id = ? AND day BETWEEN ...) read this index
+    if spec['dims'][0] != 'event_type':
+        statements.append(f'CREATE INDEX IF NOT EXISTS {name}_{spec["dims"][0]}_day ON {name} ({spec["dims"][0]}, day)')
+    return statements
+
+
+def aggregate_sql(name: str) -> str:
+    """INSERT ... SELECT re-aggregating one [start, end) range of fact_events into a rollup."""
+    spec = ROLLUPS[name]
+    dims = ', '.join(spec['dims'])
+    measures = ', '.join(spec['measures'])
+    exprs = ', '.join(f'{MEASURES[m]}' for m in spec['measures'])
+    return (f'INSERT INTO {name} (day, {dims}, {measures}) '
+            f'SELECT created_at::date, {dims}, {exprs} FROM {SOURCE_TABLE} '
+            f'WHERE created_at >= %s AND created_at < %s '
+            f'GROUP BY created_at::date, {dims}')
+
+
+def install(conn):
+    """Create rollup_state, the rollup tables and the dimension lookups they join to (idempotent)."""
+    with conn.cursor() as cur:
+        cur.execute(STATE_DDL)
+        for name in ROLLUPS:
+            for statement in rollup_ddl(name):
+                cur.execute(statement)
+        # Without partitions to prune, the incremental range scans need a time index
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (SOURCE_TABLE,))
+        row = cur.fetchone()
+        if row and row[0] == 'r':
+            cur.execute(f'CREATE INDEX IF NOT EXISTS {SOURCE_TABLE}_created_at_brin '
+                        f'ON {SOURCE_TABLE} USING brin (created_at)')
+        for table, key, _, _ in LABELS.values():
+            cur.execute('SELECT to_regclass(%s)', (table,))
+            if cur.fetchone()[0]:
+                cur.execute(f'CREATE INDEX IF NOT EXISTS {table}_{key}_idx ON {table} ({key})')
+    conn.commit()
+
+
+def source_ranges(cur) -> Tuple[bool, List[Tuple[str, int, Any, Any]]]:
+    """
+    (partitioned, [(source, oid, start, end)]) for the current fact_events. For a plain
+    table the single entry covers everything loaded: (fact_events, oid, min, max).
+    """
+    cur.execute("SELECT relkind, oid FROM pg_class WHERE oid = to_regclass(%s)", (SOURCE_TABLE,))
+    row = cur.fetchone()
+    if row is None:
+        return False, []
+    relkind, oid = row
+    if relkind == 'p':
+        cur.execute(PARTITIONS_SQL, (SOURCE_TABLE,))
+        ranges = []
+        for name, part_oid, bound in cur.fetchall():
+            match = _BOUND.search(bound or '')
+            if match:  # DEFAULT / MINVALUE partitions have no fixed range to roll up
+                ranges.append((name, part_oid, match.group(1), match.group(2)))
+        return True, ranges
+    cur.execute(f'SELECT min(created_at), max(created_at) FROM {SOURCE_TABLE}')
+    start, end = cur.fetchone()
+    return False, [(SOURCE_TABLE, oid, start, end)] if start is not None else []
+
+
+def _replace_range(cur, rollup: str, start, end) -> int:
+    cur.execute(f'DELETE FROM {rollup} WHERE day >= %s::timestamp::date AND day < %s::timestamp::date',
+                (start, end))
+    cur.execute(aggregate_sql(rollup), (start, end))
+    return cur.rowcount
+
+
+def refresh(conn, rollups: Optional[Sequence[str]] = None, full: bool = False) -> Dict[str, int]:
+    """
+    Bring the rollups up to date with fact_events; returns rows written per rollup.
+    Only new, reloaded (new oid) or removed partitions are touched, unless full=True.
+    """
+    install(conn)
+    written = {name: 0 for name in rollups or ROLLUPS}
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_try_advisory_lock(%s)', (_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            print('Another rollup refresh is running; skipping.')
+            return written
+    try:
+        with metrics.span('rollup_refresh') as span:
+            with conn.cursor() as cur:
+                partitioned, ranges = source_ranges(cur)
+                cur.execute('SELECT rollup, source, source_oid, range_start, range_end FROM rollup_state')
+                state = {(r[0], r[1]): r[2:] for r in cur.fetchall()}
+            conn.commit()
+            current = {source: (oid, start, end) for source, oid, start, end in ranges}
+            for name in written:
+                # Partitions (or a table) that went away: drop their days, then forget them
+                for (rollup, source), (_, start, end) in state.items():
+                    if rollup != name or source in current:
+                        continue
+                    with conn.cursor() as cur:
+                        if start is not None:
+                            # range_end is exclusive for partitions and inclusive for a watermark
+                            cur.execute(f"DELETE FROM {name} WHERE day >= %s::date "
+                                        f"AND day < (%s::timestamp - interval '1 microsecond')::date + 1", (start, end))
+                        cur.execute('DELETE FROM rollup_state WHERE rollup = %s AND source = %s', (name, source))
+                    conn.commit()
+                for source, (oid, start, end) in current.items():
+                    seen = state.get((name, source))
+                    if partitioned:
+                        if seen and seen[0] == oid and not full:
+                            continue
+                        refresh_start, refresh_end, watermark = start, end, end
+                    else:
+                        if seen and seen[0] == oid and seen[2] is not None and seen[2] >= end and not full:
+                            continue
+                        refresh_end, watermark = end, end
+                        if full or not seen or seen[2] is None or seen[0] != oid:
+                            # First build, or the table was recreated: cover the old range too
+                            refresh_start = min(start, seen[1]) if seen and seen[1] else start
+                            refresh_end = max(end, seen[2]) if seen and seen[2] else end
+                        else:
+                            # Recompute from the watermark's day: it may have been partially loaded
+                            refresh_start = seen[2]
+                    tx_start = time.perf_counter()
+                    with conn.cursor() as cur:
+                        if not partitioned:
+                            cur.execute("SELECT date_trunc('day', %s::timestamp), "
+                                        "date_trunc('day', %s::timestamp) + interval '1 day'",
+                                        (refresh_start, refresh_end))
+                            refresh_start, refresh_end = cur.fetchone()
+                        rows = _replace_range(cur, name, refresh_start, refresh_end)
+                        cur.execute('''
+                        INSERT INTO rollup_state (rollup, source, source_oid, range_start, range_end)
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON CONFLICT (rollup, source) DO UPDATE
+                            SET source_oid = EXCLUDED.source_oid, range_start = EXCLUDED.range_start,
+                                range_end = EXCLUDED.range_end, refreshed_at = now()''',
+                                    (name, source, oid, start, watermark))
+                    conn.commit()
+                    metrics.observe('pg_transaction_seconds', time.perf_counter() - tx_start, table=name)
+                    metrics.inc('rows_loaded_total', rows, table=name)
+                    written[name] += rows
+                    print(f"{name}: {source} [{refresh_start}, {refresh_end}) -> {rows} rows")
+            span.set(**written)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute('SELECT pg_advisory_unlock(%s)', (_LOCK_KEY,))
+        conn.commit()
+    return written
+
+
+def route(dimensions: Sequence[str] = (), grain: Optional[str] = 'day', measures: Sequence[str] = ('events',),
+          filters: Optional[Dict[str, Any]] = None, since=None, until=None, top: Optional[int] = None,
+          labels: bool = True) -> Tuple[str, List[Any], str]:
+    """
+    SQL for a query shape: group by `grain` ('day', 'week', 'month' or None for the
+    whole range) and `dimensions`, computing `measures`, with equality `filters` on
+    dimensions and a [since, until) date range. `top` keeps the N largest by the
+    first measure. Returns (sql, params, source), source being the rollup used or
+    fact_events. Distinct counts only come from a rollup at exactly their grain.
+    """
+    filters = filters or {}
+    unknown = [m for m in measures if m not in MEASURES] + \
+              [d for d in list(dimensions) + list(filters) if d not in DIMENSION_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown measures/dimensions: {', '.join(unknown)}")
+    if grain not in ('day', 'week', 'month', None):
+        raise ValueError(f"Unknown grain: {grain}")
+
+    source = SOURCE_TABLE
+    for name, spec in ROLLUPS.items():
+        if not set(dimensions) | set(filters) <= set(spec['dims']) or not set(measures) <= set(spec['measures']):
+            continue
+        # An equality filter pins its dimension, so it counts towards the rollup's grain
+        exact = grain == 'day' and set(dimensions) | set(filters) == set(spec['dims'])
+        if all(m in ADDITIVE for m in measures) or exact:
+            source = name
+            break
+
+    on_rollup = source != SOURCE_TABLE
+    day_col = 'day' if on_rollup else 'created_at::date'
+    period = {'day': day_col, 'week': f"date_trunc('week', {day_col})::date",
+              'month': f"date_trunc('month', {day_col})::date", None: None}[grain]
+    select, group = [], []
+    if period:
+        select.append(f'{period} AS period')
+        group.append('period')
+    select += list(dimensions)
+    group += list(dimensions)
+    # On a rollup, additive measures are summed; exact-grain distinct counts are one row per group
+    select += [f'sum({m})::bigint AS {m}' if on_rollup else f'{MEASURES[m]} AS {m}' for m in measures]
+
+    where, params = [], []
+    time_col = 'day' if on_rollup else 'created_at'
+    if since is not None:
+        where.append(f'{time_col} >= %s')
+        params.append(since)
+    if until is not None:
+        where.append(f'{time_col} < %s')
+        params.append(until)
+    for dim, value in filters.items():
+        where.append(f'{dim} = %s')
+        params.append(value)
+
+    order = [f'{measures[0]} DESC'] if top else group
+    sql = f"SELECT {', '.join(select)} FROM {source}"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    if group:
+        sql += ' GROUP BY ' + ', '.join(group)
+    if order:
+        sql += ' ORDER BY ' + ', '.join(order)
+    if top:
+        sql += f' LIMIT {int(top)}'
+
+    joins = [dim for dim in dimensions if dim in LABELS] if labels else []
+    if joins:
+        outer = ['q.*']
+        lateral = []
+        for i, dim in enumerate(joins):
+            table, key, label, alias = LABELS[dim]
+            outer.append(f'l{i}.{label} AS {alias}')
+            lateral.append(f'LEFT JOIN LATERAL (SELECT {label} FROM {table} d WHERE d.{key} = q.{dim} LIMIT 1) l{i} ON true')
+        sql = f"SELECT {', '.join(outer)} FROM ({sql}) q {' '.join(lateral)}"
+        if order:
+            sql += ' ORDER BY ' + ', '.join(f'q.{col}' for col in order)
+    return sql, params, source
+
+
+def route_shape(shape: str, **overrides) -> Tuple[str, List[Any], str]:
+    """route() for a named entry of QUERY_SHAPES, e.g. route_shape('top_repos', since=..., until=...)."""
+    return route(**dict(QUERY_SHAPES[shape], **overrides))
+
+
+def status(conn):
+    with conn.cursor() as cur:
+        cur.execute(STATE_DDL)
+        cur.execute('''
+        SELECT rollup, count(*), min(range_start), max(range_end), max(refreshed_at)
+        FROM rollup_state GROUP BY rollup ORDER BY rollup''')
+        rows = cur.fetchall()
+    conn.commit()
+    for rollup, sources, start, end, refreshed in rows:
+        print(f"{rollup}: {sources} sources covering [{start}, {end}), last refreshed {refreshed}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh fact_events rollups, or route a query shape to them.')
+    parser.add_argument('rollups', nargs='*', help=f"rollups to refresh (default: all of {', '.join(ROLLUPS)})")
+    parser.add_argument('--full', action='store_true', help='re-aggregate every source, not just new ones')
+    parser.add_argument('--status', action='store_true', help='print what each rollup covers')
+    parser.add_argument('--explain', metavar='SHAPE', choices=QUERY_SHAPES, help='print the routed SQL for a shape')
+    parser.add_argument('--run', metavar='SHAPE', choices=QUERY_SHAPES, help='run a shape and print the rows')
+    parser.add_argument('--since', help='inclusive start date (YYYY-MM-DD)')
+    parser.add_argument('--until', help='exclusive end date (YYYY-MM-DD)')
+    args = parser.parse_args(argv)
+    unknown = [r for r in args.rollups if r not in ROLLUPS]
+    if unknown:
+        parser.error(f"unknown rollup(s): {', '.join(unknown)}")
+
+    shape = args.explain or args.run
+    if shape:
+        sql, params, source = route_shape(shape, since=args.since, until=args.until)
+        print(f"-- {shape}: served by {source}")
+        print(sql, params)
+        if args.explain:
+            return
+    if not POSTGRES_URL:
+        raise RuntimeError('POSTGRES_URL not found in environment.')
+    conn = psycopg2.connect(POSTGRES_URL)
+    try:
+        if args.run:
+            with conn.cursor() as cur:
+                start = time.perf_counter()
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+                print('\t'.join(d[0] for d in cur.description))
+                for row in rows:
+                    print('\t'.join('' if v is None else str(v) for v in row))
+                print(f"{len(rows)} rows in {(time.perf_counter() - start) * 1000:.1f} ms")
+        elif args.status:
+            status(conn)
+        else:
+            metrics.start_run('rollups')
+            try:
+                refresh(conn, args.rollups or None, full=args.full)
+            finally:
+                metrics.finish_run()
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+In-process top-k retrieval over schema_embeddings, so a prompt only needs the
+tables relevant to the question instead of the whole warehouse schema.
+
+The vectors live in a local file as one contiguous float32 matrix of unit rows
+(INDEX_DIR/vectors.f32, with table names and schema hashes in meta.json). The
+matrix is memory-mapped, so opening the index is instant regardless of size, and
+cosine top-k is one matrix-vector product plus argpartition.
+
+refresh() is incremental: it compares schema_hash per table with the database
+and fetches only new or changed embeddings. Changed rows are overwritten in
+place and new rows appended; the file is only rewritten when tables were dropped
+or the embedding dimension changed. refresh_schema_embeddings.py calls it after
+every run.
+
+Usage: python scripts/schema_index.py "question" [-k 10] [--provider local]
+"""
+
+import argparse
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+POSTGRES_URL = os.getenv("POSTGRES_URL")
+
+INDEX_DIR = os.getenv("SCHEMA_INDEX_DIR", os.path.join(os.path.dirname(__file__), '..', '.schema_index'))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows (or a single vector) to unit length; zero vectors stay zero."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class SchemaIndex:
+    """Memory-mapped matrix of table embeddings with cosine top-k search."""
+
+    def __init__(self, path: str = INDEX_DIR):
+        self.path = path
+        self.vectors_path = os.path.join(path, 'vectors.f32')
+        self.meta_path = os.path.join(path, 'meta.json')
+        self.tables: List[str] = []
+        self.hashes: List[Optional[str]] = []
+        self.dim = 0
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.positions: Dict[str, int] = {}
+        self.load()
+
+    def load(self):
+        """Open the index files if present; the matrix is mapped, not read."""
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        self.tables, self.hashes, self.dim = meta['tables'], meta['hashes'], meta['dim']
+        self.positions = {t: i for i, t in enumerate(self.tables)}
+        if self.tables:
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(len(self.tables), self.dim))
+        else:
+            self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
+        """The k tables most similar to `query`, as (table_name, cosine similarity), best first."""
+        if not self.tables:
+            return []
+        scores = self.matrix @ normalize(query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.tables[i], float(scores[i])) for i in top]
+
+    def write(self, tables: List[str], hashes: List[Optional[str]], vectors: np.ndarray):
+        """Replace the whole index with the given rows."""
+        os.makedirs(self.path, exist_ok=True)
+        vectors = normalize(vectors)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)  # release the old mapping before replacing the file
+        tmp = self.vectors_path + '.tmp'
+        vectors.tofile(tmp)
+        os.replace(tmp, self.vectors_path)
+        self._write_meta(tables, hashes, vectors.shape[1] if len(vectors) else self.dim)
+        self.load()
+
+    def _write_meta(self, tables: List[str], hashes: List[Optional[str]], dim: int):
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'dim': dim, 'tables': tables, 'hashes': hashes}, f)
+        os.replace(tmp, self.meta_path)
+
+    def stale_tables(self, current_hashes: Dict[str, Optional[str]]) -> Tuple[List[str], List[str]]:
+        """(tables to fetch: new or hash changed, tables to drop) against the database's hashes."""
+        changed = [t for t, h in current_hashes.items() if t not in self.positions or self.hashes[self.positions[t]] != h]
+        removed = [t for t in self.tables if t not in current_hashes]
+        return changed, removed
+
+    def apply(self, current_hashes: Dict[str, Optional[str]], fetched: Dict[str, np.ndarray]):
+        """
+        Bring the index in line with `current_hashes`, given embeddings for every
+        table stale_tables() reported as changed.
+        """
+        changed, removed = self.stale_tables(current_hashes)
+        if not changed and not removed:
+            return
+        dims = {len(v) for v in fetched.values()}
+        if removed or (self.tables and dims - {self.dim}):
+            # Compact: keep unchanged rows, then re-append everything else
+            keep = [t for t in self.tables if t in current_hashes and t not in fetched]
+            if dims - {self.dim}:
+                keep = []  # dimension changed: every row must come from `fetched`
+            rows = [self.matrix[self.positions[t]] for t in keep] + [fetched[t] for t in fetched]
+            tables = keep + list(fetched)
+            self.write(tables, [current_hashes[t] for t in tables],
+                       np.vstack(rows) if rows else np.zeros((0, self.dim), dtype=np.float32))
+            return
+        os.makedirs(self.path, exist_ok=True)
+        updates = [t for t in changed if t in self.positions]
+        additions = [t for t in changed if t not in self.positions]
+        if updates:
+            matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(len(self.tables), self.dim))
+            for t in updates:
+                matrix[self.positions[t]] = normalize(fetched[t])
+            matrix.flush()
+            del matrix
+        if additions:
+            if os.path.exists(self.vectors_path):
+                # Drop any rows left past the end by an append that never reached meta.json
+                os.truncate(self.vectors_path, len(self.tables) * self.dim * 4)
+            with open(self.vectors_path, 'ab') as f:
+                normalize(np.vstack([fetched[t] for t in additions])).tofile(f)
+        tables = self.tables + additions
+        hashes = [current_hashes.get(t, h) for t, h in zip(self.tables, self.hashes)] + [current_hashes[t] for t in additions]
+        self._write_meta(tables, hashes, self.dim or dims.pop())
+        self.load()
+
+    def refresh(self, conn) -> Tuple[int, int]:
+        """Sync with schema_embeddings, fetching only changed rows. Returns (rows fetched, rows removed)."""
+        with conn.cursor() as cur:
+            cur.execute("SELECT table_name, schema_hash FROM schema_embeddings WHERE embedding IS NOT NULL")
+            current_hashes = dict(cur.fetchall())
+            changed, removed = self.stale_tables(current_hashes)
+            fetched = {}
+            if changed:
+                cur.execute("SELECT table_name, embedding::real[] FROM schema_embeddings WHERE table_name = ANY(%s)",
+                            (changed,))
+                fetched = {t: np.asarray(v, dtype=np.float32) for t, v in cur.fetchall()}
+        self.apply(current_hashes, fetched)
+        return len(fetched), len(removed)
+
+
+def main(argv=None):
+    from refresh_schema_embeddings import EMBEDDING_PROVIDER, PROVIDERS
+
+    parser = argparse.ArgumentParser(description="Find the tables most relevant to a question.")
+    parser.add_argument("question")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default=EMBEDDING_PROVIDER)
+    parser.add_argument("--no-refresh", action="store_true", help="search the local index without syncing it")
+    args = parser.parse_args(argv)
+
+    index = SchemaIndex()
+    if not args.no_refresh:
+        conn = psycopg2.connect(POSTGRES_URL)
+        try:
+            fetched, removed = index.refresh(conn)
+        finally:
+            conn.close()
+        print(f"Index: {len(index)} tables ({fetched} fetched, {removed} removed).")
+    query = PROVIDERS[args.provider]().embed([args.question])[0]
+    for table, score in index.search(np.asarray(query), args.k):
+        print(f"{score:.4f}  {table}")
+
+
+if __name__ == "__main__":
+    main()
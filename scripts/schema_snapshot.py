@@ -0,0 +1,254 @@
+"""
+Cached snapshot of the warehouse schema summary (tables, columns, types, comments).
+
+The information_schema aggregation in server/schema_query.sql is slow on large
+catalogs, so it is materialised into the schema_snapshot table and recomputed
+only when DDL changed. Temporary tables (load.py staging tables, bq_to_neon
+shards) and partitions of partitioned tables are left out: they would churn the
+snapshot on every load and duplicate their parent. Change detection, cheapest first:
+  - event trigger: ddl_command_end / sql_drop triggers bump a generation counter
+    when a persistent object changed, so the freshness check is a single-row read
+    (needs superuser; see --install-trigger)
+  - catalog fingerprint: md5 over pg_attribute/pg_class/pg_description, much
+    cheaper than the information_schema views, used when no trigger is installed
+
+The check-and-refresh runs server-side in schema_snapshot_refresh(), so the chat
+path (server/index.js) and Python consumers share it:
+
+    SELECT schema_snapshot_refresh();   -- true if the snapshot was rebuilt
+    SELECT * FROM schema_snapshot;
+
+Usage: python scripts/schema_snapshot.py [--force] [--install-trigger] [--print]
+"""
+
+import argparse
+import os
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+import psycopg2.errors
+from dotenv import load_dotenv
+
+load_dotenv()
+POSTGRES_URL = os.getenv("POSTGRES_URL")
+
+# Catalog fingerprint: every user column's name, type and comment, plus table comments
+# (persistent relations only, partitions excluded)
+FINGERPRINT_SQL = """
+SELECT md5(coalesce(string_agg(
+    n.nspname || '.' || c.relname || '.' || a.attnum || ':' || a.attname || ':'
+    || a.atttypid || ':' || a.atttypmod || ':' || coalesce(col_description(c.oid, a.attnum), '')
+    || ':' || coalesce(obj_description(c.oid, 'pg_class'), ''),
+    ',' ORDER BY n.nspname, c.relname, a.attnum), ''))
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE c.relkind IN ('r', 'v', 'm', 'f', 'p')
+  AND c.relpersistence <> 't'
+  AND NOT c.relispartition
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg_toast%'
+"""
+
+SNAPSHOT_DDL = f"""
+CREATE TABLE IF NOT EXISTS schema_snapshot (
+    table_schema TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    columns TEXT,
+    column_details JSONB,
+    table_comment TEXT,
+    PRIMARY KEY (table_schema, table_name)
+);
+
+CREATE TABLE IF NOT EXISTS schema_snapshot_meta (
+    id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    fingerprint TEXT,
+    ddl_generation BIGINT NOT NULL DEFAULT 0,
+    snapshot_generation BIGINT,
+    refreshed_at TIMESTAMPTZ
+);
+INSERT INTO schema_snapshot_meta (id) VALUES (1) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION schema_snapshot_fingerprint() RETURNS TEXT
+LANGUAGE sql STABLE AS $fp${FINGERPRINT_SQL}$fp$;
+
+CREATE OR REPLACE FUNCTION schema_snapshot_refresh(force BOOLEAN DEFAULT false) RETURNS BOOLEAN
+LANGUAGE plpgsql AS $fn$
+DECLARE
+    meta schema_snapshot_meta%ROWTYPE;
+    current_fp TEXT;
+BEGIN
+    SELECT * INTO meta FROM schema_snapshot_meta WHERE id = 1;
+    IF NOT force THEN
+        IF EXISTS (SELECT 1 FROM pg_event_trigger WHERE evtname = 'schema_snapshot_ddl' AND evtenabled <> 'D') THEN
+            IF meta.snapshot_generation = meta.ddl_generation THEN
+                RETURN false;
+            END IF;
+        ELSE
+            current_fp := schema_snapshot_fingerprint();
+            IF meta.fingerprint = current_fp THEN
+                RETURN false;
+            END IF;
+        END IF;
+    END IF;
+
+    -- One rebuild at a time; the loser of the race re-reads the generation it records
+    PERFORM pg_advisory_xact_lock(hashtext('schema_snapshot'));
+    SELECT * INTO meta FROM schema_snapshot_meta WHERE id = 1;
+    DELETE FROM schema_snapshot;
+    INSERT INTO schema_snapshot (table_schema, table_name, columns, column_details, table_comment)
+    SELECT
+        c.table_schema,
+        c.table_name,
+        string_agg(c.column_name || ' ' || c.data_type, ', ' ORDER BY c.ordinal_position),
+        jsonb_agg(jsonb_build_object(
+            'name', c.column_name,
+            'type', c.data_type,
+            'comment', col_description(format('%I.%I', c.table_schema, c.table_name)::regclass, c.ordinal_position::int)
+        ) ORDER BY c.ordinal_position),
+        obj_description(format('%I.%I', c.table_schema, c.table_name)::regclass, 'pg_class')
+    FROM information_schema.columns c
+    JOIN information_schema.tables t
+      ON c.table_schema = t.table_schema AND c.table_name = t.table_name
+    JOIN pg_namespace n ON n.nspname = c.table_schema
+    JOIN pg_class r ON r.relnamespace = n.oid AND r.relname = c.table_name
+    WHERE c.table_schema NOT IN ('pg_catalog', 'information_schema')
+      AND r.relpersistence <> 't'
+      AND NOT r.relispartition
+    GROUP BY c.table_schema, c.table_name;
+    UPDATE schema_snapshot_meta
+    SET fingerprint = coalesce(current_fp, schema_snapshot_fingerprint()),
+        snapshot_generation = meta.ddl_generation,
+        refreshed_at = now()
+    WHERE id = 1;
+    RETURN true;
+END
+$fn$;
+"""
+
+# Superuser only (not available on every managed Postgres); without it the fingerprint is used
+EVENT_TRIGGER_DDL = """
+CREATE OR REPLACE FUNCTION schema_snapshot_bump() RETURNS event_trigger
+LANGUAGE plpgsql AS $fn$
+BEGIN
+    -- Only persistent objects count: temp tables are created on every load, and
+    -- IF NOT EXISTS no-ops report no commands at all
+    IF TG_EVENT = 'sql_drop' THEN
+        IF NOT EXISTS (SELECT 1 FROM pg_event_trigger_dropped_objects() WHERE NOT is_temporary) THEN
+            RETURN;
+        END IF;
+    ELSIF NOT EXISTS (SELECT 1 FROM pg_event_trigger_ddl_commands()
+                      WHERE schema_name IS NULL OR schema_name NOT LIKE 'pg_temp%') THEN
+        RETURN;
+    END IF;
+    -- Never block DDL: dropping the snapshot tables must still work
+    IF to_regclass('schema_snapshot_meta') IS NOT NULL THEN
+        EXECUTE 'UPDATE schema_snapshot_meta SET ddl_generation = ddl_generation + 1 WHERE id = 1';
+    END IF;
+END
+$fn$;
+DROP EVENT TRIGGER IF EXISTS schema_snapshot_ddl;
+DROP EVENT TRIGGER IF EXISTS schema_snapshot_drop;
+CREATE EVENT TRIGGER schema_snapshot_ddl ON ddl_command_end EXECUTE FUNCTION schema_snapshot_bump();
+CREATE EVENT TRIGGER schema_snapshot_drop ON sql_drop EXECUTE FUNCTION schema_snapshot_bump();
+"""
+
+# In-process copy, keyed on the snapshot's refreshed_at
+_CACHED: Dict[str, Any] = {'refreshed_at': None, 'rows': None}
+
+
+def install_snapshot(conn):
+    """Create the snapshot tables and functions (idempotent)."""
+    with conn.cursor() as cur:
+        cur.execute(SNAPSHOT_DDL)
+    conn.commit()
+
+
+def install_event_trigger(conn) -> bool:
+    """Install the DDL event trigger. Returns False if the role lacks the privilege."""
+    install_snapshot(conn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(EVENT_TRIGGER_DDL)
+        conn.commit()
+        return True
+    except psycopg2.errors.InsufficientPrivilege:
+        conn.rollback()
+        print("No privilege to create event triggers; falling back to catalog fingerprints.")
+        return False
+
+
+def refresh_snapshot(conn, force: bool = False) -> bool:
+    """
+    Rebuild the snapshot if DDL changed since the last build. Returns True if rebuilt.
+    A missing function is rolled back to a savepoint, so the caller's earlier work in
+    the transaction survives the install; the transaction is committed at the end.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SAVEPOINT schema_snapshot_refresh")
+        try:
+            cur.execute("SELECT schema_snapshot_refresh(%s)", (force,))
+            rebuilt = cur.fetchone()[0]
+        except psycopg2.errors.UndefinedFunction:
+            cur.execute("ROLLBACK TO SAVEPOINT schema_snapshot_refresh")
+            rebuilt = None
+    if rebuilt is None:
+        install_snapshot(conn)
+        return refresh_snapshot(conn, force)
+    conn.commit()
+    return rebuilt
+
+
+def load_snapshot(conn, schemas: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Fresh snapshot rows: {'table_schema', 'table_name', 'columns', 'column_details', 'table_comment'}.
+    Rows are re-read only when the snapshot was rebuilt since the last call in this process.
+    """
+    refresh_snapshot(conn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT refreshed_at FROM schema_snapshot_meta WHERE id = 1")
+        refreshed_at = cur.fetchone()[0]
+        if _CACHED['rows'] is None or _CACHED['refreshed_at'] != refreshed_at:
+            cur.execute("""
+                SELECT table_schema, table_name, columns, column_details, table_comment
+                FROM schema_snapshot
+                ORDER BY table_schema, table_name
+            """)
+            names = [d[0] for d in cur.description]
+            _CACHED['rows'] = [dict(zip(names, row)) for row in cur.fetchall()]
+            _CACHED['refreshed_at'] = refreshed_at
+    conn.commit()
+    rows = _CACHED['rows']
+    if schemas is not None:
+        rows = [r for r in rows if r['table_schema'] in schemas]
+    return rows
+
+
+def format_schema(rows: List[Dict[str, Any]]) -> str:
+    """Tab-separated summary in the format the chat prompt uses."""
+    return 'schema.table_name\tcolumns\ttable_comment\n' + '\n'.join(
+        f"{r['table_schema']}.{r['table_name']}\t{r['columns']}\t{r['table_comment'] or ''}" for r in rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the cached schema snapshot if DDL changed.")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the catalog is unchanged")
+    parser.add_argument("--install-trigger", action="store_true", help="install the DDL event trigger (superuser)")
+    parser.add_argument("--print", action="store_true", help="print the snapshot summary")
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(POSTGRES_URL)
+    try:
+        if args.install_trigger and install_event_trigger(conn):
+            print("Installed event trigger schema_snapshot_ddl.")
+        rebuilt = refresh_snapshot(conn, force=args.force)
+        rows = load_snapshot(conn)
+        print(f"Schema snapshot {'rebuilt' if rebuilt else 'up to date'}: {len(rows)} tables.")
+        if args.print:
+            print(format_schema(rows))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
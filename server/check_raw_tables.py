@@ -1,71 +1,363 @@
+"""
+Warehouse performance profile for the raw_*/dim_*/fact_* tables, as JSON.
+
+For each table: heap, TOAST and index sizes, dead-tuple bloat, vacuum/analyze
+times, seq-scan vs index-scan counts, per-index usage (unused indexes), and a
+missing-index hint when a large table is mostly read by sequential scans;
+partitioned tables are reported with their partitions rolled up. Plus
+the slowest normalized statements from pg_stat_statements (when installed) and
+from query_history.duration_ms. Keys are sorted, so two runs diff cleanly; or
+use --compare to print what changed against an earlier profile.
+
+Usage:
+  python server/check_raw_tables.py > profile.json
+  python server/check_raw_tables.py --out profile.json --compare previous.json
+  python server/check_raw_tables.py --access     # ownership, grants and schema snapshot checks
+"""
+
+import argparse
+import datetime
+import json
 import os
+import sys
+from typing import Any, Dict, List, Optional
+
 import psycopg2
+import psycopg2.extras
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../scripts'))
+from schema_snapshot import load_snapshot, refresh_snapshot
+
 # Load environment variables from .env file
 load_dotenv(os.path.join(os.path.dirname(__file__), '../.env'))
 
-conn_str = os.getenv('POSTGRES_URL')
-
-if not conn_str:
-    raise Exception('POSTGRES_URL not set in .env')
-
-conn = psycopg2.connect(conn_str)
-cur = conn.cursor()
-
-# Print connection string, current user, database, and search_path
-print('Connection string:', conn_str)
-cur.execute('SELECT current_user, current_database()')
-print('Connected as:', cur.fetchone())
-cur.execute('SHOW search_path')
-print('search_path:', cur.fetchone()[0])
-
-print('--- Table Type Check ---')
-cur.execute("""
-SELECT table_schema, table_name, table_type
-FROM information_schema.tables
-WHERE table_name LIKE 'raw_%'
-ORDER BY table_schema, table_name;
-""")
-for row in cur.fetchall():
-    print(row)
-
-print('\n--- Table Owner Check ---')
-cur.execute("""
-SELECT schemaname, tablename, tableowner
-FROM pg_tables
-WHERE tablename LIKE 'raw_%'
-ORDER BY schemaname, tablename;
-""")
-for row in cur.fetchall():
-    print(row)
-
-print('\n--- Table Grants Check ---')
-cur.execute("""
-SELECT grantee, privilege_type, table_schema, table_name
-FROM information_schema.role_table_grants
-WHERE table_name LIKE 'raw_%'
-ORDER BY table_schema, table_name;
-""")
-for row in cur.fetchall():
-    print(row)
-
-print('\n--- Backend Schema Query Check ---')
-cur.execute("""
-SELECT
-  c.table_schema,
-  c.table_name,
-  string_agg(c.column_name || ' ' || c.data_type, ', ' ORDER BY c.ordinal_position) AS columns,
-  obj_description(('"' || c.table_schema || '"."' || c.table_name || '"')::regclass, 'pg_class') AS table_comment
-FROM information_schema.columns c
-JOIN information_schema.tables t
-  ON c.table_schema = t.table_schema AND c.table_name = t.table_name
-WHERE c.table_schema NOT IN ('pg_catalog', 'information_schema')
-GROUP BY c.table_schema, c.table_name
-ORDER BY c.table_schema, c.table_name;
-""")
-for row in cur.fetchall():
-    print(row)
-
-cur.close()
-conn.close()
+DEFAULT_PREFIXES = ['raw_', 'dim_', 'fact_']
+# A table is a missing-index suspect above this size when most reads are sequential
+MISSING_INDEX_MIN_ROWS = 10000
+MISSING_INDEX_SEQ_RATIO = 0.5
+
+# Partitioned parents (relkind 'p') have no storage or stats of their own: their row
+# sums the leaf partitions from pg_partition_tree (a parent without partitions reports
+# zeros), and last_vacuum/last_analyze are those of the stalest partition
+TABLES_SQL = """
+SELECT n.nspname AS schema, c.relname AS table, parent.relname AS partition_of,
+       c.relkind = 'p' AS partitioned, count(m.oid) FILTER (WHERE c.relkind = 'p') AS partitions,
+       coalesce(sum(greatest(m.reltuples, 0)), 0)::bigint AS rows_estimate,
+       coalesce(sum(pg_relation_size(m.oid)), 0)::bigint AS table_bytes,
+       coalesce(sum(pg_total_relation_size(NULLIF(m.reltoastrelid, 0))), 0)::bigint AS toast_bytes,
+       coalesce(sum(pg_indexes_size(m.oid)), 0)::bigint AS index_bytes,
+       coalesce(sum(pg_total_relation_size(m.oid)), 0)::bigint AS total_bytes,
+       sum(s.n_live_tup)::bigint AS live_tuples, sum(s.n_dead_tup)::bigint AS dead_tuples,
+       sum(s.n_mod_since_analyze)::bigint AS modified_since_analyze,
+       sum(s.seq_scan)::bigint AS seq_scan, sum(s.seq_tup_read)::bigint AS seq_tup_read,
+       coalesce(sum(s.idx_scan), 0)::bigint AS idx_scan, coalesce(sum(s.idx_tup_fetch), 0)::bigint AS idx_tup_fetch,
+       sum(s.n_tup_ins)::bigint AS inserts, sum(s.n_tup_upd)::bigint AS updates,
+       sum(s.n_tup_hot_upd)::bigint AS hot_updates, sum(s.n_tup_del)::bigint AS deletes,
+       min(greatest(s.last_vacuum, s.last_autovacuum)) AS last_vacuum,
+       min(greatest(s.last_analyze, s.last_autoanalyze)) AS last_analyze
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+LEFT JOIN LATERAL (
+    SELECT c.oid AS relid WHERE c.relkind = 'r'
+    UNION ALL
+    SELECT relid FROM pg_partition_tree(c.oid) WHERE c.relkind = 'p' AND isleaf
+) leaf ON true
+LEFT JOIN pg_class m ON m.oid = leaf.relid
+LEFT JOIN pg_stat_user_tables s ON s.relid = m.oid
+WHERE c.relkind IN ('r', 'p') AND c.relname LIKE ANY (%s)
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+GROUP BY n.nspname, c.relname, c.relkind, parent.relname
+ORDER BY n.nspname, c.relname
+"""
+
+# Partitioned indexes (relkind 'I') likewise sum their leaf indexes
+INDEXES_SQL = """
+SELECT n.nspname AS schema, t.relname AS table, ic.relname AS index,
+       u.bytes, u.scans, u.tuples_read,
+       x.indisunique AS is_unique, x.indisprimary AS is_primary,
+       pg_get_indexdef(x.indexrelid) AS definition,
+       (SELECT array_agg(a.attname ORDER BY k.ord) FROM unnest(x.indkey) WITH ORDINALITY k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum) AS columns
+FROM pg_index x
+JOIN pg_class ic ON ic.oid = x.indexrelid
+JOIN pg_class t ON t.oid = x.indrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+CROSS JOIN LATERAL (
+    SELECT coalesce(sum(pg_relation_size(leaf.relid)), 0)::bigint AS bytes,
+           coalesce(sum(s.idx_scan), 0)::bigint AS scans, coalesce(sum(s.idx_tup_read), 0)::bigint AS tuples_read
+    FROM (SELECT x.indexrelid AS relid WHERE ic.relkind = 'i'
+          UNION ALL
+          SELECT relid FROM pg_partition_tree(x.indexrelid) WHERE ic.relkind = 'I' AND isleaf) leaf
+    LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = leaf.relid
+) u
+WHERE t.relname LIKE ANY (%s)
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema') AND n.nspname NOT LIKE 'pg_toast%%'
+"""
+
+# id-like columns: the join and filter keys of this warehouse
+ID_COLUMNS_SQL = """
+SELECT table_schema, table_name, column_name
+FROM information_schema.columns
+WHERE table_name LIKE ANY (%s) AND (column_name LIKE '%%\\_id' OR column_name IN ('id', 'sha', 'natural_key'))
+"""
+
+# Literals and numbers to placeholders, whitespace collapsed: statements differing only in constants group together
+NORMALIZED_QUERY_SQL = (
+    "regexp_replace(regexp_replace(regexp_replace(regexp_replace(lower(query_text),"
+    " '''(?:[^'']|'''')*''', '?', 'g'), '\\m\\d+(\\.\\d+)?\\M', '?', 'g'),"
+    " '\\s+', ' ', 'g'), '\\s*;\\s*$', '')")
+
+
+def table_findings(t: Dict[str, Any]) -> List[str]:
+    findings = []
+    live, dead = t['live_tuples'] or 0, t['dead_tuples'] or 0
+    if dead > 1000 and t['dead_ratio'] > 0.2:
+        findings.append(f"{t['dead_ratio']:.0%} dead tuples; vacuum is behind")
+    if t['table_bytes'] and t['toast_bytes'] > t['table_bytes']:
+        findings.append('TOAST is larger than the heap: wide JSONB/text values dominate scans')
+    if t['missing_index_suspect']:
+        findings.append(f"{t['seq_scan']} seq scans averaging {t['avg_rows_per_seq_scan']:,.0f} rows; "
+                        f"unindexed id columns: {', '.join(t['unindexed_id_columns']) or 'none'}")
+    unused = [i['index'] for i in t['indexes'] if i['unused']]
+    if unused:
+        findings.append(f"unused indexes: {', '.join(unused)}")
+    if t['updates'] and t['hot_updates'] / t['updates'] < 0.1 and t['updates'] > 10000:
+        findings.append('few HOT updates; a lower fillfactor may help')
+    if live and t['modified_since_analyze'] and t['modified_since_analyze'] > live * 0.2:
+        findings.append('statistics are stale (over 20% modified since the last analyze)')
+    return findings
+
+
+def profile_tables(cur, prefixes: List[str]) -> List[Dict[str, Any]]:
+    patterns = [p.replace('_', '\\_') + '%' for p in prefixes]
+    cur.execute(TABLES_SQL, (patterns,))
+    tables = [dict(row) for row in cur.fetchall()]
+    cur.execute(INDEXES_SQL, (patterns,))
+    indexes: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in cur.fetchall():
+        row = dict(row)
+        key = (row.pop('schema'), row.pop('table'))
+        row['unused'] = row['scans'] == 0 and not (row['is_unique'] or row['is_primary'])
+        indexes.setdefault(key, []).append(row)
+    cur.execute(ID_COLUMNS_SQL, (patterns,))
+    id_columns: Dict[tuple, List[str]] = {}
+    for schema, table, column in cur.fetchall():
+        id_columns.setdefault((schema, table), []).append(column)
+
+    for t in tables:
+        key = (t['schema'], t['table'])
+        t['indexes'] = sorted(indexes.get(key, []), key=lambda i: i['index'])
+        live, dead = t['live_tuples'] or 0, t['dead_tuples'] or 0
+        t['dead_ratio'] = round(dead / (live + dead), 4) if live + dead else 0.0
+        t['estimated_bloat_bytes'] = int(t['table_bytes'] * t['dead_ratio'])
+        scans = (t['seq_scan'] or 0) + t['idx_scan']
+        t['seq_scan_ratio'] = round((t['seq_scan'] or 0) / scans, 4) if scans else None
+        t['avg_rows_per_seq_scan'] = round(t['seq_tup_read'] / t['seq_scan'], 1) if t['seq_scan'] else 0.0
+        leading = {i['columns'][0] for i in t['indexes'] if i['columns']}
+        t['unindexed_id_columns'] = sorted(c for c in id_columns.get(key, []) if c not in leading)
+        t['missing_index_suspect'] = bool(
+            (t['rows_estimate'] or 0) >= MISSING_INDEX_MIN_ROWS
+            and (t['seq_scan_ratio'] or 0) >= MISSING_INDEX_SEQ_RATIO
+            and t['avg_rows_per_seq_scan'] >= MISSING_INDEX_MIN_ROWS)
+        t['findings'] = table_findings(t)
+    return tables
+
+
+def profile_statements(cur, limit: int) -> Dict[str, Any]:
+    """Slowest statements by total time from pg_stat_statements, if it is installed and readable."""
+    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+    if not cur.fetchone():
+        return {'available': False, 'reason': 'pg_stat_statements extension is not installed'}
+    cur.execute("""
+    SELECT column_name FROM information_schema.columns
+    WHERE table_name = 'pg_stat_statements' AND column_name IN ('total_exec_time', 'total_time')""")
+    # PG13 renamed total_time/mean_time to *_exec_time (rows are dicts: build_profile uses a RealDictCursor)
+    row = cur.fetchone()
+    if row is None:
+        return {'available': False, 'reason': 'pg_stat_statements view is not visible'}
+    suffix = '_exec_time' if row['column_name'] == 'total_exec_time' else '_time'
+    try:
+        cur.execute(f"""
+        SELECT s.queryid::text AS queryid, s.query, s.calls, round(s.total{suffix}::numeric, 2) AS total_ms,
+               round(s.mean{suffix}::numeric, 2) AS mean_ms, round(s.max{suffix}::numeric, 2) AS max_ms,
+               s.rows, s.shared_blks_hit, s.shared_blks_read, s.temp_blks_written,
+               round(s.shared_blks_hit::numeric / nullif(s.shared_blks_hit + s.shared_blks_read, 0), 4) AS cache_hit_ratio
+        FROM pg_stat_statements s
+        JOIN pg_database d ON d.oid = s.dbid AND d.datname = current_database()
+        ORDER BY s.total{suffix} DESC
+        LIMIT %s""", (limit,))
+    except psycopg2.Error as exc:
+        cur.connection.rollback()
+        return {'available': False, 'reason': str(exc).strip()}
+    return {'available': True, 'top_by_total_time': [dict(row) for row in cur.fetchall()]}
+
+
+def profile_query_history(cur, limit: int, days: int) -> Dict[str, Any]:
+    """Slowest normalized statements run through the UI, from query_history.duration_ms."""
+    cur.execute("""
+    SELECT 1 FROM information_schema.columns
+    WHERE table_name = 'query_history' AND column_name = 'duration_ms'""")
+    if not cur.fetchone():
+        return {'available': False, 'reason': 'query_history.duration_ms not found'}
+    cur.execute(f"""
+    SELECT md5({NORMALIZED_QUERY_SQL}) AS fingerprint, min({NORMALIZED_QUERY_SQL}) AS query,
+           count(*) AS calls, sum(duration_ms) AS total_ms, round(avg(duration_ms)::numeric, 2) AS mean_ms,
+           percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_ms) AS p95_ms, max(duration_ms) AS max_ms,
+           count(*) FILTER (WHERE status IS DISTINCT FROM 'success') AS failures,
+           max(executed_at) AS last_run
+    FROM query_history
+    WHERE duration_ms IS NOT NULL AND executed_at >= now() - make_interval(days => %s)
+    GROUP BY 1
+    ORDER BY total_ms DESC
+    LIMIT %s""", (days, limit))
+    return {'available': True, 'days': days, 'top_by_total_time': [dict(row) for row in cur.fetchall()]}
+
+
+def build_profile(conn, prefixes: List[str] = DEFAULT_PREFIXES, limit: int = 20, days: int = 30) -> Dict[str, Any]:
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute("""
+        SELECT current_database() AS database, current_setting('server_version') AS server_version,
+               (SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()) AS stats_reset""")
+        profile = {'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                   'prefixes': prefixes, **dict(cur.fetchone())}
+        profile['tables'] = profile_tables(cur, prefixes)
+        profile['statements'] = profile_statements(cur, limit)
+        profile['query_history'] = profile_query_history(cur, limit, days)
+    conn.rollback()
+    profile['totals'] = profile_totals(profile['tables'])
+    return profile
+
+
+def profile_totals(tables: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sizes summed over top-level tables: partitions are already counted in their parent's row."""
+    top = [t for t in tables if not t['partition_of']]
+    return {
+        'tables': len(tables),
+        'total_bytes': sum(t['total_bytes'] for t in top),
+        'toast_bytes': sum(t['toast_bytes'] for t in top),
+        'estimated_bloat_bytes': sum(t['estimated_bloat_bytes'] for t in top),
+        'unused_index_bytes': sum(i['bytes'] for t in top for i in t['indexes'] if i['unused']),
+        'tables_with_findings': sum(1 for t in tables if t['findings']),
+    }
+
+
+def compare_profiles(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """Human-readable changes between two profiles: growth, new findings, slower statements."""
+    lines = []
+    old_tables = {(t['schema'], t['table']): t for t in old.get('tables', [])}
+    for t in new.get('tables', []):
+        before = old_tables.get((t['schema'], t['table']))
+        name = f"{t['schema']}.{t['table']}"
+        if before is None:
+            lines.append(f"{name}: new table, {t['total_bytes']:,} bytes")
+            continue
+        growth = t['total_bytes'] - before['total_bytes']
+        if abs(growth) > max(before['total_bytes'] * 0.1, 1 << 20):
+            lines.append(f"{name}: {before['total_bytes']:,} -> {t['total_bytes']:,} bytes")
+        seq = (t['seq_scan'] or 0) - (before['seq_scan'] or 0)
+        idx = t['idx_scan'] - before['idx_scan']
+        if seq > 0 and seq > idx:
+            lines.append(f"{name}: {seq} seq scans vs {idx} index scans since the previous profile")
+        for finding in t['findings']:
+            if finding not in before['findings']:
+                lines.append(f"{name}: {finding}")
+    for section, key in (('statements', 'queryid'), ('query_history', 'fingerprint')):
+        old_rows = {r[key]: r for r in old.get(section, {}).get('top_by_total_time', [])}
+        for row in new.get(section, {}).get('top_by_total_time', []):
+            before = old_rows.get(row[key])
+            if before and before['mean_ms'] and float(row['mean_ms']) > float(before['mean_ms']) * 1.5:
+                lines.append(f"{section} {row[key]}: mean {before['mean_ms']} -> {row['mean_ms']} ms: "
+                             f"{row['query'][:80]}")
+            elif before is None:
+                lines.append(f"{section} {row[key]}: new in top list, mean {row['mean_ms']} ms: {row['query'][:80]}")
+    return lines
+
+
+def access_checks(conn):
+    """Ownership, grants and schema snapshot checks for raw_* tables."""
+    cur = conn.cursor()
+    cur.execute('SELECT current_user, current_database()')
+    print('Connected as:', cur.fetchone())
+    cur.execute('SHOW search_path')
+    print('search_path:', cur.fetchone()[0])
+
+    print('--- Table Type Check ---')
+    cur.execute("""
+    SELECT table_schema, table_name, table_type
+    FROM information_schema.tables
+    WHERE table_name LIKE 'raw_%'
+    ORDER BY table_schema, table_name;
+    """)
+    for row in cur.fetchall():
+        print(row)
+
+    print('\n--- Table Owner Check ---')
+    cur.execute("""
+    SELECT schemaname, tablename, tableowner
+    FROM pg_tables
+    WHERE tablename LIKE 'raw_%'
+    ORDER BY schemaname, tablename;
+    """)
+    for row in cur.fetchall():
+        print(row)
+
+    print('\n--- Table Grants Check ---')
+    cur.execute("""
+    SELECT grantee, privilege_type, table_schema, table_name
+    FROM information_schema.role_table_grants
+    WHERE table_name LIKE 'raw_%'
+    ORDER BY table_schema, table_name;
+    """)
+    for row in cur.fetchall():
+        print(row)
+
+    print('\n--- Backend Schema Query Check ---')
+    # Same summary the chat path uses, from the cached snapshot instead of a catalog scan
+    rebuilt = refresh_snapshot(conn)
+    snapshot = load_snapshot(conn)
+    print('Snapshot rebuilt:' if rebuilt else 'Snapshot up to date:', len(snapshot), 'tables')
+    for row in snapshot:
+        print((row['table_schema'], row['table_name'], row['columns'], row['table_comment']))
+    cur.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Profile warehouse tables and slow statements as JSON.')
+    parser.add_argument('--prefixes', nargs='*', default=DEFAULT_PREFIXES, help='table name prefixes to profile')
+    parser.add_argument('--limit', type=int, default=20, help='statements reported per source')
+    parser.add_argument('--days', type=int, default=30, help='query_history window in days')
+    parser.add_argument('--out', help='write the profile here instead of stdout')
+    parser.add_argument('--compare', metavar='BASELINE', help='print changes against an earlier profile (stderr)')
+    parser.add_argument('--access', action='store_true', help='run the ownership/grants/snapshot checks instead')
+    args = parser.parse_args(argv)
+
+    conn_str = os.getenv('POSTGRES_URL')
+    if not conn_str:
+        raise Exception('POSTGRES_URL not set in .env')
+    conn = psycopg2.connect(conn_str)
+    try:
+        if args.access:
+            access_checks(conn)
+            return
+        profile = build_profile(conn, args.prefixes, args.limit, args.days)
+    finally:
+        conn.close()
+
+    text = json.dumps(profile, indent=2, sort_keys=True, default=str)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        changes = compare_profiles(baseline, json.loads(text))
+        print('\n'.join(changes) if changes else 'No notable changes.', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
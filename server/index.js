@@ -243,20 +243,19 @@ app.post('/api/ai-chat', upload.single('image'), async (req, res) => {
   let schemaRows = [];
   let formattedSchema = '';
   try {
-    // Dynamically fetch schema summary from all user schemas (not just public), including types and comments
-    const schemaResults = await pool.query(`
-      SELECT
-        c.table_schema,
-        c.table_name,
-        string_agg(c.column_name || ' ' || c.data_type, ', ' ORDER BY c.ordinal_position) AS columns,
-        obj_description(('"' || c.table_schema || '"."' || c.table_name || '"')::regclass, 'pg_class') AS table_comment
-      FROM information_schema.columns c
-      JOIN information_schema.tables t
-        ON c.table_schema = t.table_schema AND c.table_name = t.table_name
-      WHERE c.table_schema NOT IN ('pg_catalog', 'information_schema')
-      GROUP BY c.table_schema, c.table_name
-      ORDER BY c.table_schema, c.table_name;
-    `);
+    // Schema summary from all user schemas (not just public), including types and comments.
+    // Read from the cached snapshot (scripts/schema_snapshot.py), which is rebuilt only when DDL changed;
+    // fall back to the live catalog query if the snapshot functions are not installed.
+    let schemaResults;
+    try {
+      await pool.query('SELECT schema_snapshot_refresh()');
+      schemaResults = await pool.query(
+        'SELECT table_schema, table_name, columns, table_comment FROM schema_snapshot ORDER BY table_schema, table_name'
+      );
+    } catch (snapshotErr) {
+      console.warn('[AI-CHAT] Schema snapshot unavailable, querying catalog:', snapshotErr.message);
+      schemaResults = await pool.query(fs.readFileSync(path.join(__dirname, 'schema_query.sql'), 'utf8'));
+    }
     console.log('[AI-CHAT] RAW schemaResults.rows:', JSON.stringify(schemaResults.rows, null, 2));
     console.log('[AI-CHAT] First 5 schemaResults.rows:', JSON.stringify(schemaResults.rows.slice(0, 5), null, 2));
     console.log('[AI-CHAT] schemaResults.rows length:', schemaResults.rows.length);